@@ -0,0 +1,804 @@
+import asyncio
+import codecs
+import os
+from module.async_request import AsyncRequest
+from typing import Any, AsyncIterator, Union
+from module.exception import GitLabException
+from module.bulk import DEFAULT_BULK_WORKERS, async_run_bulk
+from module.gitlab_common import (
+    CONSOLE_CHUNK_SIZE,
+    DEFAULT_REPO,
+    GRAPHQL_BATCH_SIZE,
+    LATEST_PIPELINES_QUERY,
+    console_range_headers,
+    console_skip_bytes,
+    create_user_data,
+    graphql_pipeline_summaries,
+    graphql_truncated_pipelines,
+    is_member_commit,
+    keyset_pagination_params,
+    latest_pipelines_variables,
+    pipeline_error_summary,
+    pipeline_summary,
+    utf8_complete_length,
+)
+from module.commit_sync import CommitSync
+from module.pipeline_status_cache import PipelineStatusCache
+from module.memo import AsyncTTLMemo
+from module.pagination import DEFAULT_MAX_WORKERS, DEFAULT_PER_PAGE, async_fetch_all_pages, async_iter_pages
+
+# ======== for typing ========
+from httpx import Response
+
+
+class AsyncGitLabOperator(AsyncRequest):
+    """AsyncGitLabOperator
+
+    Coroutine counterpart of ``GitLabOperator``, every ``gl_*`` method takes
+    the same arguments but must be awaited. Results are the decoded JSON of
+    the API: where ``GitLabOperator`` returns python-gitlab objects (e.g.
+    ``gl_get_all_project``) this one returns dicts, and responses are
+    ``httpx`` ones instead of ``requests`` ones. All calls of an event loop
+    share one pooled client and at most ``max_concurrency`` of them are in
+    flight. Another event loop gets its own client, call ``aclose`` before
+    a loop is closed.
+
+    """
+
+    _instance = None
+    page_workers: int = DEFAULT_MAX_WORKERS  # pages of one listing fetched at the same time
+    # "offset" fetches the pages of a listing concurrently, "keyset" walks them one after another where GitLab
+    # offers it, which keeps deep listings fast at the cost of concurrency and of the default order of the listing.
+    pagination: str = "offset"
+    bulk_workers: int = DEFAULT_BULK_WORKERS  # requests of one bulk call sent at the same time
+    namespace_ttl: float = 300  # seconds a namespace looked up by name is remembered
+    commit_title_ttl: float = 3600  # seconds the title of a commit is remembered
+    commit_index: Union[CommitSync, None] = None
+    pipeline_status_cache: Union[PipelineStatusCache, None] = None
+
+    _namespace_memo: Union[AsyncTTLMemo, None] = None
+    _commit_title_memo: Union[AsyncTTLMemo, None] = None
+    _pipeline_status_memo: Union[AsyncTTLMemo, None] = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        self.url = f'{os.getenv("GITLAB_BASE_URL")}api/v4'
+        self.graphql_url = f'{os.getenv("GITLAB_BASE_URL")}api/graphql'
+        private_token = os.getenv("GITLAB_PRIVATE_TOKEN")
+
+        self.headers = {"Authorization": f"Bearer {private_token}"}
+
+    def enable_commit_index(self, redis_op, overlap: float = 3600) -> None:
+        """
+        Answer ``gl_get_commits_by_author`` and ``gl_get_commits_by_members`` from a redis index of every commit of
+        the branch, synced incrementally on each call, see ``CommitSync``.
+
+        Args:
+            redis_op: The RedisOperator the index is kept by.
+            overlap: Seconds before the newest indexed commit which are fetched again, for commits pushed late.
+        """
+        self.commit_index = CommitSync(self, redis_op, overlap=overlap)
+
+    def disable_commit_index(self) -> None:
+        self.commit_index = None
+
+    def enable_pipeline_status_cache(self, redis_op, ttl: int = 20) -> None:
+        """
+        Serve ``gl_get_pipeline_statuses`` from redis for ``ttl`` seconds, GitLab is asked for the expired projects
+        only, see ``PipelineStatusCache``.
+
+        Args:
+            redis_op: The RedisOperator the summaries are cached by.
+            ttl: Seconds a summary is served from redis.
+        """
+        self.pipeline_status_cache = PipelineStatusCache(redis_op, ttl=ttl)
+
+    def disable_pipeline_status_cache(self) -> None:
+        self.pipeline_status_cache = None
+
+    async def _run_bulk(self, send, items) -> list[dict[str, Any]]:
+        """
+        ``async_run_bulk`` on ``bulk_workers`` workers. With the rate limiter enabled an item is sent once through
+        it, the limiter retries a 429 and the bulk run shares its pause instead of retrying and pausing on its own.
+        """
+        if self.rate_limiter is None:
+            return await async_run_bulk(send, items, max_workers=self.bulk_workers)
+        gate = self.rate_limiter.gate
+        return await async_run_bulk(send, items, max_workers=self.bulk_workers, attempts=1, gate=gate)
+
+    @property
+    def namespace_memo(self) -> AsyncTTLMemo:
+        if self._namespace_memo is None:
+            self._namespace_memo = AsyncTTLMemo(self.namespace_ttl)
+        return self._namespace_memo
+
+    @property
+    def commit_title_memo(self) -> AsyncTTLMemo:
+        if self._commit_title_memo is None:
+            self._commit_title_memo = AsyncTTLMemo(self.commit_title_ttl)
+        return self._commit_title_memo
+
+    @property
+    def pipeline_status_memo(self) -> AsyncTTLMemo:
+        # Nothing is kept, identical status requests in flight are sent once. See ``enable_pipeline_status_cache``.
+        if self._pipeline_status_memo is None:
+            self._pipeline_status_memo = AsyncTTLMemo(0)
+        return self._pipeline_status_memo
+
+    async def _get_page(self, path: str, params: dict[str, Any], headers: dict[str, Any] = None) -> Response:
+        output = await self.api_get(path, params=params, headers=headers)
+        if output.status_code != 200:
+            raise GitLabException(message=f"Error while getting {path}, message: {output.text}")
+        return output
+
+    def _pagination_params(self, path: str, params: Union[dict[str, Any], None]) -> tuple[dict[str, Any], bool]:
+        """
+        Query params of the listing and whether it is paginated by keyset.
+        """
+        params = {"per_page": DEFAULT_PER_PAGE, **(params or {})}
+        if self.pagination == "keyset":
+            keyset_params = keyset_pagination_params(path, params)
+            if keyset_params is not None:
+                return keyset_params, True
+        return params, False
+
+    async def _get_all_pages(
+        self,
+        path: str,
+        params: dict[str, Any] = None,
+        headers: dict[str, Any] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Get every page of a listing, pages after the first one are fetched concurrently.
+        """
+        params, keyset = self._pagination_params(path, params)
+        return await async_fetch_all_pages(
+            lambda page_params: self._get_page(path, page_params, headers=headers),
+            params,
+            max_workers=self.page_workers,
+            keyset=keyset,
+        )
+
+    def _iter_pages(
+        self,
+        path: str,
+        params: dict[str, Any] = None,
+        headers: dict[str, Any] = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Lazily yield every item of a listing, the next page is prefetched while the current one is consumed.
+        """
+        params, keyset = self._pagination_params(path, params)
+        return async_iter_pages(
+            lambda page_params: self._get_page(path, page_params, headers=headers),
+            params,
+            keyset=keyset,
+        )
+
+    #####################
+    # Project
+    #####################
+    async def gl_get_all_project(self) -> list[dict[str, Any]]:
+        return await self._get_all_pages("/projects", headers=self.headers)
+
+    def iter_projects(self, kwargs: dict[str, Any] = None) -> AsyncIterator[dict[str, Any]]:
+        """
+        Lazy counterpart of ``gl_get_all_project``, use with ``async for``.
+
+        Args:
+            kwargs: Extra filters of the project listing, e.g. search, owned, order_by.
+        """
+        return self._iter_pages("/projects", params=kwargs, headers=self.headers)
+
+    async def gl_get_project_by_name(self, project_name: str) -> dict[str, Any]:
+        project_list = (
+            await self.api_get("/projects", params={"search": project_name}, headers=self.headers)
+        ).json()
+
+        result = None
+        for project in project_list:
+            if project.get("name") == project_name and project.get("namespace").get("name") == DEFAULT_REPO:
+                result = project
+                break
+        return result
+
+    async def gl_create_project(self, args: dict[str, Any]) -> Response:
+        """
+        Args:
+            args:
+            - *name: project name
+            - namespace_id: group of the project
+            - *description: project's description
+        """
+        return (await self.api_post("/projects", params=args, headers=self.headers)).json()
+
+    async def create_project(self, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Args:
+            kwargs:
+            - *name: project name
+            - group_name: group of the project
+            - *description: project's description
+        """
+        group_name = kwargs.pop("group_name", DEFAULT_REPO)
+        return await self.gl_create_project(await self._create_project_args(kwargs, group_name))
+
+    async def _create_project_args(self, kwargs: dict[str, Any], group_name: str) -> dict[str, Any]:
+        args = {"name": kwargs["name"], "description": kwargs["description"]}
+        group_info = await self.get_namespace(group_name)
+        if group_info:
+            args["namespace_id"] = group_info["id"]
+        return args
+
+    async def bulk_create_projects(self, projects: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Create many projects concurrently, the namespace of each group is looked up once.
+
+        Args:
+            projects: Each one the ``kwargs`` of ``create_project``, they are not modified.
+        Returns:
+            One report per project in the order of ``projects``, see ``run_bulk``. ``item`` is the project name.
+        """
+        async def send(project: dict[str, Any]) -> Response:
+            args = await self._create_project_args(project, project.get("group_name", DEFAULT_REPO))
+            return await self.api_post("/projects", params=args, headers=self.headers)
+
+        reports = await self._run_bulk(send, projects)
+        for report in reports:
+            report["item"] = report["item"]["name"]
+        return reports
+
+    async def gl_get_project(self, repo_id: str) -> Response:
+        return (await self.api_get(f"/projects/{repo_id}", params={"statistics": "true"}, headers=self.headers)).json()
+
+    async def gl_update_project(self, repo_id: str, description: str) -> Response:
+        params = {"description": description}
+        return await self.api_put(f"/projects/{repo_id}", params=params, headers=self.headers)
+
+    async def gl_update_project_attributes(self, repo_id: str, attributes: dict[str, Any]) -> Response:
+        return await self.api_put(f"/projects/{repo_id}", params=attributes, headers=self.headers)
+
+    async def gl_delete_project(self, repo_id: str) -> Response:
+        return await self.api_delete(f"/projects/{repo_id}", headers=self.headers)
+
+    #####################
+    # User
+    #####################
+    async def gl_get_user_list(self, args) -> Response:
+        """
+        Args:
+            kwargs:
+            - username: Get a single user with a specific username.
+            - search: Search for a name, username, or public email
+            - active: Filters only active users. Default is false.
+            - blocked: Filters only blocked users. Default is false.
+        """
+        return await self.api_get("/users", params=args)
+
+    async def gl_create_user(self, args, user_source_password: str, is_admin: bool = False) -> Response:
+        """
+        Args:
+            kwargs:
+            - admin: User is an administrator.
+            - *name: Name of the user.
+            - *username: Login account of the user.
+            - *email
+            - password
+            - skip_confirmation: Do not need to confirm, False by default.
+        """
+        data = create_user_data(args, user_source_password, is_admin=is_admin)
+        return (await self.api_post("/users", data=data)).json()
+
+    async def gl_update_password(self, repository_user_id: str, new_pwd: str) -> Response:
+        return await self.api_put(
+            f"/users/{repository_user_id}",
+            params={"password": new_pwd, "skip_reconfirmation": True},
+        )
+
+    async def gl_update_email(self, repository_user_id: str, new_email: str) -> Response:
+        return await self.api_put(
+            f"/users/{repository_user_id}",
+            params={"email": new_email, "skip_reconfirmation": True},
+        )
+
+    async def gl_update_user_name(self, repository_user_id: str, new_name: str) -> Response:
+        return await self.api_put(
+            f"/users/{repository_user_id}",
+            params={"name": new_name, "skip_reconfirmation": True},
+        )
+
+    async def gl_update_user_state(self, repository_user_id: str, block_status: bool) -> Response:
+        if block_status:
+            return await self.api_post(f"/users/{repository_user_id}/block")
+        else:
+            return await self.api_post(f"/users/{repository_user_id}/unblock")
+
+    async def gl_delete_user(self, repository_user_id: str) -> Response:
+        return await self.api_delete(f"/users/{repository_user_id}")
+
+    #####################
+    # Project's members
+    #####################
+    async def gl_project_list_member(
+        self, repo_id: str, kwargs: dict[str, Any] = {}, all_pages: bool = False
+    ) -> Union[Response, list[dict[str, Any]]]:
+        """
+        Args:
+            kwargs:
+            - page(int)
+            - per_page(int)
+            - query(string): Search for a specific members
+            all_pages: Return the members of every page as a list instead of the response of one page.
+        """
+        if all_pages:
+            params = {k: v for k, v in kwargs.items() if k != "page"}
+            return await self._get_all_pages(f"/projects/{repo_id}/members", params=params)
+        return await self.api_get(f"/projects/{repo_id}/members", params=kwargs)
+
+    def iter_members(self, repo_id: str, query: str = None) -> AsyncIterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/members", params={"query": query})
+
+    async def gl_project_add_member(self, repo_id: str, repository_user_id: str, access_level: int = 40) -> Response:
+        """
+        Args:
+            access_level: 10 guest, 20 reporter, 30 developer, 40 maintainer, 50 owner
+        """
+        params = {
+            "user_id": repository_user_id,
+            "access_level": access_level,
+        }
+        return await self.api_post(f"/projects/{repo_id}/members", params=params)
+
+    async def gl_project_delete_member(self, repo_id: str, repository_user_id: str) -> Response:
+        return await self.api_delete(f"/projects/{repo_id}/members/{repository_user_id}")
+
+    #####################
+    # Bulk
+    #####################
+    async def bulk_create_users(self, users: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Create many users concurrently, at most ``bulk_workers`` at a time, honoring the GitLab rate limit.
+
+        Args:
+            users: Each one the ``args`` of ``gl_create_user`` with two more keys:
+            - *password
+            - is_admin
+        Returns:
+            One report per user in the order of ``users``, see ``run_bulk``. ``item`` is the login.
+        """
+        async def send(user: dict[str, Any]) -> Response:
+            data = create_user_data(user, user["password"], is_admin=user.get("is_admin", False))
+            return await self.api_post("/users", data=data)
+
+        reports = await self._run_bulk(send, users)
+        for report in reports:
+            report["item"] = report["item"]["login"]
+        return reports
+
+    async def bulk_add_members(
+        self, repo_ids: list[str], user_ids: list[str], access_level: int = 40
+    ) -> list[dict[str, Any]]:
+        """
+        Add every user to every project concurrently, a failed pair does not stop the others.
+
+        Returns:
+            One report per (repo_id, user_id) pair, see ``run_bulk``. ``item`` is the pair.
+        """
+        pairs = [(repo_id, user_id) for repo_id in repo_ids for user_id in user_ids]
+        return await self._run_bulk(lambda pair: self.gl_project_add_member(*pair, access_level=access_level), pairs)
+
+    async def bulk_remove_members(self, repo_ids: list[str], user_ids: list[str]) -> list[dict[str, Any]]:
+        """
+        Remove every user from every project concurrently, a failed pair does not stop the others.
+
+        Returns:
+            One report per (repo_id, user_id) pair, see ``run_bulk``. ``item`` is the pair.
+        """
+        pairs = [(repo_id, user_id) for repo_id in repo_ids for user_id in user_ids]
+        return await self._run_bulk(lambda pair: self.gl_project_delete_member(*pair), pairs)
+
+    ############################
+    # Variable
+    ############################
+    async def gl_get_all_global_variable(self) -> dict[str, Any]:
+        return (await self.api_get("/admin/ci/variables")).json()
+
+    async def gl_get_global_variable(self, key: str) -> dict[str, Any]:
+        return (await self.api_get(f"/admin/ci/variables/{key}")).json()
+
+    async def gl_create_global_variable(self, data: dict[str, str]) -> dict[str, Any]:
+        """
+        Args:
+            data:
+            - key: key of the variable
+            - value: content of the variable
+            - variable_type: env_var / file
+        """
+        return (await self.api_post("/admin/ci/variables", data=data)).json()
+
+    async def gl_update_global_variable(self, key: str, data: dict[str, str]) -> dict[str, Any]:
+        """
+        Args:
+            data:
+            - value(str): content of the variable
+            - variable_type(str): env_var / file
+            - protected(bool):
+            - masked(bool):
+        """
+        return (await self.api_put(f"/admin/ci/variables/{key}", data=data)).json()
+
+    async def gl_delete_global_variable(self, key: str) -> dict[str, Any]:
+        return (await self.api_delete(f"/admin/ci/variables/{key}")).json()
+
+    async def gl_get_pj_variable(self, repo_id: int) -> dict[str, Any]:
+        return (await self.api_get(f"/projects/{repo_id}/variables")).json()
+
+    async def gl_create_pj_variable(self, repo_id: int, data: dict[str, str]) -> dict[str, Any]:
+        """
+        Args:
+            data:
+            - key(str): key of the variable
+            - value(str): content of the variable
+            - variable_type(str): env_var / file
+            - protected(bool): only export variable on protected branch
+            - masked(bool): value will be masked in job logs
+            - raw: treated special character as the start of a reference to another variable
+        """
+        return (await self.api_post(f"/projects/{repo_id}/variables", data=data)).json()
+
+    async def gl_delete_pj_variable(self, repo_id: int, key: str) -> Response:
+        return await self.api_delete(f"/projects/{repo_id}/variables/{key}")
+
+    async def create_pj_variable(
+        self, repo_id: int, key: str, value: str, attribute: dict[str, Any] = {}
+    ) -> dict[str, Any]:
+        data = {"variable_type": "env_var", "protected": False, "masked": True, "raw": True}
+        data |= attribute
+        data.update({"key": key, "value": value})
+        return await self.gl_create_pj_variable(repo_id, data)
+
+    ############################
+    # Pipeline
+    ############################
+    async def gl_list_pipelines(
+        self,
+        repo_id: int,
+        limit: int,
+        start: int,
+        branch: str = None,
+        sort: str = "desc",
+        with_pagination: bool = False,
+        all_pages: bool = False,
+    ) -> tuple[list[dict[str, Any]], dict[str, int]]:
+        """
+        Args:
+            all_pages: Ignore ``start`` and return the pipelines of every page, ``limit`` is the page size.
+        """
+        page = (start // limit) + 1
+        params = {"page": page, "per_page": limit, "sort": sort}
+        if branch is not None:
+            params["ref"] = branch
+
+        if all_pages:
+            params.pop("page")
+            results = await self._get_all_pages(f"/projects/{repo_id}/pipelines", params=params)
+            if not with_pagination:
+                return results
+            total = len(results)
+            pagination = {
+                "total": total,
+                "current": 1,
+                "prev": 0,
+                "next": 0,
+                "pages": 1,
+                "per_page": total,
+            }
+            return results, pagination
+
+        ret = await self.api_get(f"/projects/{repo_id}/pipelines", params=params)
+        results = ret.json()
+        if not with_pagination:
+            return results
+
+        headers = ret.headers
+        pagination = {
+            "total": int(headers.get("X-Total") or 0),
+            "current": int(headers.get("X-Page") or 0),
+            "prev": int(headers.get("X-Prev-Page") or 0),
+            "next": int(headers.get("X-Next-Page") or 0),
+            "pages": int(headers.get("X-Total-Pages") or 0),
+            "per_page": limit,
+        }
+        return results, pagination
+
+    def iter_pipelines(self, repo_id: int, branch: str = None, sort: str = "desc") -> AsyncIterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/pipelines", params={"ref": branch, "sort": sort})
+
+    async def gl_get_single_pipeline(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return (await self.api_get(f"/projects/{repo_id}/pipelines/{pipeline_id}")).json()
+
+    async def gl_get_pipeline_console(self, repo_id: int, job_id: int) -> str:
+        return (await self.api_get(f"/projects/{repo_id}/jobs/{job_id}/trace")).content.decode("utf-8")
+
+    async def _iter_console_bytes(
+        self, repo_id: int, job_id: int, offset: int = 0, chunk_size: int = CONSOLE_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        headers = {**self.headers, **console_range_headers(offset)}
+        async with self.api_stream(f"/projects/{repo_id}/jobs/{job_id}/trace", headers=headers) as output:
+            skip = console_skip_bytes(output.status_code, offset)
+            if skip is None:
+                return
+            if output.status_code not in (200, 206):
+                await output.aread()
+                raise GitLabException(message=f"Error while getting log of job {job_id}, message: {output.text}")
+            async for chunk in output.aiter_bytes(chunk_size):
+                if skip:
+                    chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                if chunk:
+                    yield chunk
+
+    async def iter_pipeline_console(
+        self, repo_id: int, job_id: int, offset: int = 0, chunk_size: int = CONSOLE_CHUNK_SIZE
+    ) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for chunk in self._iter_console_bytes(repo_id, job_id, offset, chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    async def gl_tail_pipeline_console(self, repo_id: int, job_id: int, offset: int = 0) -> tuple[str, int]:
+        data = b"".join([chunk async for chunk in self._iter_console_bytes(repo_id, job_id, offset)])
+        complete = utf8_complete_length(data)
+        return data[:complete].decode("utf-8", errors="replace"), offset + complete
+
+    async def gl_create_pipeline(self, repo_id: int, branch: str) -> dict[str, Any]:
+        return (await self.api_post(f"/projects/{repo_id}/pipeline", {"ref": branch})).json()
+
+    async def create_pipeline(self, repo_id: int, branch: str) -> dict[str, Any]:
+        return await self.gl_create_pipeline(repo_id, branch)
+
+    ############################
+    # Namespace
+    ############################
+    async def gl_list_namespace(self) -> list[dict[str, Any]]:
+        return await self._get_all_pages("/namespaces")
+
+    async def get_namespace(self, namespace_name: str) -> dict[str, Any]:
+        """
+        Memoized ``gl_get_specific_namespace``, a namespace is looked up once per ``namespace_ttl`` seconds.
+        """
+        return await self.namespace_memo.get(namespace_name, lambda: self.gl_get_specific_namespace(namespace_name))
+
+    async def gl_get_specific_namespace(self, namespace_name: str) -> dict[str, Any]:
+        rets = (await self.api_get("/namespaces", params={"search": namespace_name})).json()
+        for ret in rets:
+            if ret["name"] == namespace_name:
+                return ret
+
+        return {}
+
+    ############################
+    # Pipeline Job
+    ############################
+
+    async def gl_rerun_pipeline_job(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return (await self.api_post(f"/projects/{repo_id}/pipelines/{pipeline_id}/retry")).json()
+
+    async def gl_stop_pipeline_job(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return (await self.api_post(f"/projects/{repo_id}/pipelines/{pipeline_id}/cancel")).json()
+
+    async def gl_pipeline_jobs(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return (await self.api_get(f"/projects/{repo_id}/pipelines/{pipeline_id}/jobs")).json()
+
+    async def rerun_pipeline_job(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return (await self._rerun_pipeline_job(repo_id, pipeline_id)).json()
+
+    async def _rerun_pipeline_job(self, repo_id: int, pipeline_id: int) -> Response:
+        """
+        Rerun a pipeline by an empty commit titled like the commit the pipeline ran on.
+        """
+        pipeline_info = await self.gl_get_single_pipeline(repo_id, pipeline_id)
+        sha, branch = pipeline_info["sha"], pipeline_info["ref"]
+        commit_msg = await self.get_commit_title(repo_id, sha)
+        return await self._create_commit(repo_id, branch, commit_msg)
+
+    async def bulk_rerun_pipeline_jobs(self, pipelines: list[tuple[int, int]]) -> list[dict[str, Any]]:
+        """
+        Rerun many pipelines concurrently, the title of a commit shared by several pipelines is looked up once.
+
+        Args:
+            pipelines: (repo_id, pipeline_id) pairs
+        Returns:
+            One report per pair in the order of ``pipelines``, see ``run_bulk``. ``item`` is the pair.
+        """
+        return await self._run_bulk(lambda pipeline: self._rerun_pipeline_job(*pipeline), pipelines)
+
+    async def gl_get_pipeline_statuses(self, repo_ids: list[str], graphql: bool = False) -> dict[str, dict[str, Any]]:
+        """
+        Latest pipeline and job summary of many projects, fetched concurrently.
+
+        Args:
+            repo_ids: The projects, duplicates are asked once.
+            graphql: Ask GitLab GraphQL API for ``GRAPHQL_BATCH_SIZE`` projects per query,
+                instead of two REST requests per project (and one more per page of jobs).
+                A pipeline with more than ``GRAPHQL_JOBS_LIMIT`` jobs is asked by REST.
+                Both leave out the jobs which were retried.
+        Returns:
+            Repo id (as str) to ``pipeline_summary``. A project whose status could not be fetched has an ``error``.
+            With the pipeline status cache enabled, summaries younger than its ``ttl`` are read from redis.
+        """
+        repo_ids = list(dict.fromkeys(str(repo_id) for repo_id in repo_ids))
+        if self.pipeline_status_cache is not None:
+            return await self.pipeline_status_cache.async_get(
+                repo_ids, lambda expired: self._get_pipeline_statuses(expired, graphql)
+            )
+        return await self._get_pipeline_statuses(repo_ids, graphql)
+
+    async def _get_pipeline_statuses(self, repo_ids: list[str], graphql: bool) -> dict[str, dict[str, Any]]:
+        if not repo_ids:
+            return {}
+        if graphql:
+            batches = [tuple(repo_ids[i : i + GRAPHQL_BATCH_SIZE]) for i in range(0, len(repo_ids), GRAPHQL_BATCH_SIZE)]
+        else:
+            batches = [(repo_id,) for repo_id in repo_ids]
+
+        statuses = {}
+        for summaries in await asyncio.gather(*(self._memoized_pipeline_statuses(batch, graphql) for batch in batches)):
+            statuses.update(summaries)
+        return statuses
+
+    async def _memoized_pipeline_statuses(self, repo_ids: tuple[str, ...], graphql: bool) -> dict[str, dict[str, Any]]:
+        return await self.pipeline_status_memo.get(
+            (graphql, repo_ids), lambda: self._fetch_pipeline_statuses(repo_ids, graphql)
+        )
+
+    async def _fetch_pipeline_statuses(self, repo_ids: tuple[str, ...], graphql: bool) -> dict[str, dict[str, Any]]:
+        try:
+            if graphql:
+                return await self.gl_get_pipeline_statuses_graphql(list(repo_ids))
+            return {repo_id: await self.gl_get_latest_pipeline_status(repo_id) for repo_id in repo_ids}
+        except Exception as e:
+            return {repo_id: pipeline_error_summary(repo_id, str(e)) for repo_id in repo_ids}
+
+    async def gl_get_latest_pipeline_status(self, repo_id: str) -> dict[str, Any]:
+        params = {"per_page": 1, "order_by": "id", "sort": "desc"}
+        pipelines = (await self._get_page(f"/projects/{repo_id}/pipelines", params)).json()
+        if not pipelines:
+            return pipeline_summary(repo_id, None, [])
+        jobs_path = f"/projects/{repo_id}/pipelines/{pipelines[0]['id']}/jobs"
+        jobs = await self._get_all_pages(jobs_path)
+        return pipeline_summary(repo_id, pipelines[0], jobs)
+
+    async def gl_get_pipeline_statuses_graphql(self, repo_ids: list[str]) -> dict[str, dict[str, Any]]:
+        output = await self.api_post(
+            self.graphql_url,
+            headers=self.headers,
+            data={"query": LATEST_PIPELINES_QUERY, "variables": latest_pipelines_variables(repo_ids)},
+        )
+        result = output.json() if output.status_code == 200 else {}
+        if not result.get("data"):
+            errors = result.get("errors") or output.text
+            raise GitLabException(message=f"Error while querying pipelines, message: {errors}")
+        summaries = graphql_pipeline_summaries(repo_ids, result)
+        for repo_id in graphql_truncated_pipelines(result):
+            summaries[repo_id] = await self.gl_get_latest_pipeline_status(repo_id)
+        return summaries
+
+    ############################
+    # Branch
+    ############################
+
+    async def gl_get_branches(self, repo_id: str) -> list[dict[str, Any]]:
+        return await self._get_all_pages(f"/projects/{repo_id}/repository/branches")
+
+    def iter_branches(self, repo_id: str) -> AsyncIterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/repository/branches")
+
+    async def gl_create_branch(self, repo_id: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """
+        Args:
+            kwargs:
+            - *branch: Name of the branch.
+            - *ref: Branch name or commit SHA to create branch from.
+        """
+        output = await self.api_post(
+            f"/projects/{repo_id}/repository/branches",
+            params={"branch": kwargs["branch"], "ref": kwargs["ref"]},
+        )
+        return output.json()
+
+    async def gl_get_branch(self, repo_id: str, branch: str) -> dict[str, Any]:
+        output = await self.api_get(f"/projects/{repo_id}/repository/branches/{branch}")
+        return output.json()
+
+    async def gl_delete_branch(self, repo_id: str, branch: str) -> Response:
+        return await self.api_delete(f"/projects/{repo_id}/repository/branches/{branch}")
+
+    async def gl_list_protect_branches(self, repo_id: str) -> dict[str, Any]:
+        output = await self.api_get(f"/projects/{repo_id}/protected_branches")
+        return output.json()
+
+    async def gl_unprotect_branch(self, repo_id: str, branch: str) -> Response:
+        return await self.api_delete(f"/projects/{repo_id}/protected_branches/{branch}")
+
+    ############################
+    # Commit
+    ############################
+
+    async def gl_get_commits(
+        self, repo_id: str, branch: str, per_page=100, page=1, since=None, all_pages: bool = False
+    ) -> list[dict[str, Any]]:
+        """
+        Args:
+            all_pages: Ignore ``page`` and return the commits of every page.
+        """
+        params = {
+            "ref_name": branch,
+            "per_page": per_page,
+            "since": since,
+        }
+        if all_pages:
+            return await self._get_all_pages(f"/projects/{repo_id}/repository/commits", params=params)
+        output = await self.api_get(f"/projects/{repo_id}/repository/commits", params=params | {"page": page})
+        return output.json()
+
+    def iter_commits(self, repo_id: str, branch: str, since=None) -> AsyncIterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/repository/commits", params={"ref_name": branch, "since": since})
+
+    async def gl_get_commit(self, repo_id: str, sha: str) -> dict[str, Any]:
+        return (await self._get_page(f"/projects/{repo_id}/repository/commits/{sha}", {})).json()
+
+    async def get_commit_title(self, repo_id: str, sha: str) -> str:
+        """
+        Memoized title of a commit, a commit is looked up once per ``commit_title_ttl`` seconds.
+        """
+        commit = await self.commit_title_memo.get((repo_id, sha), lambda: self.gl_get_commit(repo_id, sha))
+        return commit["title"]
+
+    async def create_commit(self, repo_id: str, branch: str, commit_message: str, actions=[]) -> dict[str, Any]:
+        """
+        Args:
+            actions: [ create , delete , move , update , chmod ]
+        """
+        return (await self._create_commit(repo_id, branch, commit_message, actions)).json()
+
+    async def _create_commit(self, repo_id: str, branch: str, commit_message: str, actions=[]) -> Response:
+        return await self.api_post(
+            f"/projects/{repo_id}/repository/commits",
+            data={"branch": branch, "commit_message": commit_message, "actions": actions},
+        )
+
+    async def gl_get_commits_by_author(self, repo_id: str, branch: str, author: str = None) -> list[dict]:
+        """
+        The commits not made by ``author``, of every page when the commit index is enabled, else of the first page.
+        """
+        if self.commit_index is not None:
+            return await self.commit_index.async_get_commits_by_author(repo_id, branch, author)
+        commits = await self.gl_get_commits(repo_id, branch)
+        if author is None:
+            return commits
+        output = []
+        for commit in commits:
+            if commit.get("author_name") != author:
+                output.append(commit)
+        return output
+
+    async def gl_get_commits_by_members(self, repo_id: str, branch: str) -> list[dict[str, Any]]:
+        """
+        The commits of project members, of every page when the commit index is enabled, else of the first page.
+        """
+        if self.commit_index is not None:
+            return await self.commit_index.async_get_commits_by_members(repo_id, branch)
+        commits = await self.gl_get_commits(repo_id, branch)
+        output = []
+        for commit in commits:
+            if is_member_commit(commit):
+                output.append(commit)
+        return output
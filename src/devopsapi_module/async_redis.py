@@ -0,0 +1,285 @@
+import threading
+from typing import Any, AsyncIterator, Optional, Union
+import os
+import redis.asyncio
+
+from devopsapi_module.codec import CacheCodec
+from devopsapi_module.redis import (
+    DEFAULT_SCAN_COUNT,
+    SHOULD_UPDATE_TEMPLATE,
+    TEMPLATE_CACHE,
+    TEMPLATE_CACHE_GENERATION,
+    RedisBatch,
+    _decode_template_caches,
+    _encode_template_caches,
+    _queue_template_cache_changed,
+    _queue_template_cache_swap,
+    _template_cache_listening,
+    _to_bool,
+    get_template_codec,
+    template_local_cache,
+)
+
+
+class AsyncRedisBatch(RedisBatch):
+    """
+    ``RedisBatch`` of an ``AsyncRedisOperator``, use it with ``async with``.
+    """
+
+    def __enter__(self) -> "AsyncRedisBatch":
+        raise TypeError("Use 'async with' on the batch of AsyncRedisOperator.")
+
+    async def __aenter__(self) -> "AsyncRedisBatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.execute()
+        else:
+            await self.pipe.reset()
+
+    async def execute(self) -> list[Any]:
+        return self._convert(await self.pipe.execute())
+
+
+class AsyncRedisOperator:
+    """
+    asyncio counterpart of ``RedisOperator``, every method has the same
+    arguments and return value but must be awaited. The pool belongs to the
+    event loop it is first used in.
+    """
+
+    def __init__(self, redis_base_url: str, max_connections: Optional[int] = None, **pool_kwargs: Any):
+        """
+        :param redis_base_url: ``host:port``, or a ``redis://``, ``rediss://`` or ``unix://`` URL
+        :param max_connections: Max connections of the pool, unlimited by default
+        :param pool_kwargs: Other ``redis.asyncio.ConnectionPool`` options
+        """
+        self.redis_base_url = redis_base_url
+        if "://" in redis_base_url:
+            self.pool = redis.asyncio.ConnectionPool.from_url(
+                redis_base_url,
+                decode_responses=True,
+                max_connections=max_connections,
+                **pool_kwargs,
+            )
+        else:
+            self.pool = redis.asyncio.ConnectionPool(
+                host=self.redis_base_url.split(":")[0],
+                port=int(self.redis_base_url.split(":")[1]),
+                decode_responses=True,
+                max_connections=max_connections,
+                **pool_kwargs,
+            )
+        self.r = redis.asyncio.Redis(connection_pool=self.pool)
+
+    async def close(self) -> None:
+        await self.pool.disconnect()
+
+    #####################
+    # String type
+    #####################
+    async def str_get(self, key: str) -> str:
+        return await self.r.get(key)
+
+    async def str_mget(self, keys: list[str]) -> list[Optional[str]]:
+        return await self.r.mget(keys)
+
+    async def str_set(self, key: str, value: str) -> bool:
+        return await self.r.set(key, value)
+
+    async def str_mset(self, values: dict[str, str]) -> bool:
+        return await self.r.mset(values)
+
+    async def str_delete(self, key) -> bool:
+        return await self.r.delete(key) == 1
+
+    #####################
+    # Boolean type
+    #####################
+    async def bool_get(self, key: str) -> bool:
+        """
+        See ``RedisOperator.bool_get``.
+        """
+        value: Optional[str] = await self.r.get(key)
+        return _to_bool(value)
+
+    async def bool_set(self, key: str, value: bool) -> bool:
+        return await self.r.set(key, str(value).lower())
+
+    async def bool_delete(self, key: str) -> bool:
+        return await self.r.delete(key) == 1
+
+    #####################
+    # Dictionary type
+    #####################
+    async def dict_set_all(self, key: str, value: dict[str, str]) -> bool:
+        return await self.r.hset(key, mapping=value) == 1
+
+    async def dict_set_certain(self, key: str, sub_key: str, value: str) -> bool:
+        return await self.r.hset(key, sub_key, value) == 1
+
+    async def dict_set_many_keys(self, values: dict[str, dict[str, str]]) -> bool:
+        async with self.batch() as b:
+            for key, value in values.items():
+                b.dict_set_all(key, value)
+        return bool(b.results) and all(b.results)
+
+    async def dict_get_all(self, key: str) -> dict[str, str]:
+        return await self.r.hgetall(key)
+
+    async def dict_get_certain(self, key: str, sub_key: Union[str, int]) -> str:
+        return await self.r.hget(key, sub_key)
+
+    async def dict_get_many(self, key: str, sub_keys: list[Union[str, int]]) -> list[Optional[str]]:
+        return await self.r.hmget(key, sub_keys)
+
+    async def dict_delete_certain(self, key: str, sub_key: str) -> bool:
+        return await self.r.hdel(key, sub_key) == 1
+
+    async def dict_delete_all(self, key: str) -> str:
+        async with self.batch() as b:
+            b.dict_delete_all(key)
+        return b.results[0]
+
+    async def dict_unlink_all(self, key: str) -> bool:
+        return await self.r.unlink(key) == 1
+
+    def dict_iter(self, key: str, count: int = DEFAULT_SCAN_COUNT) -> AsyncIterator[tuple[str, str]]:
+        """
+        See ``RedisOperator.dict_iter``, use it with ``async for``.
+        """
+        return self.r.hscan_iter(key, count=count)
+
+    async def dict_len(self, key: str) -> int:
+        return await self.r.hlen(key)
+
+    #####################
+    # Batch
+    #####################
+    def batch(self, transaction: bool = False) -> AsyncRedisBatch:
+        """
+        See ``RedisOperator.batch``, use the batch with ``async with``.
+        """
+        return AsyncRedisBatch(self.r.pipeline(transaction=transaction))
+
+
+#####################
+# Operator registry
+#####################
+_async_operators: dict[str, AsyncRedisOperator] = {}
+_async_operators_lock = threading.Lock()
+
+
+def get_async_redis_operator(redis_base_url: Optional[str] = None, **pool_kwargs: Any) -> AsyncRedisOperator:
+    """
+    Get the async operator of a redis server, see ``get_redis_operator``.
+    """
+    redis_base_url = redis_base_url or os.getenv("REDIS_BASE_URL")
+    if not redis_base_url:
+        raise ValueError("Redis URL is not given and REDIS_BASE_URL is not set.")
+
+    operator = _async_operators.get(redis_base_url)
+    if operator is None:
+        with _async_operators_lock:
+            operator = _async_operators.get(redis_base_url)
+            if operator is None:
+                operator = _async_operators[redis_base_url] = AsyncRedisOperator(redis_base_url, **pool_kwargs)
+    return operator
+
+
+class _DefaultAsyncRedisOperator:
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_async_redis_operator(), name)
+
+
+async_redis_op: AsyncRedisOperator = _DefaultAsyncRedisOperator()
+
+
+def _reset_after_fork() -> None:
+    global _async_operators, _async_operators_lock
+    _async_operators = {}
+    _async_operators_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+#####################
+# Template cache
+#####################
+
+
+async def _template_cache_changed() -> None:
+    template_local_cache.clear()
+    pipe = async_redis_op.r.pipeline(transaction=False)
+    _queue_template_cache_changed(pipe)
+    await pipe.execute()
+
+
+async def update_template_cache_all(data: dict, swap: bool = True) -> None:
+    """
+    See ``devopsapi_module.redis.update_template_cache_all``.
+    """
+    data = _encode_template_caches(data) if data else data
+    if data and swap:
+        pipe = async_redis_op.r.pipeline(transaction=True)
+        _queue_template_cache_swap(pipe, data)
+        await pipe.execute()
+        template_local_cache.clear()
+    elif data:
+        await delete_template_cache()
+        await async_redis_op.dict_set_all(TEMPLATE_CACHE, data)
+        await async_redis_op.bool_set(SHOULD_UPDATE_TEMPLATE, False)
+        await _template_cache_changed()
+
+
+async def should_update_template_cache() -> bool:
+    return await async_redis_op.bool_get(SHOULD_UPDATE_TEMPLATE)
+
+
+async def delete_template_cache() -> None:
+    await async_redis_op.dict_unlink_all(TEMPLATE_CACHE)
+    await async_redis_op.bool_set(SHOULD_UPDATE_TEMPLATE, True)
+    await _template_cache_changed()
+
+
+async def update_template_cache(id, dict_val) -> None:
+    await async_redis_op.dict_set_certain(TEMPLATE_CACHE, id, get_template_codec().encode(dict_val))
+    await _template_cache_changed()
+
+
+async def get_template_caches_all() -> list[dict[str, Any]]:
+    """
+    See ``devopsapi_module.redis.get_template_caches_all``, both share ``template_local_cache``.
+    """
+    if _template_cache_listening():
+        generation = "listener"
+    else:
+        generation = await async_redis_op.str_get(TEMPLATE_CACHE_GENERATION)
+
+    out: Optional[list[dict[str, Any]]] = template_local_cache.get((TEMPLATE_CACHE, generation))
+    if out is not None:
+        return list(out)
+
+    version = template_local_cache.version
+    redis_data: dict[str, str] = await async_redis_op.dict_get_all(TEMPLATE_CACHE)
+    out = _decode_template_caches(redis_data)
+    template_local_cache.set((TEMPLATE_CACHE, generation), out, version=version)
+    return list(out)
+
+
+async def iter_template_caches(count: int = DEFAULT_SCAN_COUNT) -> AsyncIterator[dict[str, Any]]:
+    """
+    See ``devopsapi_module.redis.iter_template_caches``.
+    """
+    seen: set[str] = set()
+    async for template_id, value in async_redis_op.dict_iter(TEMPLATE_CACHE, count=count):
+        if template_id in seen:
+            continue
+        seen.add(template_id)
+        yield {template_id: CacheCodec.decode(value)}
+
+
+async def count_template_number() -> int:
+    return await async_redis_op.dict_len(TEMPLATE_CACHE)
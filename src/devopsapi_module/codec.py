@@ -0,0 +1,110 @@
+import base64
+import json
+import zlib
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+CODEC_VERSION = "v1"
+SERIALIZER_TAGS = {"json": "j", "msgpack": "m"}
+COMPRESSION_TAGS = {None: "n", "zlib": "z", "lz4": "l"}
+
+
+def _json_dumps(value: Any) -> bytes:
+    if orjson is not None:
+        # Keep the output of ``json.dumps(value, default=str)``: datetimes and
+        # other unknown types go through ``str``, non-str keys are allowed.
+        return orjson.dumps(value, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str).encode()
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class CacheCodec:
+    """
+    Encode cache values to strings and back.
+
+    Values are serialized by JSON (orjson when installed) or msgpack, and
+    compressed by zlib or lz4 when they are larger than ``compress_threshold``
+    bytes. Anything but uncompressed JSON is written as
+    ``v1:<serializer><compression>:<base64 payload>``, the tag tells readers
+    how to decode it. Uncompressed JSON is written untagged as plain JSON,
+    so readers without this codec can still read it during a rollout.
+    Untagged values are always decoded as JSON.
+    """
+
+    def __init__(self, serializer: str = "json", compression: Optional[str] = None, compress_threshold: int = 1024):
+        """
+        :param serializer: "json" or "msgpack"
+        :param compression: None, "zlib" or "lz4"
+        :param compress_threshold: Values whose serialized size is at most this many bytes are not compressed
+        """
+        if serializer not in SERIALIZER_TAGS:
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if compression not in COMPRESSION_TAGS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if serializer == "msgpack" and msgpack is None:
+            raise ValueError("Serializer msgpack needs the msgpack package.")
+        if compression == "lz4" and lz4_frame is None:
+            raise ValueError("Compression lz4 needs the lz4 package.")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+
+    def encode(self, value: Any) -> str:
+        if self.serializer == "msgpack":
+            data = msgpack.packb(value, default=str, use_bin_type=True)
+        else:
+            data = _json_dumps(value)
+
+        compression = self.compression if len(data) > self.compress_threshold else None
+        if compression == "zlib":
+            data = zlib.compress(data)
+        elif compression == "lz4":
+            data = lz4_frame.compress(data)
+
+        if self.serializer == "json" and compression is None:
+            return data.decode()
+        tag = f"{CODEC_VERSION}:{SERIALIZER_TAGS[self.serializer]}{COMPRESSION_TAGS[compression]}:"
+        return tag + base64.b64encode(data).decode()
+
+    @staticmethod
+    def decode(text: str) -> Any:
+        if not text.startswith(f"{CODEC_VERSION}:"):
+            return _json_loads(text)
+
+        _, tags, payload = text.split(":", 2)
+        serializer, compression = tags[0], tags[1]
+        data = base64.b64decode(payload)
+
+        if compression == COMPRESSION_TAGS["zlib"]:
+            data = zlib.decompress(data)
+        elif compression == COMPRESSION_TAGS["lz4"]:
+            if lz4_frame is None:
+                raise ValueError("Value is compressed by lz4 but the lz4 package is not installed.")
+            data = lz4_frame.decompress(data)
+
+        if serializer == SERIALIZER_TAGS["msgpack"]:
+            if msgpack is None:
+                raise ValueError("Value is serialized by msgpack but the msgpack package is not installed.")
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return _json_loads(data)
@@ -1,18 +1,53 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from module.request import Request
-from typing import Any
+import codecs
+from typing import Any, Iterator, Union
 from gitlab import Gitlab as IIIGitlab
 from module.exception import GitLabException
+from module.bulk import DEFAULT_BULK_WORKERS, run_bulk
+from module.gitlab_common import (
+    DEFAULT_REPO,
+    GRAPHQL_BATCH_SIZE,
+    LATEST_PIPELINES_QUERY,
+    CONSOLE_CHUNK_SIZE,
+    RESPONSE_CACHE_TTLS,
+    console_range_headers,
+    console_skip_bytes,
+    create_user_data,
+    graphql_pipeline_summaries,
+    graphql_truncated_pipelines,
+    is_member_commit,
+    keyset_pagination_params,
+    latest_pipelines_variables,
+    pipeline_error_summary,
+    pipeline_summary,
+    utf8_complete_length,
+)
+from module.commit_sync import CommitSync
+from module.pipeline_status_cache import PipelineStatusCache
+from module.memo import TTLMemo
+from module.pagination import DEFAULT_MAX_WORKERS, DEFAULT_PER_PAGE, fetch_all_pages, iter_pages
 
 # ======== for typing ========
 from requests.models import Response
 
 
-DEFAULT_REPO = "iiidevops"
-
-
 class GitLabOperator(Request):
     _instance = None
+    page_workers: int = DEFAULT_MAX_WORKERS  # pages of one listing fetched at the same time
+    # "offset" fetches the pages of a listing concurrently, "keyset" walks them one after another where GitLab
+    # offers it, which keeps deep listings fast at the cost of concurrency and of the default order of the listing.
+    pagination: str = "offset"
+    bulk_workers: int = DEFAULT_BULK_WORKERS  # requests of one bulk call sent at the same time
+    namespace_ttl: float = 300  # seconds a namespace looked up by name is remembered
+    commit_title_ttl: float = 3600  # seconds the title of a commit is remembered
+    commit_index: Union[CommitSync, None] = None
+    pipeline_status_cache: Union[PipelineStatusCache, None] = None
+
+    _namespace_memo: Union[TTLMemo, None] = None
+    _commit_title_memo: Union[TTLMemo, None] = None
+    _pipeline_status_memo: Union[TTLMemo, None] = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -21,6 +56,7 @@ class GitLabOperator(Request):
 
     def __init__(self):
         self.url = f'{os.getenv("GITLAB_BASE_URL")}api/v4'
+        self.graphql_url = f'{os.getenv("GITLAB_BASE_URL")}api/graphql'
         private_token = os.getenv("GITLAB_PRIVATE_TOKEN")
 
         self.headers = {"Authorization": f"Bearer {private_token}"}
@@ -30,24 +66,135 @@ class GitLabOperator(Request):
             ssl_verify=False,
         )
 
-    ############################
-    # Namespace
-    ############################
-    def gl_get_specific_namespace(self, namespace_name: str) -> dict[str, Any]:
-        rets = self.api_get("/namespaces", params={"search": namespace_name}, headers=self.headers).json()
-        print(rets)
-        for ret in rets:
-            if ret["name"] == namespace_name:
-                return ret
+    def enable_response_cache(self, redis_op, ttls: dict[str, int] = None, stale_ttl: int = 3600) -> None:
+        """
+        Cache GET responses in redis, by default the TTLs of ``RESPONSE_CACHE_TTLS`` are used.
+        """
+        super().enable_response_cache(redis_op, ttls if ttls is not None else RESPONSE_CACHE_TTLS, stale_ttl)
 
-        return {}
+    def enable_commit_index(self, redis_op, overlap: float = 3600) -> None:
+        """
+        Answer ``gl_get_commits_by_author`` and ``gl_get_commits_by_members`` from a redis index of every commit of
+        the branch, synced incrementally on each call, see ``CommitSync``.
+
+        Args:
+            redis_op: The RedisOperator the index is kept by.
+            overlap: Seconds before the newest indexed commit which are fetched again, for commits pushed late.
+        """
+        self.commit_index = CommitSync(self, redis_op, overlap=overlap)
+
+    def disable_commit_index(self) -> None:
+        self.commit_index = None
+
+    def enable_pipeline_status_cache(self, redis_op, ttl: int = 20) -> None:
+        """
+        Serve ``gl_get_pipeline_statuses`` from redis for ``ttl`` seconds, GitLab is asked for the expired projects
+        only, see ``PipelineStatusCache``.
+
+        Args:
+            redis_op: The RedisOperator the summaries are cached by.
+            ttl: Seconds a summary is served from redis.
+        """
+        self.pipeline_status_cache = PipelineStatusCache(redis_op, ttl=ttl)
+
+    def disable_pipeline_status_cache(self) -> None:
+        self.pipeline_status_cache = None
+
+    def _run_bulk(self, send, items) -> list[dict[str, Any]]:
+        """
+        ``run_bulk`` on ``bulk_workers`` workers. With the rate limiter enabled an item is sent once through it, the
+        limiter retries a 429 and the bulk run shares its pause instead of retrying and pausing on its own.
+        """
+        if self.rate_limiter is None:
+            return run_bulk(send, items, max_workers=self.bulk_workers)
+        return run_bulk(send, items, max_workers=self.bulk_workers, attempts=1, gate=self.rate_limiter.gate)
+
+    @property
+    def namespace_memo(self) -> TTLMemo:
+        if self._namespace_memo is None:
+            self._namespace_memo = TTLMemo(self.namespace_ttl)
+        return self._namespace_memo
+
+    @property
+    def commit_title_memo(self) -> TTLMemo:
+        if self._commit_title_memo is None:
+            self._commit_title_memo = TTLMemo(self.commit_title_ttl)
+        return self._commit_title_memo
+
+    @property
+    def pipeline_status_memo(self) -> TTLMemo:
+        # Nothing is kept, identical status requests in flight are sent once. See ``enable_pipeline_status_cache``.
+        if self._pipeline_status_memo is None:
+            self._pipeline_status_memo = TTLMemo(0)
+        return self._pipeline_status_memo
+
+    def _get_page(self, path: str, params: dict[str, Any], headers: dict[str, Any] = None) -> Response:
+        output = self.api_get(path, params=params, headers=headers)
+        if output.status_code != 200:
+            raise GitLabException(message=f"Error while getting {path}, message: {output.text}")
+        return output
+
+    def _pagination_params(self, path: str, params: Union[dict[str, Any], None]) -> tuple[dict[str, Any], bool]:
+        """
+        Query params of the listing and whether it is paginated by keyset.
+        """
+        params = {"per_page": DEFAULT_PER_PAGE, **(params or {})}
+        if self.pagination == "keyset":
+            keyset_params = keyset_pagination_params(path, params)
+            if keyset_params is not None:
+                return keyset_params, True
+        return params, False
+
+    def _get_all_pages(
+        self,
+        path: str,
+        params: dict[str, Any] = None,
+        headers: dict[str, Any] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Get every page of a listing, pages after the first one are fetched concurrently.
+        """
+        params, keyset = self._pagination_params(path, params)
+        return fetch_all_pages(
+            lambda page_params: self._get_page(path, page_params, headers=headers),
+            params,
+            max_workers=self.page_workers,
+            keyset=keyset,
+        )
+
+    def _iter_pages(
+        self,
+        path: str,
+        params: dict[str, Any] = None,
+        headers: dict[str, Any] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Lazily yield every item of a listing, the next page is prefetched while the current one is consumed.
+        """
+        params, keyset = self._pagination_params(path, params)
+        return iter_pages(
+            lambda page_params: self._get_page(path, page_params, headers=headers),
+            params,
+            keyset=keyset,
+        )
 
     #####################
     # Project
     #####################
     def gl_get_all_project(self) -> list[dict[str, Any]]:
+        if self.pagination == "keyset":
+            return self.gl.projects.list(all=True, pagination="keyset", order_by="id", per_page=DEFAULT_PER_PAGE)
         return self.gl.projects.list(all=True)
 
+    def iter_projects(self, kwargs: dict[str, Any] = None) -> Iterator[dict[str, Any]]:
+        """
+        Lazy counterpart of ``gl_get_all_project``, yields project dicts page by page.
+
+        Args:
+            kwargs: Extra filters of the project listing, e.g. search, owned, order_by.
+        """
+        return self._iter_pages("/projects", params=kwargs, headers=self.headers)
+
     def gl_get_project_by_name(self, project_name: str) -> dict[str, Any]:
         project_list = self.api_get("/projects", params={"search": project_name}, headers=self.headers).json()
 
@@ -77,15 +224,35 @@ class GitLabOperator(Request):
             - *description: project's description
         """
         group_name = kwargs.pop("group_name", DEFAULT_REPO)
-        group_info = self.gl_get_specific_namespace(group_name)
-        if not group_info:
-            return self.gl_create_project({"name": kwargs["name"], "description": kwargs["description"]})
-        return self.gl_create_project(
-            {"name": kwargs["name"], "description": kwargs["description"], "namespace_id": group_info["id"]}
-        )
+        return self.gl_create_project(self._create_project_args(kwargs, group_name))
+
+    def _create_project_args(self, kwargs: dict[str, Any], group_name: str) -> dict[str, Any]:
+        args = {"name": kwargs["name"], "description": kwargs["description"]}
+        group_info = self.get_namespace(group_name)
+        if group_info:
+            args["namespace_id"] = group_info["id"]
+        return args
+
+    def bulk_create_projects(self, projects: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Create many projects concurrently, the namespace of each group is looked up once.
+
+        Args:
+            projects: Each one the ``kwargs`` of ``create_project``, they are not modified.
+        Returns:
+            One report per project in the order of ``projects``, see ``run_bulk``. ``item`` is the project name.
+        """
+        def send(project: dict[str, Any]) -> Response:
+            args = self._create_project_args(project, project.get("group_name", DEFAULT_REPO))
+            return self.api_post("/projects", params=args, headers=self.headers)
+
+        reports = self._run_bulk(send, projects)
+        for report in reports:
+            report["item"] = report["item"]["name"]
+        return reports
 
     def gl_get_project(self, repo_id: str) -> Response:
-        return self.api_get(f"/projects/{repo_id}", {"statistics": "true"}, headers=self.headers).json()
+        return self.api_get(f"/projects/{repo_id}", params={"statistics": "true"}, headers=self.headers).json()
 
     def gl_update_project(self, repo_id: str, description: str) -> Response:
         params = {"description": description}
@@ -122,15 +289,7 @@ class GitLabOperator(Request):
             - password
             - skip_confirmation: Do not need to confirm, False by default.
         """
-        data = {
-            "name": args["name"],
-            "email": args["email"],
-            "username": args["login"],
-            "password": user_source_password,
-            "skip_confirmation": True,
-        }
-        if is_admin:
-            data["admin"] = True
+        data = create_user_data(args, user_source_password, is_admin=is_admin)
         return self.api_post("/users", data=data).json()
 
     def gl_update_password(self, repository_user_id: str, new_pwd: str) -> Response:
@@ -163,26 +322,84 @@ class GitLabOperator(Request):
     #####################
     # Project's members
     #####################
-    def gl_project_list_member(self, repo_id: str, kwargs: dict[str, Any] = {}) -> Response:
+    def gl_project_list_member(
+        self, repo_id: str, kwargs: dict[str, Any] = {}, all_pages: bool = False
+    ) -> Union[Response, list[dict[str, Any]]]:
         """
         Args:
             kwargs:
             - page(int)
             - per_page(int)
             - query(string): Search for a specific members
+            all_pages: Return the members of every page as a list instead of the response of one page.
         """
+        if all_pages:
+            params = {k: v for k, v in kwargs.items() if k != "page"}
+            return self._get_all_pages(f"/projects/{repo_id}/members", params=params)
         return self.api_get(f"/projects/{repo_id}/members", params=kwargs)
 
-    def gl_project_add_member(self, repo_id: str, repository_user_id: str) -> Response:
+    def iter_members(self, repo_id: str, query: str = None) -> Iterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/members", params={"query": query})
+
+    def gl_project_add_member(self, repo_id: str, repository_user_id: str, access_level: int = 40) -> Response:
+        """
+        Args:
+            access_level: 10 guest, 20 reporter, 30 developer, 40 maintainer, 50 owner
+        """
         params = {
             "user_id": repository_user_id,
-            "access_level": 40,
+            "access_level": access_level,
         }
         return self.api_post(f"/projects/{repo_id}/members", params=params)
 
     def gl_project_delete_member(self, repo_id: str, repository_user_id: str) -> Response:
         return self.api_delete(f"/projects/{repo_id}/members/{repository_user_id}")
 
+    #####################
+    # Bulk
+    #####################
+    def bulk_create_users(self, users: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Create many users concurrently, at most ``bulk_workers`` at a time, honoring the GitLab rate limit.
+
+        Args:
+            users: Each one the ``args`` of ``gl_create_user`` with two more keys:
+            - *password
+            - is_admin
+        Returns:
+            One report per user in the order of ``users``, see ``run_bulk``. ``item`` is the login.
+        """
+        def send(user: dict[str, Any]) -> Response:
+            data = create_user_data(user, user["password"], is_admin=user.get("is_admin", False))
+            return self.api_post("/users", data=data)
+
+        reports = self._run_bulk(send, users)
+        for report in reports:
+            report["item"] = report["item"]["login"]
+        return reports
+
+    def bulk_add_members(
+        self, repo_ids: list[str], user_ids: list[str], access_level: int = 40
+    ) -> list[dict[str, Any]]:
+        """
+        Add every user to every project concurrently, a failed pair does not stop the others.
+
+        Returns:
+            One report per (repo_id, user_id) pair, see ``run_bulk``. ``item`` is the pair.
+        """
+        pairs = [(repo_id, user_id) for repo_id in repo_ids for user_id in user_ids]
+        return self._run_bulk(lambda pair: self.gl_project_add_member(*pair, access_level=access_level), pairs)
+
+    def bulk_remove_members(self, repo_ids: list[str], user_ids: list[str]) -> list[dict[str, Any]]:
+        """
+        Remove every user from every project concurrently, a failed pair does not stop the others.
+
+        Returns:
+            One report per (repo_id, user_id) pair, see ``run_bulk``. ``item`` is the pair.
+        """
+        pairs = [(repo_id, user_id) for repo_id in repo_ids for user_id in user_ids]
+        return self._run_bulk(lambda pair: self.gl_project_delete_member(*pair), pairs)
+
     ############################
     # Variable
     ############################
@@ -252,12 +469,33 @@ class GitLabOperator(Request):
         branch: str = None,
         sort: str = "desc",
         with_pagination: bool = False,
+        all_pages: bool = False,
     ) -> tuple[list[dict[str, Any]], dict[str, int]]:
+        """
+        Args:
+            all_pages: Ignore ``start`` and return the pipelines of every page, ``limit`` is the page size.
+        """
         page = (start // limit) + 1
         params = {"page": page, "per_page": limit, "sort": sort}
         if branch is not None:
             params["ref"] = branch
 
+        if all_pages:
+            params.pop("page")
+            results = self._get_all_pages(f"/projects/{repo_id}/pipelines", params=params)
+            if not with_pagination:
+                return results
+            total = len(results)
+            pagination = {
+                "total": total,
+                "current": 1,
+                "prev": 0,
+                "next": 0,
+                "pages": 1,
+                "per_page": total,
+            }
+            return results, pagination
+
         ret = self.api_get(f"/projects/{repo_id}/pipelines", params=params)
         results = ret.json()
         if not with_pagination:
@@ -274,12 +512,66 @@ class GitLabOperator(Request):
         }
         return results, pagination
 
+    def iter_pipelines(self, repo_id: int, branch: str = None, sort: str = "desc") -> Iterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/pipelines", params={"ref": branch, "sort": sort})
+
     def gl_get_single_pipeline(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
         return self.api_get(f"/projects/{repo_id}/pipelines/{pipeline_id}").json()
 
     def gl_get_pipeline_console(self, repo_id: int, job_id: int) -> str:
         return self.api_get(f"/projects/{repo_id}/jobs/{job_id}/trace").content.decode("utf-8")
 
+    def _iter_console_bytes(
+        self, repo_id: int, job_id: int, offset: int = 0, chunk_size: int = CONSOLE_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        path, headers = f"/projects/{repo_id}/jobs/{job_id}/trace", {**self.headers, **console_range_headers(offset)}
+        with self.api_request("GET", path, headers=headers, stream=True) as output:
+            skip = console_skip_bytes(output.status_code, offset)
+            if skip is None:
+                return
+            if output.status_code not in (200, 206):
+                raise GitLabException(message=f"Error while getting log of job {job_id}, message: {output.text}")
+            for chunk in output.iter_content(chunk_size):
+                if skip:
+                    chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                if chunk:
+                    yield chunk
+
+    def iter_pipeline_console(
+        self, repo_id: int, job_id: int, offset: int = 0, chunk_size: int = CONSOLE_CHUNK_SIZE
+    ) -> Iterator[str]:
+        """
+        Stream the log of a job as decoded chunks, only one chunk is held in memory.
+
+        Args:
+            offset: Byte offset to start from, e.g. the one returned by ``gl_tail_pipeline_console``.
+            chunk_size: Bytes read at a time.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in self._iter_console_bytes(repo_id, job_id, offset, chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    def gl_tail_pipeline_console(self, repo_id: int, job_id: int, offset: int = 0) -> tuple[str, int]:
+        """
+        Get the part of a job log written after ``offset``, for polling a running job.
+
+        The bytes are asked by an HTTP Range header. When GitLab ignores it the
+        whole log is streamed and the known part dropped, so only the new part
+        is kept in memory either way.
+
+        Returns:
+            (new text, offset to pass on the next call), a character cut by the
+            end of the log is left for the next call.
+        """
+        data = b"".join(self._iter_console_bytes(repo_id, job_id, offset))
+        complete = utf8_complete_length(data)
+        return data[:complete].decode("utf-8", errors="replace"), offset + complete
+
     def gl_create_pipeline(self, repo_id: int, branch: str) -> dict[str, Any]:
         return self.api_post(f"/projects/{repo_id}/pipeline", {"ref": branch}).json()
 
@@ -289,8 +581,14 @@ class GitLabOperator(Request):
     ############################
     # Namespace
     ############################
-    def gl_list_namespace(self) -> dict[str, Any]:
-        return self.api_get("/namespaces").json()
+    def gl_list_namespace(self) -> list[dict[str, Any]]:
+        return self._get_all_pages("/namespaces")
+
+    def get_namespace(self, namespace_name: str) -> dict[str, Any]:
+        """
+        Memoized ``gl_get_specific_namespace``, a namespace is looked up once per ``namespace_ttl`` seconds.
+        """
+        return self.namespace_memo.get(namespace_name, lambda: self.gl_get_specific_namespace(namespace_name))
 
     def gl_get_specific_namespace(self, namespace_name: str) -> dict[str, Any]:
         rets = self.api_get("/namespaces", params={"search": namespace_name}).json()
@@ -314,29 +612,109 @@ class GitLabOperator(Request):
         return self.api_get(f"/projects/{repo_id}/pipelines/{pipeline_id}/jobs").json()
 
     def rerun_pipeline_job(self, repo_id: int, pipeline_id: int) -> dict[str, Any]:
+        return self._rerun_pipeline_job(repo_id, pipeline_id).json()
+
+    def _rerun_pipeline_job(self, repo_id: int, pipeline_id: int) -> Response:
+        """
+        Rerun a pipeline by an empty commit titled like the commit the pipeline ran on.
+        """
         pipeline_info = self.gl_get_single_pipeline(repo_id, pipeline_id)
         sha, branch = pipeline_info["sha"], pipeline_info["ref"]
-        commit_msg = self.single_commit(repo_id, sha)["title"]
-        return self.create_commit(repo_id, branch, commit_msg)
+        commit_msg = self.get_commit_title(repo_id, sha)
+        return self._create_commit(repo_id, branch, commit_msg)
+
+    def bulk_rerun_pipeline_jobs(self, pipelines: list[tuple[int, int]]) -> list[dict[str, Any]]:
+        """
+        Rerun many pipelines concurrently, the title of a commit shared by several pipelines is looked up once.
+
+        Args:
+            pipelines: (repo_id, pipeline_id) pairs
+        Returns:
+            One report per pair in the order of ``pipelines``, see ``run_bulk``. ``item`` is the pair.
+        """
+        return self._run_bulk(lambda pipeline: self._rerun_pipeline_job(*pipeline), pipelines)
+
+    def gl_get_pipeline_statuses(self, repo_ids: list[str], graphql: bool = False) -> dict[str, dict[str, Any]]:
+        """
+        Latest pipeline and job summary of many projects, fetched concurrently.
+
+        Args:
+            repo_ids: The projects, duplicates are asked once.
+            graphql: Ask GitLab GraphQL API for ``GRAPHQL_BATCH_SIZE`` projects per query,
+                instead of two REST requests per project (and one more per page of jobs).
+                A pipeline with more than ``GRAPHQL_JOBS_LIMIT`` jobs is asked by REST.
+                Both leave out the jobs which were retried.
+        Returns:
+            Repo id (as str) to ``pipeline_summary``. A project whose status could not be fetched has an ``error``.
+            With the pipeline status cache enabled, summaries younger than its ``ttl`` are read from redis.
+        """
+        repo_ids = list(dict.fromkeys(str(repo_id) for repo_id in repo_ids))
+        if self.pipeline_status_cache is not None:
+            return self.pipeline_status_cache.get(
+                repo_ids, lambda expired: self._get_pipeline_statuses(expired, graphql)
+            )
+        return self._get_pipeline_statuses(repo_ids, graphql)
+
+    def _get_pipeline_statuses(self, repo_ids: list[str], graphql: bool) -> dict[str, dict[str, Any]]:
+        if not repo_ids:
+            return {}
+        if graphql:
+            batches = [tuple(repo_ids[i : i + GRAPHQL_BATCH_SIZE]) for i in range(0, len(repo_ids), GRAPHQL_BATCH_SIZE)]
+        else:
+            batches = [(repo_id,) for repo_id in repo_ids]
+
+        statuses = {}
+        with ThreadPoolExecutor(max_workers=min(self.bulk_workers, len(batches))) as executor:
+            for summaries in executor.map(
+                lambda batch: self.pipeline_status_memo.get(
+                    (graphql, batch), lambda: self._fetch_pipeline_statuses(batch, graphql)
+                ),
+                batches,
+            ):
+                statuses.update(summaries)
+        return statuses
+
+    def _fetch_pipeline_statuses(self, repo_ids: tuple[str, ...], graphql: bool) -> dict[str, dict[str, Any]]:
+        try:
+            if graphql:
+                return self.gl_get_pipeline_statuses_graphql(list(repo_ids))
+            return {repo_id: self.gl_get_latest_pipeline_status(repo_id) for repo_id in repo_ids}
+        except Exception as e:
+            return {repo_id: pipeline_error_summary(repo_id, str(e)) for repo_id in repo_ids}
+
+    def gl_get_latest_pipeline_status(self, repo_id: str) -> dict[str, Any]:
+        params = {"per_page": 1, "order_by": "id", "sort": "desc"}
+        pipelines = self._get_page(f"/projects/{repo_id}/pipelines", params).json()
+        if not pipelines:
+            return pipeline_summary(repo_id, None, [])
+        jobs_path = f"/projects/{repo_id}/pipelines/{pipelines[0]['id']}/jobs"
+        jobs = self._get_all_pages(jobs_path)
+        return pipeline_summary(repo_id, pipelines[0], jobs)
+
+    def gl_get_pipeline_statuses_graphql(self, repo_ids: list[str]) -> dict[str, dict[str, Any]]:
+        output = self.api_post(
+            self.graphql_url,
+            headers=self.headers,
+            data={"query": LATEST_PIPELINES_QUERY, "variables": latest_pipelines_variables(repo_ids)},
+        )
+        result = output.json() if output.status_code == 200 else {}
+        if not result.get("data"):
+            errors = result.get("errors") or output.text
+            raise GitLabException(message=f"Error while querying pipelines, message: {errors}")
+        summaries = graphql_pipeline_summaries(repo_ids, result)
+        for repo_id in graphql_truncated_pipelines(result):
+            summaries[repo_id] = self.gl_get_latest_pipeline_status(repo_id)
+        return summaries
 
     ############################
     # Branch
     ############################
 
     def gl_get_branches(self, repo_id: str) -> list[dict[str, Any]]:
-        gl_total_branch_list = []
-        total_pages = 1
-        i = 1
-        while i <= total_pages:
-            params = {"per_page": 25, "page": i}
-            output = self.api_get(f"/projects/{repo_id}/repository/branches", params=params)
-            if output.status_code != 200:
-                raise GitLabException(message=f"Error while getting git branches, message: {output.json}")
-            gl_total_branch_list.extend(output.json())
-            total_pages = int(output.headers.get("x-total-pages", total_pages))
-            i += 1
-
-        return gl_total_branch_list
+        return self._get_all_pages(f"/projects/{repo_id}/repository/branches")
+
+    def iter_branches(self, repo_id: str) -> Iterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/repository/branches")
 
     def gl_create_branch(self, repo_id: str, kwargs: dict[str, Any]) -> dict[str, Any]:
         """
@@ -371,28 +749,54 @@ class GitLabOperator(Request):
     # Commit
     ############################
 
-    def gl_get_commits(self, repo_id: str, branch: str, per_page=100, page=1, since=None) -> dict[str, Any]:
-        return self.api_get(
-            f"/projects/{repo_id}/repository/commits",
-            params={
-                "ref_name": branch,
-                "per_page": per_page,
-                "since": since,
-                "page": page,
-            },
-        ).json()
+    def gl_get_commits(
+        self, repo_id: str, branch: str, per_page=100, page=1, since=None, all_pages: bool = False
+    ) -> list[dict[str, Any]]:
+        """
+        Args:
+            all_pages: Ignore ``page`` and return the commits of every page.
+        """
+        params = {
+            "ref_name": branch,
+            "per_page": per_page,
+            "since": since,
+        }
+        if all_pages:
+            return self._get_all_pages(f"/projects/{repo_id}/repository/commits", params=params)
+        return self.api_get(f"/projects/{repo_id}/repository/commits", params=params | {"page": page}).json()
+
+    def iter_commits(self, repo_id: str, branch: str, since=None) -> Iterator[dict[str, Any]]:
+        return self._iter_pages(f"/projects/{repo_id}/repository/commits", params={"ref_name": branch, "since": since})
+
+    def gl_get_commit(self, repo_id: str, sha: str) -> dict[str, Any]:
+        return self._get_page(f"/projects/{repo_id}/repository/commits/{sha}", {}).json()
+
+    def get_commit_title(self, repo_id: str, sha: str) -> str:
+        """
+        Memoized title of a commit, a commit is looked up once per ``commit_title_ttl`` seconds.
+        """
+        commit = self.commit_title_memo.get((repo_id, sha), lambda: self.gl_get_commit(repo_id, sha))
+        return commit["title"]
 
     def create_commit(self, repo_id: str, branch: str, commit_message: str, actions=[]) -> dict[str, Any]:
         """
         Args:
             actions: [ create , delete , move , update , chmod ]
         """
+        return self._create_commit(repo_id, branch, commit_message, actions).json()
+
+    def _create_commit(self, repo_id: str, branch: str, commit_message: str, actions=[]) -> Response:
         return self.api_post(
             f"/projects/{repo_id}/repository/commits",
             data={"branch": branch, "commit_message": commit_message, "actions": actions},
-        ).json()
+        )
 
     def gl_get_commits_by_author(self, repo_id: str, branch: str, author: str = None) -> list[dict]:
+        """
+        The commits not made by ``author``, of every page when the commit index is enabled, else of the first page.
+        """
+        if self.commit_index is not None:
+            return self.commit_index.get_commits_by_author(repo_id, branch, author)
         commits = self.gl_get_commits(repo_id, branch)
         if author is None:
             return commits
@@ -403,14 +807,14 @@ class GitLabOperator(Request):
         return output
 
     def gl_get_commits_by_members(self, repo_id: str, branch: str) -> list[dict[str, Any]]:
+        """
+        The commits of project members, of every page when the commit index is enabled, else of the first page.
+        """
+        if self.commit_index is not None:
+            return self.commit_index.get_commits_by_members(repo_id, branch)
         commits = self.gl_get_commits(repo_id, branch)
         output = []
         for commit in commits:
-            if (
-                commit.get("author_name") != "Administrator"
-                and commit.get("committer_name") != "Administrator"
-                and not commit.get("author_name", "").startswith("專案管理機器人")
-                and not commit.get("committer_name", "").startswith("專案管理機器人")
-            ):
+            if is_member_commit(commit):
                 output.append(commit)
         return output
@@ -0,0 +1,514 @@
+"""
+Issue families and issue / project / user relations with secondary indexes.
+
+The hashes ``ISSUE_FAMILIES_KEY`` and ``ISSUE_PJ_USER_RELATION_KEY`` stay
+the source of truth and keep their layout:
+
+    - issue_families: parent issue id -> json list of child issue ids
+    - issue_pj_user_relation: issue id -> json {"project_id": int, "user_ids": [int]}
+
+Next to them the indexes below are kept, each update of a hash and its
+indexes is one Lua script so readers never see them out of sync:
+
+    - issue_families:parent                      hash, child issue id -> parent issue id
+    - issue_families:children:{parent}           set of child issue ids
+    - issue_pj_user_relation:project:{project}   set of issue ids
+    - issue_pj_user_relation:user_issues:{user}  set of issue ids
+    - issue_pj_user_relation:user_projects:{user} sorted set of project ids, scored by the user's issue count
+
+Queries are then answered in O(result) instead of reading the whole hash.
+Indexes of data written before this module are built by the ``rebuild_*``
+functions. They build the indexes under temporary keys and swap them in
+by one MULTI/EXEC, so readers see the old or the new indexes, never
+partial ones.
+"""
+
+import json
+from typing import Iterable, Optional, Union
+
+from redis.commands.core import Script
+
+from devopsapi_module.redis import (
+    DEFAULT_SCAN_COUNT,
+    ISSUE_FAMILIES_KEY,
+    ISSUE_PJ_USER_RELATION_KEY,
+    lua_script,
+    redis_op,
+)
+
+ISSUE_PARENTS_KEY = f"{ISSUE_FAMILIES_KEY}:parent"
+ISSUE_CHILDREN_PREFIX = f"{ISSUE_FAMILIES_KEY}:children"
+PROJECT_ISSUES_PREFIX = f"{ISSUE_PJ_USER_RELATION_KEY}:project"
+USER_ISSUES_PREFIX = f"{ISSUE_PJ_USER_RELATION_KEY}:user_issues"
+USER_PROJECTS_PREFIX = f"{ISSUE_PJ_USER_RELATION_KEY}:user_projects"
+# A rebuilt index key is written under this prefix, then renamed over the key.
+ISSUE_INDEX_REBUILD_PREFIX = "issue_index_rebuild"
+
+IssueId = Union[int, str]
+
+# KEYS[1]: families hash, KEYS[2]: parent index hash, KEYS[3..]: children sets
+# ARGV[1]: number n of parents whose children sets are in KEYS[3..], ARGV[2..n+1]: those parents,
+# ARGV[n+2..]: arguments of the script, ``args`` below
+# Every key is declared by the caller, who reads the current parents first.
+# A script finding an issue whose parent was not declared (it changed in
+# between) returns 0 before writing anything, and is sent again.
+_FAMILY_LUA_HELPERS = """
+local families, parents = KEYS[1], KEYS[2]
+local children_keys, args = {}, {}
+local declared = tonumber(ARGV[1])
+for i = 1, declared do
+    children_keys[ARGV[i + 1]] = KEYS[i + 2]
+end
+for i = declared + 2, #ARGV do
+    args[#args + 1] = ARGV[i]
+end
+
+local function children_key(parent)
+    return children_keys[parent]
+end
+
+local function parents_declared(issues)
+    for _, issue in ipairs(issues) do
+        local parent = redis.call("HGET", parents, issue)
+        if parent and not children_keys[parent] then
+            return false
+        end
+    end
+    return true
+end
+
+local function write_family(parent)
+    local children = redis.call("SMEMBERS", children_key(parent))
+    if #children == 0 then
+        redis.call("HDEL", families, parent)
+        return
+    end
+    for i, child in ipairs(children) do
+        children[i] = tonumber(child)
+    end
+    table.sort(children)
+    redis.call("HSET", families, parent, cjson.encode(children))
+end
+
+local function detach(child)
+    local parent = redis.call("HGET", parents, child)
+    if parent then
+        redis.call("HDEL", parents, child)
+        redis.call("SREM", children_key(parent), child)
+        write_family(parent)
+    end
+end
+
+local function attach(parent, child)
+    local old_parent = redis.call("HGET", parents, child)
+    if old_parent == parent then
+        return
+    end
+    if old_parent then
+        detach(child)
+    end
+    redis.call("HSET", parents, child, parent)
+    redis.call("SADD", children_key(parent), child)
+end
+"""
+
+# args[1]: parent, args[2..]: children replacing the current ones
+_SET_CHILDREN_LUA = (
+    _FAMILY_LUA_HELPERS
+    + """
+local parent = table.remove(args, 1)
+if not parents_declared(args) then
+    return 0
+end
+for _, child in ipairs(redis.call("SMEMBERS", children_key(parent))) do
+    detach(child)
+end
+for _, child in ipairs(args) do
+    attach(parent, child)
+end
+write_family(parent)
+return 1
+"""
+)
+
+# args[1]: parent, args[2..]: children to add
+_ADD_CHILDREN_LUA = (
+    _FAMILY_LUA_HELPERS
+    + """
+local parent = table.remove(args, 1)
+if not parents_declared(args) then
+    return 0
+end
+for _, child in ipairs(args) do
+    attach(parent, child)
+end
+write_family(parent)
+return 1
+"""
+)
+
+# args[1..]: issues to detach from their parent
+_DETACH_LUA = (
+    _FAMILY_LUA_HELPERS
+    + """
+if not parents_declared(args) then
+    return 0
+end
+for _, issue in ipairs(args) do
+    detach(issue)
+end
+return 1
+"""
+)
+
+# args[1]: issue to drop from the families, as a parent and as a child
+_DELETE_FAMILY_LUA = (
+    _FAMILY_LUA_HELPERS
+    + """
+local issue = args[1]
+if not parents_declared(args) then
+    return 0
+end
+for _, child in ipairs(redis.call("SMEMBERS", children_key(issue))) do
+    detach(child)
+end
+detach(issue)
+return 1
+"""
+)
+
+# KEYS[1]: relation hash, KEYS[2..]: index keys of the old relation then of the new one, each as
+# project issues set, then user issues set and user projects sorted set per user
+# ARGV[1]: issue, ARGV[2]: old relation json read by the caller or "" if none,
+# ARGV[3]: new relation json or "" to delete, ARGV[4]: new project
+# Returns 0 without writing when the relation changed since the caller read it.
+_SET_RELATION_LUA = """
+local relations, issue = KEYS[1], ARGV[1]
+
+local old = redis.call("HGET", relations, issue) or ""
+if old ~= ARGV[2] then
+    return 0
+end
+
+local k = 2
+if old ~= "" then
+    old = cjson.decode(old)
+    local project = tostring(old.project_id)
+    redis.call("SREM", KEYS[k], issue)
+    k = k + 1
+    for _ in ipairs(old.user_ids) do
+        redis.call("SREM", KEYS[k], issue)
+        if tonumber(redis.call("ZINCRBY", KEYS[k + 1], -1, project)) <= 0 then
+            redis.call("ZREM", KEYS[k + 1], project)
+        end
+        k = k + 2
+    end
+end
+
+if ARGV[3] == "" then
+    redis.call("HDEL", relations, issue)
+    return 1
+end
+redis.call("HSET", relations, issue, ARGV[3])
+redis.call("SADD", KEYS[k], issue)
+for i = k + 1, #KEYS, 2 do
+    redis.call("SADD", KEYS[i], issue)
+    redis.call("ZINCRBY", KEYS[i + 1], 1, ARGV[4])
+end
+return 1
+"""
+
+_set_children_script = lua_script(_SET_CHILDREN_LUA)
+_add_children_script = lua_script(_ADD_CHILDREN_LUA)
+_detach_script = lua_script(_DETACH_LUA)
+_delete_family_script = lua_script(_DELETE_FAMILY_LUA)
+_set_relation_script = lua_script(_SET_RELATION_LUA)
+
+
+def _run_family_script(script: Script, parent_ids: list[IssueId], issue_ids: list[IssueId], *args: IssueId) -> None:
+    """
+    Run a family script with the children sets of ``parent_ids`` and of the current parents of ``issue_ids``.
+    """
+    while True:
+        current = redis_op.dict_get_many(ISSUE_PARENTS_KEY, issue_ids) if issue_ids else []
+        declared = list(dict.fromkeys([str(parent_id) for parent_id in parent_ids] + [p for p in current if p]))
+        keys = [ISSUE_FAMILIES_KEY, ISSUE_PARENTS_KEY] + [f"{ISSUE_CHILDREN_PREFIX}:{p}" for p in declared]
+        if script(keys=keys, args=[len(declared), *declared, *args], client=redis_op.r):
+            return
+
+
+def _relation_keys(relation: Optional[str]) -> list[str]:
+    if not relation:
+        return []
+    relation = json.loads(relation)
+    keys = [f"{PROJECT_ISSUES_PREFIX}:{relation['project_id']}"]
+    for user_id in relation["user_ids"]:
+        keys += [f"{USER_ISSUES_PREFIX}:{user_id}", f"{USER_PROJECTS_PREFIX}:{user_id}"]
+    return keys
+
+
+def _write_relations(relations: dict[IssueId, Optional[str]]) -> None:
+    """
+    Replace the relations of issues and their index entries in one round trip, ``None`` deletes a relation.
+    """
+    while relations:
+        issue_ids = list(relations)
+        pipe = redis_op.r.pipeline(transaction=False)
+        for issue_id, old in zip(issue_ids, redis_op.dict_get_many(ISSUE_PJ_USER_RELATION_KEY, issue_ids)):
+            new = relations[issue_id]
+            project_id = json.loads(new)["project_id"] if new else ""
+            keys = [ISSUE_PJ_USER_RELATION_KEY] + _relation_keys(old) + _relation_keys(new)
+            _set_relation_script(keys=keys, args=[issue_id, old or "", new or "", project_id], client=pipe)
+        # Issues whose relation changed since it was read are sent again.
+        relations = {issue_id: relations[issue_id] for issue_id, done in zip(issue_ids, pipe.execute()) if not done}
+
+
+def _relation(project_id: int, user_ids: Iterable[int]) -> str:
+    user_ids = sorted(set(int(user_id) for user_id in user_ids))
+    return json.dumps({"project_id": int(project_id), "user_ids": user_ids})
+
+
+def _to_ids(values: Iterable[str]) -> list[int]:
+    return sorted(int(value) for value in values)
+
+
+def _unlink_by_pattern(pattern: str) -> None:
+    keys = []
+    for key in redis_op.r.scan_iter(match=pattern, count=DEFAULT_SCAN_COUNT):
+        keys.append(key)
+        if len(keys) >= DEFAULT_SCAN_COUNT:
+            redis_op.r.unlink(*keys)
+            keys = []
+    if keys:
+        redis_op.r.unlink(*keys)
+
+
+def _rebuilding(key: str) -> str:
+    return f"{ISSUE_INDEX_REBUILD_PREFIX}:{key}"
+
+
+def _swap_in_rebuilt(keys: set[str], patterns: list[str]) -> None:
+    """
+    Rename the rebuilt ``keys`` over the index and drop the other index keys matching ``patterns``, in one MULTI/EXEC.
+    """
+    stale = set()
+    for pattern in patterns:
+        stale.update(redis_op.r.scan_iter(match=pattern, count=DEFAULT_SCAN_COUNT))
+    stale -= keys
+
+    pipe = redis_op.r.pipeline(transaction=True)
+    if stale:
+        pipe.unlink(*stale)
+    for key in keys:
+        pipe.rename(_rebuilding(key), key)
+    pipe.execute()
+
+
+#####################
+# Issue families
+#####################
+def set_issue_children(parent_id: IssueId, child_ids: Iterable[IssueId]) -> None:
+    """
+    Replace the children of an issue. A child which had another parent is moved under this one.
+
+    :param parent_id: The parent issue id
+    :param child_ids: All child issue ids of the parent, empty to drop its children
+    :return: None
+    """
+    child_ids = list(child_ids)
+    _run_family_script(_set_children_script, [parent_id], child_ids, parent_id, *child_ids)
+
+
+def add_issue_children(parent_id: IssueId, child_ids: Iterable[IssueId]) -> None:
+    """
+    Add children to an issue. A child which had another parent is moved under this one.
+
+    :return: None
+    """
+    child_ids = list(child_ids)
+    _run_family_script(_add_children_script, [parent_id], child_ids, parent_id, *child_ids)
+
+
+def remove_issue_parent(issue_ids: Iterable[IssueId]) -> None:
+    """
+    Detach issues from their parents, issues without a parent are ignored.
+
+    :return: None
+    """
+    issue_ids = list(issue_ids)
+    if issue_ids:
+        _run_family_script(_detach_script, [], issue_ids, *issue_ids)
+
+
+def delete_issue_family(issue_id: IssueId) -> None:
+    """
+    Drop an issue from the families: its children lose their parent and it is detached from its own parent.
+
+    :return: None
+    """
+    _run_family_script(_delete_family_script, [issue_id], [issue_id], issue_id)
+
+
+def get_issue_children(issue_ids: list[IssueId]) -> dict[IssueId, list[int]]:
+    """
+    Get the children of many issues in one round trip.
+
+    :param issue_ids: The parent issue ids
+    :return: Issue id to its sorted child issue ids, empty list if it has none
+    """
+    pipe = redis_op.r.pipeline(transaction=False)
+    for issue_id in issue_ids:
+        pipe.smembers(f"{ISSUE_CHILDREN_PREFIX}:{issue_id}")
+    return {issue_id: _to_ids(children) for issue_id, children in zip(issue_ids, pipe.execute())}
+
+
+def get_issue_parents(issue_ids: list[IssueId]) -> dict[IssueId, Optional[int]]:
+    """
+    Get the parents of many issues in one round trip.
+
+    :param issue_ids: The child issue ids
+    :return: Issue id to its parent issue id, None if it has no parent
+    """
+    if not issue_ids:
+        return {}
+    parents = redis_op.dict_get_many(ISSUE_PARENTS_KEY, issue_ids)
+    return {issue_id: int(parent) if parent else None for issue_id, parent in zip(issue_ids, parents)}
+
+
+def rebuild_issue_family_index() -> None:
+    """
+    Rebuild the family indexes from ``ISSUE_FAMILIES_KEY``, e.g. for data written before the indexes existed.
+    Families updated while the index is rebuilt may miss from it, rebuild it while the families are not written.
+
+    :return: None
+    """
+    # Leftovers of an interrupted rebuild.
+    _unlink_by_pattern(_rebuilding(f"{ISSUE_FAMILIES_KEY}:*"))
+
+    keys = set()
+    pipe = redis_op.r.pipeline(transaction=False)
+    for parent_id, children in redis_op.dict_iter(ISSUE_FAMILIES_KEY):
+        child_ids = json.loads(children)
+        if child_ids:
+            children_key = f"{ISSUE_CHILDREN_PREFIX}:{parent_id}"
+            pipe.hset(_rebuilding(ISSUE_PARENTS_KEY), mapping={child_id: parent_id for child_id in child_ids})
+            pipe.sadd(_rebuilding(children_key), *child_ids)
+            keys.update((ISSUE_PARENTS_KEY, children_key))
+        if len(pipe) >= DEFAULT_SCAN_COUNT:
+            pipe.execute()
+    pipe.execute()
+    _swap_in_rebuilt(keys, [ISSUE_PARENTS_KEY, f"{ISSUE_CHILDREN_PREFIX}:*"])
+
+
+#####################
+# Issue / project / user relations
+#####################
+def set_issue_relation(issue_id: IssueId, project_id: int, user_ids: Iterable[int]) -> None:
+    """
+    Set the project and the users of an issue, replacing the former ones.
+
+    :param issue_id: The issue id
+    :param project_id: The project the issue belongs to
+    :param user_ids: The users related to the issue, e.g. author and assignee
+    :return: None
+    """
+    _write_relations({issue_id: _relation(project_id, user_ids)})
+
+
+def set_issue_relations(relations: dict[IssueId, tuple[int, Iterable[int]]]) -> None:
+    """
+    Set the relations of many issues in one round trip, each issue is updated atomically.
+
+    :param relations: Issue id to (project id, user ids)
+    :return: None
+    """
+    _write_relations({issue_id: _relation(*relation) for issue_id, relation in relations.items()})
+
+
+def delete_issue_relation(issue_id: IssueId) -> None:
+    """
+    Drop the relation of an issue and its index entries.
+
+    :return: None
+    """
+    _write_relations({issue_id: None})
+
+
+def get_issue_relations(issue_ids: list[IssueId]) -> dict[IssueId, Optional[dict]]:
+    """
+    Get the relations of many issues in one round trip.
+
+    :return: Issue id to {"project_id": int, "user_ids": [int]}, None if it has no relation
+    """
+    if not issue_ids:
+        return {}
+    values = redis_op.dict_get_many(ISSUE_PJ_USER_RELATION_KEY, issue_ids)
+    return {issue_id: json.loads(value) if value else None for issue_id, value in zip(issue_ids, values)}
+
+
+def get_project_issues(project_ids: list[int]) -> dict[int, list[int]]:
+    """
+    Get the issues of many projects in one round trip.
+
+    :return: Project id to its sorted issue ids
+    """
+    pipe = redis_op.r.pipeline(transaction=False)
+    for project_id in project_ids:
+        pipe.smembers(f"{PROJECT_ISSUES_PREFIX}:{project_id}")
+    return {project_id: _to_ids(issues) for project_id, issues in zip(project_ids, pipe.execute())}
+
+
+def get_user_issues(user_ids: list[int]) -> dict[int, list[int]]:
+    """
+    Get the issues of many users in one round trip.
+
+    :return: User id to its sorted issue ids
+    """
+    pipe = redis_op.r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.smembers(f"{USER_ISSUES_PREFIX}:{user_id}")
+    return {user_id: _to_ids(issues) for user_id, issues in zip(user_ids, pipe.execute())}
+
+
+def get_user_projects(user_ids: list[int]) -> dict[int, dict[int, int]]:
+    """
+    Get the projects in which many users have issues, in one round trip.
+
+    :return: User id to {project id: number of the user's issues in it}
+    """
+    pipe = redis_op.r.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zrange(f"{USER_PROJECTS_PREFIX}:{user_id}", 0, -1, withscores=True)
+    return {
+        user_id: {int(project_id): int(count) for project_id, count in projects}
+        for user_id, projects in zip(user_ids, pipe.execute())
+    }
+
+
+def rebuild_issue_relation_index() -> None:
+    """
+    Rebuild the relation indexes from ``ISSUE_PJ_USER_RELATION_KEY``, e.g. for data written before the indexes existed.
+    Relations updated while the index is rebuilt may miss from it, rebuild it while the relations are not written.
+
+    :return: None
+    """
+    # Leftovers of an interrupted rebuild.
+    _unlink_by_pattern(_rebuilding(f"{ISSUE_PJ_USER_RELATION_KEY}:*"))
+
+    keys = set()
+    pipe = redis_op.r.pipeline(transaction=False)
+    for issue_id, value in redis_op.dict_iter(ISSUE_PJ_USER_RELATION_KEY):
+        relation = json.loads(value)
+        project_key = f"{PROJECT_ISSUES_PREFIX}:{relation['project_id']}"
+        pipe.sadd(_rebuilding(project_key), issue_id)
+        keys.add(project_key)
+        for user_id in relation["user_ids"]:
+            user_issues_key, user_projects_key = f"{USER_ISSUES_PREFIX}:{user_id}", f"{USER_PROJECTS_PREFIX}:{user_id}"
+            pipe.sadd(_rebuilding(user_issues_key), issue_id)
+            pipe.zincrby(_rebuilding(user_projects_key), 1, relation["project_id"])
+            keys.update((user_issues_key, user_projects_key))
+        if len(pipe) >= DEFAULT_SCAN_COUNT:
+            pipe.execute()
+    pipe.execute()
+    prefixes = (PROJECT_ISSUES_PREFIX, USER_ISSUES_PREFIX, USER_PROJECTS_PREFIX)
+    _swap_in_rebuilt(keys, [f"{prefix}:*" for prefix in prefixes])
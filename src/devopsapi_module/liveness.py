@@ -0,0 +1,255 @@
+"""
+Heartbeats of the system components and the aggregated ``SERVER_ALIVE_KEY``.
+
+Each component writes ``liveness:component:{name}`` with a TTL from a
+background thread and registers itself in ``liveness:components``. These
+keys stay out of the ``SERVER_ALIVE_KEY`` prefix tracked by the near cache
+of ``RedisOperator``, so the heartbeats do not invalidate it.
+The same Lua script recomputes ``SERVER_ALIVE_KEY`` ("true" when every
+registered component has a live heartbeat) and publishes the new value on
+``system_all_alive_changed`` when it flips. ``SERVER_ALIVE_KEY`` expires
+with the heartbeats, so it reads False once no component is left to write it.
+While its value holds it is only touched when half of its TTL is left.
+
+Health checkers either read ``SERVER_ALIVE_KEY`` as before, or keep a
+``LivenessWatcher`` which is told about the changes instead of polling.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import redis
+
+from devopsapi_module.redis import SERVER_ALIVE_KEY, lua_script, redis_op
+
+log: logging.Logger = logging.getLogger(__name__)
+
+LIVENESS_PREFIX = "liveness"
+LIVENESS_COMPONENTS_KEY = f"{LIVENESS_PREFIX}:components"
+LIVENESS_HEARTBEAT_PREFIX = f"{LIVENESS_PREFIX}:component"
+LIVENESS_CHANNEL = f"{SERVER_ALIVE_KEY}_changed"
+
+# KEYS[1]: SERVER_ALIVE_KEY, KEYS[2]: components set
+# ARGV[1]: heartbeat key prefix, ARGV[2]: channel, ARGV[3]: ttl in seconds,
+# ARGV[4]: component beating, "" to only recompute, ARGV[5]: heartbeat value
+_BEAT_LUA = """
+local alive_key, components_key, prefix, channel, ttl = KEYS[1], KEYS[2], ARGV[1], ARGV[2], tonumber(ARGV[3])
+
+if ARGV[4] ~= "" then
+    redis.call("SET", prefix .. ":" .. ARGV[4], ARGV[5], "EX", ttl)
+    redis.call("SADD", components_key, ARGV[4])
+end
+
+local all_alive = "true"
+for _, component in ipairs(redis.call("SMEMBERS", components_key)) do
+    if redis.call("EXISTS", prefix .. ":" .. component) == 0 then
+        all_alive = "false"
+        break
+    end
+end
+
+-- Every write of alive_key invalidates it in the near caches, so an unchanged value is
+-- only kept from expiring, and only once half of its TTL is gone.
+local old = redis.call("GET", alive_key)
+if old ~= all_alive then
+    redis.call("SET", alive_key, all_alive, "EX", ttl)
+    redis.call("PUBLISH", channel, all_alive)
+elseif redis.call("TTL", alive_key) * 2 < ttl then
+    redis.call("EXPIRE", alive_key, ttl)
+end
+return all_alive
+"""
+
+# KEYS[1]: SERVER_ALIVE_KEY, KEYS[2]: components set, ARGV[1]: heartbeat key prefix
+_STATUS_LUA = """
+local prefix = ARGV[1]
+local components = redis.call("SMEMBERS", KEYS[2])
+local heartbeats = {}
+for i, component in ipairs(components) do
+    heartbeats[i] = redis.call("GET", prefix .. ":" .. component) or false
+end
+return {redis.call("GET", KEYS[1]) or false, components, heartbeats}
+"""
+
+_beat_script = lua_script(_BEAT_LUA)
+_status_script = lua_script(_STATUS_LUA)
+
+
+def beat(component: str, ttl: float) -> bool:
+    """
+    Write the heartbeat of a component and recompute ``SERVER_ALIVE_KEY``, in one round trip.
+
+    :param component: The name of the component
+    :param ttl: Seconds the heartbeat stays alive
+    :return: True if all components are alive
+    """
+    all_alive = _beat_script(
+        keys=[SERVER_ALIVE_KEY, LIVENESS_COMPONENTS_KEY],
+        args=[LIVENESS_HEARTBEAT_PREFIX, LIVENESS_CHANNEL, max(1, round(ttl)), component, time.time()],
+        client=redis_op.r,
+    )
+    return all_alive == "true"
+
+
+def unregister_component(component: str, ttl: float = 30) -> bool:
+    """
+    Remove a component which is shut down on purpose, so it no longer counts as dead.
+
+    :param component: The name of the component
+    :param ttl: Seconds ``SERVER_ALIVE_KEY`` stays valid
+    :return: True if the remaining components are all alive
+    """
+    pipe = redis_op.r.pipeline(transaction=True)
+    pipe.srem(LIVENESS_COMPONENTS_KEY, component)
+    pipe.delete(f"{LIVENESS_HEARTBEAT_PREFIX}:{component}")
+    pipe.execute()
+    return beat("", ttl)
+
+
+def get_liveness() -> dict:
+    """
+    Get the liveness of every component in one round trip.
+
+    :return: {"all_alive": bool, "components": {component: last heartbeat timestamp or None if dead}}
+    """
+    all_alive, components, heartbeats = _status_script(
+        keys=[SERVER_ALIVE_KEY, LIVENESS_COMPONENTS_KEY], args=[LIVENESS_HEARTBEAT_PREFIX], client=redis_op.r
+    )
+    return {
+        "all_alive": all_alive == "true",
+        "components": {
+            component: float(heartbeat) if heartbeat else None for component, heartbeat in zip(components, heartbeats)
+        },
+    }
+
+
+def is_all_alive() -> bool:
+    """
+    :return: Redis value of ``SERVER_ALIVE_KEY``
+    """
+    return redis_op.bool_get(SERVER_ALIVE_KEY)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Background thread writing the heartbeat of a component every ``interval`` seconds.
+    """
+
+    def __init__(self, component: str, interval: float = 10, ttl: Optional[float] = None):
+        """
+        :param component: The name of the component
+        :param interval: Seconds between heartbeats
+        :param ttl: Seconds a heartbeat stays alive, three intervals by default so one missed beat is tolerated
+        """
+        super().__init__(name=f"heartbeat-{component}", daemon=True)
+        self.component = component
+        self.interval = interval
+        self.ttl = ttl if ttl is not None else interval * 3
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                beat(self.component, self.ttl)
+            except redis.RedisError as e:
+                log.warning(f"Heartbeat of {self.component} failed, reason: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self, unregister: bool = False, timeout: Optional[float] = None) -> None:
+        """
+        :param unregister: Also remove the component, so stopping it does not turn the system dead
+        :param timeout: Seconds to wait for a beat in flight, ``ttl`` by default
+        """
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            # A beat in flight would register the component again after it is unregistered.
+            self.join(self.ttl if timeout is None else timeout)
+            if self.is_alive():
+                log.warning(f"Heartbeat of {self.component} did not stop in time.")
+        if unregister:
+            unregister_component(self.component, self.ttl)
+
+
+class LivenessWatcher(threading.Thread):
+    """
+    Background thread keeping ``all_alive`` up to date by pub/sub instead of polling redis.
+
+    ``on_change`` is called with the new value whenever it changes. The
+    value is re-read on every (re)connection and every ``refresh_interval``
+    seconds, which also notices ``SERVER_ALIVE_KEY`` expiring with no
+    component left to publish it.
+    """
+
+    def __init__(
+        self,
+        on_change: Optional[Callable[[bool], None]] = None,
+        refresh_interval: float = 30,
+        retry_interval: float = 1,
+    ):
+        super().__init__(name="liveness-watcher", daemon=True)
+        self.on_change = on_change
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.all_alive: Optional[bool] = None
+        self.connected = threading.Event()
+        self._stop_event = threading.Event()
+
+    def _update(self, all_alive: bool) -> None:
+        if all_alive == self.all_alive:
+            return
+        self.all_alive = all_alive
+        if self.on_change is not None:
+            try:
+                self.on_change(all_alive)
+            except Exception:
+                log.exception("Liveness change callback failed.")
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            pubsub = redis_op.r.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(LIVENESS_CHANNEL)
+                # Changes published before the subscription are not notified.
+                self._update(is_all_alive())
+                self.connected.set()
+                refresh_at = time.monotonic() + self.refresh_interval
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        self._update(message["data"] == "true")
+                    elif time.monotonic() >= refresh_at:
+                        self._update(is_all_alive())
+                        refresh_at = time.monotonic() + self.refresh_interval
+            except redis.RedisError as e:
+                log.warning(f"Liveness watcher disconnected, reason: {e}")
+            finally:
+                self.connected.clear()
+                pubsub.close()
+            self._stop_event.wait(self.retry_interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def start_heartbeat(component: str, interval: float = 10, ttl: Optional[float] = None) -> Heartbeat:
+    """
+    Start writing the heartbeat of a component in the background.
+
+    :return: The running heartbeat, call ``stop`` on shutdown.
+    """
+    heartbeat = Heartbeat(component, interval=interval, ttl=ttl)
+    heartbeat.start()
+    return heartbeat
+
+
+def start_liveness_watcher(on_change: Optional[Callable[[bool], None]] = None) -> LivenessWatcher:
+    """
+    Start watching ``SERVER_ALIVE_KEY`` in the background.
+
+    :return: The running watcher, read its ``all_alive``.
+    """
+    watcher = LivenessWatcher(on_change=on_change)
+    watcher.start()
+    return watcher
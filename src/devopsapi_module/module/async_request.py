@@ -0,0 +1,225 @@
+import asyncio
+import httpx
+import json
+from contextlib import asynccontextmanager
+from .rate_limit import RATE_LIMIT_KEY, AsyncRateLimiter, token_bucket
+
+
+# ======== for typing ========
+from typing import Any, AsyncIterator, Union
+from httpx import Response
+
+
+CLIENT_OPTIONS = (
+    "max_connections",
+    "max_keepalive_connections",
+    "keepalive_expiry",
+    "connect_timeout",
+    "read_timeout",
+    "connect_retries",
+    "max_concurrency",
+)
+
+
+class AsyncRequest:
+    # Client options, override them on subclass or call ``configure_client``.
+    max_connections: int = 100  # connections kept in the shared pool
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30
+    connect_timeout: Union[float, None] = 10
+    read_timeout: Union[float, None] = 60
+    connect_retries: int = 3
+    max_concurrency: int = 200  # requests allowed in flight at once
+
+    rate_limiter: Union[AsyncRateLimiter, None] = None
+
+    _client: Union[httpx.AsyncClient, None] = None
+    _semaphore: Union[asyncio.Semaphore, None] = None
+    _loop: Union[asyncio.AbstractEventLoop, None] = None  # the loop the client and the semaphore belong to
+
+    def _bind_running_loop(self) -> None:
+        # The connections of a client and the waiters of a semaphore belong to
+        # the loop they were first used on, another loop gets its own ones.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client, self._semaphore, self._loop = None, None, loop
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        The shared connection-pooled client of the running event loop, built on first use.
+        """
+        self._bind_running_loop()
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            self._client = httpx.AsyncClient(
+                verify=False,
+                timeout=httpx.Timeout(None, connect=self.connect_timeout, read=self.read_timeout),
+                transport=httpx.AsyncHTTPTransport(verify=False, limits=limits, retries=self.connect_retries),
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        self._bind_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def configure_client(self, **options: Any) -> None:
+        """
+        Change client options, the current client is closed and rebuilt on next request.
+
+        Args:
+            options:
+            - max_connections(int)
+            - max_keepalive_connections(int)
+            - keepalive_expiry(float)
+            - connect_timeout(float)
+            - read_timeout(float)
+            - connect_retries(int)
+            - max_concurrency(int)
+        """
+        for name, value in options.items():
+            if name not in CLIENT_OPTIONS:
+                raise TypeError(f"Unknown client option: {name}")
+            setattr(self, name, value)
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client, self._semaphore = None, None
+
+    def enable_rate_limit(
+        self,
+        rate: Union[float, None] = None,
+        burst: Union[int, None] = None,
+        max_concurrency: Union[int, None] = None,
+        redis_op=None,
+        key: str = RATE_LIMIT_KEY,
+    ) -> None:
+        """
+        Throttle requests on the client side and adapt their concurrency to the rate limit headers, see ``RateLimiter``.
+
+        Args:
+            rate: Requests per second of the token bucket, ``None`` to only adapt the concurrency.
+            burst: Requests sent at once with a full bucket, ``rate`` by default.
+            max_concurrency: Upper bound of requests in flight, ``max_concurrency`` of the client by default.
+            redis_op: Share the token bucket among processes through this RedisOperator.
+            key: Redis key of the shared token bucket.
+        """
+        self.rate_limiter = AsyncRateLimiter(
+            token_bucket(rate, burst, redis_op=redis_op, key=key),
+            max_concurrency=max_concurrency or self.max_concurrency,
+        )
+
+    def disable_rate_limit(self) -> None:
+        self.rate_limiter = None
+
+    def _absolute_url(self, path: str) -> str:
+        # An absolute URL reaches an endpoint outside the REST API, e.g. GraphQL.
+        return path if path.startswith(("http://", "https://")) else f"{self.url}{path}"
+
+    async def api_request(
+        self,
+        method: str,
+        path: str,
+        headers: Union[dict[str, Any], None] = None,
+        params: Union[dict[str, Any], None] = None,
+        data: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        url = self._absolute_url(path)
+
+        headers = headers if headers else {}
+        # requests drops ``None`` params, httpx would send them as empty strings.
+        params = {k: v for k, v in params.items() if v is not None} if params else {}
+        content = None
+
+        if data:
+            content = json.dumps(data)
+            if "Content-Type" not in headers:
+                headers["Content-Type"] = "application/json"
+
+        async def send() -> Response:
+            async with self.semaphore:
+                return await self.client.request(
+                    method.upper(),
+                    url,
+                    headers=headers,
+                    params=params,
+                    content=content,
+                )
+
+        if self.rate_limiter is not None:
+            return await self.rate_limiter.call(send)
+        return await send()
+
+    @asynccontextmanager
+    async def api_stream(
+        self,
+        path: str,
+        headers: Union[dict[str, Any], None] = None,
+        params: Union[dict[str, Any], None] = None,
+    ) -> AsyncIterator[Response]:
+        """
+        GET whose body is read lazily by ``aiter_bytes``, the response is closed when the ``async with`` block exits.
+        With the rate limiter enabled the request holds a limiter slot until then.
+        """
+        params = {k: v for k, v in params.items() if v is not None} if params else {}
+        async with self.semaphore:
+            url = self._absolute_url(path)
+            if self.rate_limiter is None:
+                async with self.client.stream("GET", url, headers=headers or {}, params=params) as output:
+                    yield output
+            else:
+                request = self.client.build_request("GET", url, headers=headers or {}, params=params)
+                async with self.rate_limiter.stream(lambda: self.client.send(request, stream=True)) as output:
+                    yield output
+
+    async def api_get(
+        self,
+        path: str,
+        headers: Union[dict[str, Any], None] = None,
+        params: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        return await self.api_request("GET", path, headers=headers, params=params)
+
+    async def api_post(
+        self,
+        path: str,
+        params: Union[dict[str, Any], None] = None,
+        headers: Union[dict[str, Any], None] = None,
+        data: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        return await self.api_request("POST", path, headers=headers, data=data, params=params)
+
+    async def api_put(
+        self,
+        path: str,
+        params: Union[dict[str, Any], None] = None,
+        headers: Union[dict[str, Any], None] = None,
+        data: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        return await self.api_request("PUT", path, headers=headers, data=data, params=params)
+
+    async def api_patch(
+        self,
+        path: str,
+        headers: Union[dict[str, Any], None] = None,
+        data: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        return await self.api_request("PATCH", path, headers=headers, data=data)
+
+    async def api_delete(
+        self,
+        path: str,
+        headers: Union[dict[str, Any], None] = None,
+        data: Union[dict[str, Any], None] = None,
+    ) -> Response:
+        return await self.api_request("DELETE", path, headers=headers, data=data)
+
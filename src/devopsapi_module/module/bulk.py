@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+# ======== for typing ========
+from typing import Any, Awaitable, Callable, Iterable, Union
+
+
+DEFAULT_BULK_WORKERS = 8
+DEFAULT_BULK_ATTEMPTS = 5  # tries of one item answered by 429
+DEFAULT_RETRY_AFTER = 1.0  # seconds waited after a 429 without Retry-After
+
+
+def retry_after_seconds(output) -> Union[float, None]:
+    """
+    Seconds to wait before the next request, ``None`` if the response does not ask to wait.
+
+    A 429 is honored by its ``Retry-After`` (seconds or HTTP date), else by
+    ``RateLimit-Reset``. Any other response asks to wait only when its
+    ``RateLimit-Remaining`` is 0.
+    """
+    headers = output.headers
+    if output.status_code != 429 and headers.get("RateLimit-Remaining") != "0":
+        return None
+
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = headers.get("RateLimit-Reset")
+    if reset and reset.isdigit():
+        return max(0.0, int(reset) - time.time())
+    return DEFAULT_RETRY_AFTER if output.status_code == 429 else None
+
+
+def _report(item: Any, output=None, error: Exception = None) -> dict[str, Any]:
+    if error is not None:
+        return {"item": item, "ok": False, "status_code": None, "error": str(error)}
+
+    try:
+        result = output.json()
+    except ValueError:
+        result = output.text
+    report = {"item": item, "ok": 200 <= output.status_code < 300, "status_code": output.status_code}
+    report["result" if report["ok"] else "error"] = result
+    return report
+
+
+class RateLimitGate:
+    """RateLimitGate
+
+    Pause shared by the workers of one bulk run: once GitLab asks to wait,
+    no worker sends a request before the pause is over.
+
+    """
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def wait(self) -> None:
+        remaining = self.remaining()
+        while remaining > 0:
+            time.sleep(remaining)
+            remaining = self.remaining()
+
+    async def async_wait(self) -> None:
+        remaining = self.remaining()
+        while remaining > 0:
+            await asyncio.sleep(remaining)
+            remaining = self.remaining()
+
+
+def run_bulk(
+    send: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = DEFAULT_BULK_WORKERS,
+    attempts: int = DEFAULT_BULK_ATTEMPTS,
+    gate: Union[RateLimitGate, None] = None,
+) -> list[dict[str, Any]]:
+    """
+    Send one request per item on a bounded thread pool and report every item, a failure does not stop the others.
+
+    Args:
+        send: Sends the request of one item, returns the response.
+        items: The items, reported back as ``item``.
+        max_workers: Max number of requests in flight.
+        attempts: Tries of an item answered by 429, the rate limit headers tell how long to wait in between.
+        gate: Pause shared with other requests, e.g. the gate of a ``RateLimiter``, a new one by default.
+
+    Returns:
+        One report per item in the order of ``items``:
+        {"item", "ok", "status_code", "result" when ok else "error"}
+    """
+    items = list(items)
+    gate = gate if gate is not None else RateLimitGate()
+
+    def run(item: Any) -> dict[str, Any]:
+        try:
+            for _ in range(attempts):
+                gate.wait()
+                output = send(item)
+                wait = retry_after_seconds(output)
+                if wait is not None:
+                    gate.pause(wait)
+                if output.status_code != 429:
+                    break
+            return _report(item, output)
+        except Exception as e:
+            return _report(item, error=e)
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(run, items))
+
+
+async def async_run_bulk(
+    send: Callable[[Any], Awaitable[Any]],
+    items: Iterable[Any],
+    max_workers: int = DEFAULT_BULK_WORKERS,
+    attempts: int = DEFAULT_BULK_ATTEMPTS,
+    gate: Union[RateLimitGate, None] = None,
+) -> list[dict[str, Any]]:
+    """
+    Coroutine version of ``run_bulk``, at most ``max_workers`` requests are awaited at the same time.
+    """
+    gate = gate if gate is not None else RateLimitGate()
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def run(item: Any) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                for _ in range(attempts):
+                    await gate.async_wait()
+                    output = await send(item)
+                    wait = retry_after_seconds(output)
+                    if wait is not None:
+                        gate.pause(wait)
+                    if output.status_code != 429:
+                        break
+                return _report(item, output)
+            except Exception as e:
+                return _report(item, error=e)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
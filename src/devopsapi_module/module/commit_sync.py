@@ -0,0 +1,240 @@
+"""
+Incremental commit sync of GitLab branches into a redis index.
+
+Per (repo, branch) the index keeps:
+
+    - commit_sync:{repo}:{branch}:commits          hash, sha -> compact commit json
+    - commit_sync:{repo}:{branch}:order            sorted set of shas, scored by committed date
+    - commit_sync:{repo}:{branch}:members          the same, only commits made by project members
+    - commit_sync:{repo}:{branch}:author:{name}    the same, only commits of one author
+    - commit_sync:{repo}:{branch}:since            committed date of the newest indexed commit
+
+A sync asks GitLab only for the commits committed after the watermark, on
+every page, and adds them to the index; the commit filters are then
+answered from redis. ``since`` filters by committed date, so commits
+merged into the branch with an older committed date than ``overlap``
+before the watermark, and commits dropped by a force push, are only
+picked up by ``resync``.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+from .gitlab_common import is_member_commit
+
+COMMIT_SYNC_PREFIX = "commit_sync"
+# Fields of a commit kept in the index.
+INDEXED_COMMIT_FIELDS = (
+    "id",
+    "short_id",
+    "title",
+    "author_name",
+    "author_email",
+    "committer_name",
+    "committer_email",
+    "authored_date",
+    "committed_date",
+    "created_at",
+    "web_url",
+)
+SYNC_BATCH_SIZE = 100
+
+
+def _timestamp(date: str) -> float:
+    return datetime.fromisoformat(date.replace("Z", "+00:00")).timestamp()
+
+
+class CommitSync:
+    """
+    Keep the commits of branches in a redis index and query them without asking GitLab.
+
+    Usage::
+
+        commit_sync = CommitSync(GitLabOperator(), redis_op)
+        commits = commit_sync.get_commits_by_members(repo_id, "master")
+    """
+
+    def __init__(self, operator, redis_op, overlap: float = 3600, prefix: str = COMMIT_SYNC_PREFIX):
+        """
+        :param operator: ``GitLabOperator``, only its ``iter_commits`` is used; with an
+            ``AsyncGitLabOperator`` use ``async_sync`` and the ``async_*`` getters
+        :param redis_op: The RedisOperator the index is kept by
+        :param overlap: Seconds before the watermark which are fetched again, for commits pushed late
+        :param prefix: Prefix of the redis keys
+        """
+        self.operator = operator
+        self.redis_op = redis_op
+        self.overlap = overlap
+        self.prefix = prefix
+
+    def _key(self, repo_id: Any, branch: str, name: str) -> str:
+        return f"{self.prefix}:{repo_id}:{branch}:{name}"
+
+    def watermark(self, repo_id: Any, branch: str) -> Optional[str]:
+        """
+        :return: Committed date of the newest indexed commit, None if the branch was never synced
+        """
+        return self.redis_op.str_get(self._key(repo_id, branch, "since"))
+
+    def _since(self, watermark: Optional[str]) -> Optional[str]:
+        if not watermark:
+            return None
+        return datetime.fromtimestamp(_timestamp(watermark) - self.overlap).astimezone().isoformat()
+
+    @staticmethod
+    def _newest(newest: Optional[str], commit: dict[str, Any]) -> str:
+        if newest is None or _timestamp(commit["committed_date"]) > _timestamp(newest):
+            return commit["committed_date"]
+        return newest
+
+    def _advance(self, repo_id: Any, branch: str, watermark: Optional[str], newest: Optional[str]) -> None:
+        if newest is not None and newest != watermark:
+            self.redis_op.str_set(self._key(repo_id, branch, "since"), newest)
+
+    def sync(self, repo_id: Any, branch: str) -> int:
+        """
+        Fetch the commits newer than the watermark, from every page, and add them to the index.
+
+        :return: Number of commits which were not indexed yet
+        """
+        watermark = self.watermark(repo_id, branch)
+        added, newest = 0, watermark
+        batch = []
+        for commit in self.operator.iter_commits(repo_id, branch, since=self._since(watermark)):
+            batch.append(commit)
+            newest = self._newest(newest, commit)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                added += self._index(repo_id, branch, batch)
+                batch = []
+        added += self._index(repo_id, branch, batch)
+        self._advance(repo_id, branch, watermark, newest)
+        return added
+
+    async def async_sync(self, repo_id: Any, branch: str) -> int:
+        """
+        ``sync`` for an ``AsyncGitLabOperator``, the blocking redis calls are made off the event loop.
+        """
+        watermark = await asyncio.to_thread(self.watermark, repo_id, branch)
+        added, newest = 0, watermark
+        batch = []
+        async for commit in self.operator.iter_commits(repo_id, branch, since=self._since(watermark)):
+            batch.append(commit)
+            newest = self._newest(newest, commit)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                added += await asyncio.to_thread(self._index, repo_id, branch, batch)
+                batch = []
+        added += await asyncio.to_thread(self._index, repo_id, branch, batch)
+        await asyncio.to_thread(self._advance, repo_id, branch, watermark, newest)
+        return added
+
+    def _index(self, repo_id: Any, branch: str, commits: list[dict[str, Any]]) -> int:
+        if not commits:
+            return 0
+        commits_key = self._key(repo_id, branch, "commits")
+        pipe = self.redis_op.r.pipeline(transaction=False)
+        for commit in commits:
+            score = {commit["id"]: _timestamp(commit["committed_date"])}
+            pipe.hsetnx(commits_key, commit["id"], json.dumps({k: commit.get(k) for k in INDEXED_COMMIT_FIELDS}))
+            pipe.zadd(self._key(repo_id, branch, "order"), score)
+            pipe.zadd(self._key(repo_id, branch, f"author:{commit.get('author_name')}"), score)
+            if is_member_commit(commit):
+                pipe.zadd(self._key(repo_id, branch, "members"), score)
+        results = pipe.execute()
+
+        added, i = 0, 0
+        for commit in commits:
+            added += results[i]
+            i += 4 if is_member_commit(commit) else 3
+        return added
+
+    def resync(self, repo_id: Any, branch: str) -> int:
+        """
+        Drop the index of a branch and fetch all its commits again, e.g. after a force push.
+
+        :return: Number of commits indexed
+        """
+        self.drop(repo_id, branch)
+        return self.sync(repo_id, branch)
+
+    def drop(self, repo_id: Any, branch: str) -> None:
+        keys = [self._key(repo_id, branch, name) for name in ("commits", "order", "members", "since")]
+        keys += self.redis_op.r.scan_iter(match=self._key(repo_id, branch, "author:*"), count=SYNC_BATCH_SIZE)
+        self.redis_op.r.unlink(*keys)
+
+    def _load(self, repo_id: Any, branch: str, index: str, limit: Optional[int]) -> Iterator[dict[str, Any]]:
+        """
+        Yield the commits of an index newest first, loaded from the commit hash ``SYNC_BATCH_SIZE`` at a time.
+        """
+        order_key, commits_key = self._key(repo_id, branch, index), self._key(repo_id, branch, "commits")
+        start, end = 0, (limit or 0) - 1
+        while limit is None or start <= end:
+            stop = start + SYNC_BATCH_SIZE - 1 if limit is None else min(start + SYNC_BATCH_SIZE - 1, end)
+            shas = self.redis_op.r.zrevrange(order_key, start, stop)
+            if not shas:
+                return
+            for value in self.redis_op.dict_get_many(commits_key, shas):
+                if value:
+                    yield json.loads(value)
+            start = stop + 1
+
+    def get_commits(
+        self,
+        repo_id: Any,
+        branch: str,
+        author: Optional[str] = None,
+        exclude_author: Optional[str] = None,
+        members_only: bool = False,
+        limit: Optional[int] = None,
+        sync: bool = True,
+    ) -> list[dict[str, Any]]:
+        """
+        Get the indexed commits of a branch, newest first.
+
+        :param author: Only the commits of this author
+        :param exclude_author: Leave out the commits of this author
+        :param members_only: Leave out the commits of the administrator and the bot, see ``is_member_commit``
+        :param limit: Max number of commits returned, all by default
+        :param sync: Fetch the new commits from GitLab first
+        :return: Compact commits with the fields of ``INDEXED_COMMIT_FIELDS``
+        """
+        if sync:
+            self.sync(repo_id, branch)
+
+        if author is not None:
+            index = f"author:{author}"
+        else:
+            index = "members" if members_only else "order"
+        commits = self._load(repo_id, branch, index, None if exclude_author is not None else limit)
+
+        output = []
+        for commit in commits:
+            if author is not None and members_only and not is_member_commit(commit):
+                continue
+            if exclude_author is not None and commit.get("author_name") == exclude_author:
+                continue
+            output.append(commit)
+            if limit is not None and len(output) >= limit:
+                break
+        return output
+
+    def get_commits_by_author(self, repo_id: Any, branch: str, author: str = None) -> list[dict[str, Any]]:
+        """
+        Index backed ``GitLabOperator.gl_get_commits_by_author``: the commits not made by ``author``.
+        """
+        return self.get_commits(repo_id, branch, exclude_author=author)
+
+    def get_commits_by_members(self, repo_id: Any, branch: str) -> list[dict[str, Any]]:
+        """
+        Index backed ``GitLabOperator.gl_get_commits_by_members``.
+        """
+        return self.get_commits(repo_id, branch, members_only=True)
+
+    async def async_get_commits_by_author(self, repo_id: Any, branch: str, author: str = None) -> list[dict[str, Any]]:
+        await self.async_sync(repo_id, branch)
+        return await asyncio.to_thread(self.get_commits, repo_id, branch, exclude_author=author, sync=False)
+
+    async def async_get_commits_by_members(self, repo_id: Any, branch: str) -> list[dict[str, Any]]:
+        await self.async_sync(repo_id, branch)
+        return await asyncio.to_thread(self.get_commits, repo_id, branch, members_only=True, sync=False)
@@ -0,0 +1,225 @@
+import codecs
+import re
+from typing import Any, Union
+
+
+DEFAULT_REPO = "iiidevops"
+ADMIN_NAME = "Administrator"
+BOT_NAME_PREFIX = "專案管理機器人"
+
+# Seconds a cached GET response stays fresh, see ``Request.enable_response_cache``.
+# CI/CD variables hold secrets and are left out, pass ``ttls`` to cache them in redis on purpose.
+RESPONSE_CACHE_TTLS = {
+    "/projects/*": 30,
+    "/projects/*/repository/branches/*": 30,
+    "/projects/*/protected_branches": 60,
+    "/namespaces": 300,
+}
+
+
+def is_member_commit(commit: dict[str, Any]) -> bool:
+    """
+    Check the commit is made by a project member, not by the administrator or the bot.
+    """
+    return (
+        commit.get("author_name") != ADMIN_NAME
+        and commit.get("committer_name") != ADMIN_NAME
+        and not commit.get("author_name", "").startswith(BOT_NAME_PREFIX)
+        and not commit.get("committer_name", "").startswith(BOT_NAME_PREFIX)
+    )
+
+
+def create_user_data(args: dict[str, Any], user_source_password: str, is_admin: bool = False) -> dict[str, Any]:
+    """
+    Body of the create user request, ``args`` holds name, email and login.
+    """
+    data = {
+        "name": args["name"],
+        "email": args["email"],
+        "username": args["login"],
+        "password": user_source_password,
+        "skip_confirmation": True,
+    }
+    if is_admin:
+        data["admin"] = True
+    return data
+
+
+CONSOLE_CHUNK_SIZE = 64 * 1024  # bytes of a job log read at a time
+
+
+def console_range_headers(offset: int) -> dict[str, str]:
+    """
+    Headers asking for the bytes of a job log from ``offset`` on.
+    """
+    return {"Range": f"bytes={offset}-"} if offset else {}
+
+
+def console_skip_bytes(status_code: int, offset: int) -> Union[int, None]:
+    """
+    Bytes to drop from the start of a job log response asked from ``offset``, ``None`` if there is nothing new.
+
+    A 206 starts at ``offset``. A 200 means the range was ignored and the whole
+    log is sent, its first ``offset`` bytes are dropped while streaming.
+    """
+    if status_code == 416:
+        return None
+    return offset if status_code == 200 else 0
+
+
+def utf8_complete_length(data: bytes) -> int:
+    """
+    Length of the longest prefix of ``data`` not ending inside a multi-byte UTF-8 character.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decoder.decode(data)
+    return len(data) - len(decoder.getstate()[0])
+
+
+# Listings GitLab can paginate by keyset, with the ``order_by`` values it accepts in keyset mode.
+KEYSET_PAGINATION_ORDER_BY = {
+    re.compile(r"^/projects$"): ("id",),
+    re.compile(r"^/users$"): ("id",),
+    re.compile(r"^/projects/[^/]+/jobs$"): ("id",),
+}
+
+
+def keyset_pagination_params(path: str, params: dict[str, Any]) -> Union[dict[str, Any], None]:
+    """
+    Params to list ``path`` by keyset pagination, ``None`` if GitLab only offers offset pagination for it.
+    """
+    for pattern, order_by in KEYSET_PAGINATION_ORDER_BY.items():
+        if pattern.match(path):
+            if params.get("order_by", order_by[0]) not in order_by:
+                return None
+            return {"order_by": order_by[0]} | params
+    return None
+
+
+# Fields of a pipeline and of its jobs kept in a pipeline status summary.
+PIPELINE_SUMMARY_FIELDS = ("id", "iid", "status", "ref", "sha", "web_url", "created_at", "updated_at")
+JOB_SUMMARY_FIELDS = ("id", "name", "stage", "status")
+GRAPHQL_BATCH_SIZE = 50  # projects asked by one GraphQL query, GitLab caps the complexity of a query
+GRAPHQL_JOBS_LIMIT = 100  # jobs of a pipeline in one GraphQL query, a pipeline with more is asked by REST
+LATEST_PIPELINES_QUERY = """
+query latestPipelines($ids: [ID!], $first: Int, $jobs: Int) {
+  projects(ids: $ids, first: $first) {
+    nodes {
+      id
+      webUrl
+      pipelines(first: 1) {
+        nodes {
+          id
+          iid
+          status
+          ref
+          sha
+          createdAt
+          updatedAt
+          jobs(retried: false, first: $jobs) {
+            pageInfo {
+              hasNextPage
+            }
+            nodes {
+              id
+              name
+              status
+              stage {
+                name
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def pipeline_summary(repo_id: str, pipeline: Union[dict[str, Any], None], jobs: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Status of the latest pipeline of a project, ``pipeline`` is ``None`` if the project has none.
+    """
+    jobs = [{k: job.get(k) for k in JOB_SUMMARY_FIELDS} for job in jobs]
+    job_counts = {}
+    for job in jobs:
+        job_counts[job["status"]] = job_counts.get(job["status"], 0) + 1
+    return {
+        "repo_id": repo_id,
+        "pipeline": {k: pipeline.get(k) for k in PIPELINE_SUMMARY_FIELDS} if pipeline else None,
+        "jobs": jobs,
+        "job_counts": job_counts,
+    }
+
+
+def pipeline_error_summary(repo_id: str, message: str) -> dict[str, Any]:
+    return {"repo_id": repo_id, "pipeline": None, "jobs": [], "job_counts": {}, "error": message}
+
+
+def graphql_id(global_id: str) -> int:
+    """
+    Numeric id of a GraphQL global id, e.g. ``gid://gitlab/Project/7`` is 7.
+    """
+    return int(global_id.rsplit("/", 1)[-1])
+
+
+def latest_pipelines_variables(repo_ids: list[str]) -> dict[str, Any]:
+    return {
+        "ids": [f"gid://gitlab/Project/{repo_id}" for repo_id in repo_ids],
+        "first": len(repo_ids),
+        "jobs": GRAPHQL_JOBS_LIMIT,
+    }
+
+
+def graphql_pipeline_summaries(repo_ids: list[str], output: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """
+    ``pipeline_summary`` of every project of a ``LATEST_PIPELINES_QUERY`` answer, in the shape of the REST one.
+    """
+    projects = {str(graphql_id(node["id"])): node for node in output["data"]["projects"]["nodes"]}
+    summaries = {}
+    for repo_id in repo_ids:
+        project = projects.get(repo_id)
+        if project is None:
+            summaries[repo_id] = pipeline_error_summary(repo_id, "Project not found")
+            continue
+        pipelines = project["pipelines"]["nodes"]
+        if not pipelines:
+            summaries[repo_id] = pipeline_summary(repo_id, None, [])
+            continue
+
+        node = pipelines[0]
+        pipeline_id = graphql_id(node["id"])
+        pipeline = {
+            "id": pipeline_id,
+            "iid": int(node["iid"]),
+            "status": node["status"].lower(),
+            "ref": node["ref"],
+            "sha": node["sha"],
+            "web_url": f"{project['webUrl']}/-/pipelines/{pipeline_id}",
+            "created_at": node["createdAt"],
+            "updated_at": node["updatedAt"],
+        }
+        jobs = [
+            {
+                "id": graphql_id(job["id"]),
+                "name": job["name"],
+                "stage": (job.get("stage") or {}).get("name"),
+                "status": job["status"].lower(),
+            }
+            for job in node["jobs"]["nodes"]
+        ]
+        summaries[repo_id] = pipeline_summary(repo_id, pipeline, jobs)
+    return summaries
+
+
+def graphql_truncated_pipelines(output: dict[str, Any]) -> list[str]:
+    """
+    Repo ids (as str) of a ``LATEST_PIPELINES_QUERY`` answer whose latest pipeline has more than ``GRAPHQL_JOBS_LIMIT``
+    jobs, their summaries miss jobs.
+    """
+    return [
+        str(graphql_id(project["id"]))
+        for project in output["data"]["projects"]["nodes"]
+        if any(pipeline["jobs"]["pageInfo"]["hasNextPage"] for pipeline in project["pipelines"]["nodes"])
+    ]
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ======== for typing ========
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLMemo:
+    """TTLMemo
+
+    Memo of lookups whose results expire ``ttl`` seconds after they are
+    loaded. Concurrent lookups of the same key share one load, so a burst of
+    callers asking for the same namespace or commit costs one request.
+    Falsy results (e.g. not found) are not kept, the next lookup asks again.
+    With a ``ttl`` of 0 nothing is kept, only the loads in flight are shared.
+
+    Attributes:
+        ttl: float (seconds a result is kept)
+        maxsize: int (results kept at most, the least recently used are dropped)
+
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._results: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._loading: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Hashable) -> tuple[bool, Any]:
+        item = self._results.get(key)
+        if item is None or item[0] < time.monotonic():
+            return False, None
+        self._results.move_to_end(key)
+        return True, item[1]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if value and self.ttl > 0:
+            self._results[key] = (time.monotonic() + self.ttl, value)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._cached(key)
+            if found:
+                return value
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            del self._loading[key]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Drop the result of ``key``, or every result when no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+
+class AsyncTTLMemo(TTLMemo):
+    """AsyncTTLMemo
+
+    Coroutine version of ``TTLMemo``, ``load`` returns an awaitable. It is
+    meant to be used from one event loop.
+
+    """
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._cached(key)
+        if found:
+            return value
+        future = self._loading.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await load()
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here, so a failed load nobody else waits for is not reported as never retrieved.
+            future.exception()
+            raise
+        else:
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._loading[key]
@@ -0,0 +1,188 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+# ======== for typing ========
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Union
+
+
+DEFAULT_PER_PAGE = 100  # max page size GitLab accepts
+DEFAULT_MAX_WORKERS = 8
+
+
+def _total_pages(headers) -> int:
+    return int(headers.get("x-total-pages") or 0)
+
+
+def _next_page(headers) -> int:
+    return int(headers.get("x-next-page") or 0)
+
+
+def _keyset_params(params: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in params.items() if k != "page"} | {"pagination": "keyset"}
+
+
+def _next_params(output, params: dict[str, Any], keyset: bool) -> Union[dict[str, Any], None]:
+    """
+    Query params of the page after ``output``, ``None`` on the last page.
+
+    Keyset pages are chained by the ``rel="next"`` URL of the ``Link`` header.
+    When GitLab answers a keyset request with an offset page (the endpoint or
+    the ordering does not support keyset), ``X-Next-Page`` is followed instead.
+    """
+    if keyset:
+        link = output.links.get("next")
+        if link:
+            return dict(parse_qsl(urlsplit(link["url"]).query))
+
+    next_page = _next_page(output.headers)
+    if next_page:
+        return {k: v for k, v in params.items() if k != "pagination"} | {"page": next_page}
+    return None
+
+
+def fetch_all_pages(
+    fetch_page: Callable[[dict[str, Any]], Any],
+    params: dict[str, Any],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    keyset: bool = False,
+) -> list[Any]:
+    """
+    Fetch every page of a paginated listing and return the items in page order.
+
+    The first page tells the total page count, the remaining pages are then
+    fetched concurrently by at most ``max_workers`` threads. GitLab omits
+    ``X-Total-Pages`` on very large collections, in that case pages are
+    walked one by one through ``X-Next-Page``. Keyset pages can only be
+    walked one by one.
+
+    Args:
+        fetch_page: Called with the query params of one page, returns the response.
+        params: Query params shared by all pages, ``page`` is set by this function.
+        max_workers: Max number of pages fetched at the same time.
+        keyset: Use keyset pagination, falls back to offset when GitLab does not support it.
+    """
+    if keyset:
+        return list(iter_pages(fetch_page, params, keyset=True))
+
+    first = fetch_page({**params, "page": 1})
+    items = list(first.json())
+
+    total_pages = _total_pages(first.headers)
+    if total_pages > 1:
+        remaining = range(2, total_pages + 1)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(remaining))) as executor:
+            for page_items in executor.map(lambda page: fetch_page({**params, "page": page}).json(), remaining):
+                items.extend(page_items)
+        return items
+
+    next_page = _next_page(first.headers) if not total_pages else 0
+    while next_page:
+        output = fetch_page({**params, "page": next_page})
+        items.extend(output.json())
+        next_page = _next_page(output.headers)
+    return items
+
+
+async def async_fetch_all_pages(
+    fetch_page: Callable[[dict[str, Any]], Awaitable[Any]],
+    params: dict[str, Any],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    keyset: bool = False,
+) -> list[Any]:
+    """
+    Coroutine version of ``fetch_all_pages``, at most ``max_workers`` pages are awaited at the same time.
+    """
+    if keyset:
+        return [item async for item in async_iter_pages(fetch_page, params, keyset=True)]
+
+    first = await fetch_page({**params, "page": 1})
+    items = list(first.json())
+
+    total_pages = _total_pages(first.headers)
+    if total_pages > 1:
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch(page: int) -> list[Any]:
+            async with semaphore:
+                return (await fetch_page({**params, "page": page})).json()
+
+        for page_items in await asyncio.gather(*(fetch(page) for page in range(2, total_pages + 1))):
+            items.extend(page_items)
+        return items
+
+    next_page = _next_page(first.headers) if not total_pages else 0
+    while next_page:
+        output = await fetch_page({**params, "page": next_page})
+        items.extend(output.json())
+        next_page = _next_page(output.headers)
+    return items
+
+
+def iter_pages(
+    fetch_page: Callable[[dict[str, Any]], Any],
+    params: dict[str, Any],
+    prefetch: bool = True,
+    keyset: bool = False,
+) -> Iterator[Any]:
+    """
+    Lazily yield the items of a paginated listing, page after page.
+
+    While the items of one page are consumed, the next page is fetched in a
+    background thread. Only two pages are held in memory at a time and
+    closing the generator stops fetching further pages.
+
+    Args:
+        fetch_page: Called with the query params of one page, returns the response.
+        params: Query params shared by all pages, ``page`` is set by this function.
+        prefetch: Fetch the next page in the background, set False to fetch on demand.
+        keyset: Use keyset pagination, falls back to offset when GitLab does not support it.
+    """
+    params = _keyset_params(params) if keyset else {**params, "page": 1}
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        output = fetch_page(params)
+        while True:
+            next_params = _next_params(output, params, keyset)
+            pending = None
+            if next_params and executor is not None:
+                pending = executor.submit(fetch_page, next_params)
+
+            yield from output.json()
+
+            if not next_params:
+                return
+            output = pending.result() if pending is not None else fetch_page(next_params)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def async_iter_pages(
+    fetch_page: Callable[[dict[str, Any]], Awaitable[Any]],
+    params: dict[str, Any],
+    prefetch: bool = True,
+    keyset: bool = False,
+) -> AsyncIterator[Any]:
+    """
+    Async generator version of ``iter_pages``, the next page is fetched by a background task.
+    """
+    params = _keyset_params(params) if keyset else {**params, "page": 1}
+    pending = None
+    try:
+        output = await fetch_page(params)
+        while True:
+            next_params = _next_params(output, params, keyset)
+            if next_params and prefetch:
+                pending = asyncio.ensure_future(fetch_page(next_params))
+
+            for item in output.json():
+                yield item
+
+            if not next_params:
+                return
+            output = await pending if pending is not None else await fetch_page(next_params)
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,104 @@
+"""
+Pipeline status of many projects for the status wall, cached briefly in redis.
+
+Per project the cache keeps ``pipeline_status:{repo}``, the
+``pipeline_summary`` of its latest pipeline, for ``ttl`` seconds. A wall
+refresh reads every project by one MGET and asks GitLab only for the
+projects which expired. Summaries which failed to load are not cached, so
+the next refresh asks again.
+"""
+
+import asyncio
+import json
+
+# ======== for typing ========
+from typing import Any, Awaitable, Callable, Optional
+
+
+PIPELINE_STATUS_PREFIX = "pipeline_status"
+
+
+class PipelineStatusCache:
+    """PipelineStatusCache
+
+    Latest pipeline and job summary of many projects, read through a short
+    redis cache. Enabled on an operator by ``enable_pipeline_status_cache``,
+    then ``gl_get_pipeline_statuses`` reads through it.
+
+    Attributes:
+        redis_op: The RedisOperator the summaries are cached by
+        ttl: int (seconds a summary is served from redis)
+        prefix: str (prefix of the redis keys)
+
+    """
+
+    def __init__(self, redis_op, ttl: int = 20, prefix: str = PIPELINE_STATUS_PREFIX):
+        self.redis_op = redis_op
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, repo_id: str) -> str:
+        return f"{self.prefix}:{repo_id}"
+
+    def _load(self, repo_ids: list[str]) -> tuple[dict[str, dict[str, Any]], list[str]]:
+        """
+        Cached summaries of ``repo_ids`` and the repo ids which expired.
+        """
+        statuses, expired = {}, []
+        for repo_id, value in zip(repo_ids, self.redis_op.r.mget([self._key(repo_id) for repo_id in repo_ids])):
+            if value:
+                statuses[repo_id] = json.loads(value)
+            else:
+                expired.append(repo_id)
+        return statuses, expired
+
+    def _store(self, summaries: dict[str, dict[str, Any]]) -> None:
+        pipe = self.redis_op.r.pipeline(transaction=False)
+        for repo_id, summary in summaries.items():
+            if "error" not in summary:
+                pipe.set(self._key(repo_id), json.dumps(summary), ex=self.ttl)
+        pipe.execute()
+
+    def get(
+        self, repo_ids: list[str], fetch: Callable[[list[str]], dict[str, dict[str, Any]]]
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Summaries of ``repo_ids`` (as str, without duplicates), ``fetch`` asks GitLab for the expired ones.
+
+        Returns:
+            Repo id to ``pipeline_summary``, in the order of ``repo_ids``
+        """
+        if not repo_ids:
+            return {}
+        statuses, expired = self._load(repo_ids)
+        if expired:
+            fetched = fetch(expired)
+            self._store(fetched)
+            statuses.update(fetched)
+        return {repo_id: statuses[repo_id] for repo_id in repo_ids}
+
+    async def async_get(
+        self, repo_ids: list[str], fetch: Callable[[list[str]], Awaitable[dict[str, dict[str, Any]]]]
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Coroutine version of ``get``, the blocking redis calls are made off the event loop.
+        """
+        if not repo_ids:
+            return {}
+        statuses, expired = await asyncio.to_thread(self._load, repo_ids)
+        if expired:
+            fetched = await fetch(expired)
+            await asyncio.to_thread(self._store, fetched)
+            statuses.update(fetched)
+        return {repo_id: statuses[repo_id] for repo_id in repo_ids}
+
+    def invalidate(self, repo_ids: Optional[list[Any]] = None) -> None:
+        """
+        Drop the cached summaries of ``repo_ids``, or of every project when none are given.
+        """
+        if repo_ids is None:
+            keys = list(self.redis_op.r.scan_iter(match=self._key("*"), count=100))
+        else:
+            keys = [self._key(str(repo_id)) for repo_id in repo_ids]
+        if keys:
+            self.redis_op.r.unlink(*keys)
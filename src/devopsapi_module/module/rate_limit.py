@@ -0,0 +1,280 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from .bulk import RateLimitGate, retry_after_seconds
+
+# ======== for typing ========
+from typing import Any, AsyncIterator, Awaitable, Callable, Union
+
+
+RATE_LIMIT_KEY = "api_rate_limit:bucket"
+DEFAULT_RATE_LIMIT_RETRIES = 3  # resends of a request answered by 429
+DEFAULT_BACKOFF = 0.5  # seconds, doubled per resend when GitLab does not tell how long to wait
+DEFAULT_JITTER = 0.5  # a pause is stretched by up to this fraction, so the workers do not resume at once
+LOW_REMAINING_RATIO = 0.1  # the concurrency shrinks once less than this part of ``RateLimit-Limit`` is left
+
+# Generic cell rate algorithm: the bucket is kept as the theoretical arrival
+# time of the next request (tat), every call reserves one request and
+# returns the milliseconds to wait for it. Redis TIME is used as the clock,
+# so the processes sharing the bucket need not agree on the time.
+RESERVE_LUA = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = 1 / tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or 0)
+tat = math.max(tat, now) + interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000) + 1000)
+return math.max(0, math.ceil((tat - burst * interval - now) * 1000))
+"""
+
+
+class TokenBucket:
+    """TokenBucket
+
+    Token bucket of one process: ``burst`` requests are sent at once, then
+    ``rate`` requests per second.
+
+    Attributes:
+        rate: float (requests per second)
+        burst: int (requests sent at once with a full bucket)
+
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take one token, return the seconds to wait before the request is sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tat = max(self._tat, now) + 1 / self.rate
+            return max(0.0, self._tat - self.burst / self.rate - now)
+
+    async def async_reserve(self) -> float:
+        return self.reserve()
+
+
+class RedisTokenBucket(TokenBucket):
+    """RedisTokenBucket
+
+    Token bucket shared by every process using the same redis ``key``.
+
+    """
+
+    def __init__(self, redis_op, rate: float, burst: int = None, key: str = RATE_LIMIT_KEY):
+        super().__init__(rate, burst)
+        self.redis_op = redis_op
+        self.key = key
+        self._reserve = redis_op.r.register_script(RESERVE_LUA)
+
+    def reserve(self) -> float:
+        return self._reserve(keys=[self.key], args=[self.rate, self.burst]) / 1000
+
+    async def async_reserve(self) -> float:
+        # The script is sent by the blocking client, off the event loop.
+        return await asyncio.to_thread(self.reserve)
+
+
+def token_bucket(
+    rate: Union[float, None], burst: int = None, redis_op=None, key: str = RATE_LIMIT_KEY
+) -> Union[TokenBucket, None]:
+    """
+    Bucket of ``rate`` requests per second, shared through redis when ``redis_op`` is given, ``None`` without rate.
+    """
+    if rate is None:
+        return None
+    if redis_op is not None:
+        return RedisTokenBucket(redis_op, rate, burst, key=key)
+    return TokenBucket(rate, burst)
+
+
+def _low_remaining(headers) -> bool:
+    remaining, limit = headers.get("RateLimit-Remaining"), headers.get("RateLimit-Limit")
+    if not (remaining and limit and remaining.isdigit() and limit.isdigit() and int(limit)):
+        return False
+    return int(remaining) / int(limit) < LOW_REMAINING_RATIO
+
+
+class RateLimiter:
+    """RateLimiter
+
+    Client side throttling of the requests of one ``Request``. A request
+    first takes a token from ``bucket`` (if any), then waits for one of
+    ``concurrency`` slots. The concurrency adapts to the rate limit headers
+    of GitLab: it grows by one per round of successful requests up to
+    ``max_concurrency``, shrinks by one while ``RateLimit-Remaining`` is
+    low and is halved on a 429. It shrinks at most once per window: a
+    response to a request sent before the last decrease does not shrink it
+    again, as that request was sent under the old limit. A 429 or an exhausted limit pauses every
+    request for the ``Retry-After`` (or an exponential backoff) stretched by
+    a random jitter, then a 429 is sent again up to ``retries`` times.
+
+    Attributes:
+        bucket: Union[TokenBucket, None]
+        max_concurrency: int
+        min_concurrency: int
+        concurrency: float (current limit of requests in flight)
+        in_flight: int
+        throttled: int (responses answered by 429)
+
+    """
+
+    def __init__(
+        self,
+        bucket: Union[TokenBucket, None] = None,
+        max_concurrency: int = 10,
+        min_concurrency: int = 1,
+        retries: int = DEFAULT_RATE_LIMIT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        jitter: float = DEFAULT_JITTER,
+    ):
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.jitter = jitter
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._decreased_at = float("-inf")
+        self.gate = RateLimitGate()
+        self._lock = threading.Lock()
+        self._slot = threading.Condition(self._lock)
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.concurrency)
+
+    def _decrease(self, concurrency: float, sent_at: float) -> None:
+        if sent_at >= self._decreased_at:
+            self.concurrency = max(self.min_concurrency, concurrency)
+            self._decreased_at = time.monotonic()
+
+    def _observe(self, output, attempt: int, sent_at: float) -> bool:
+        """
+        Adapt the concurrency to a response and pause if asked to, return whether to send the request again.
+
+        Args:
+            sent_at: ``time.monotonic()`` when the request was sent.
+        """
+        wait = retry_after_seconds(output)
+        with self._lock:
+            if output.status_code == 429:
+                self.throttled += 1
+                self._decrease(self.concurrency / 2, sent_at)
+                wait = max(wait or 0.0, self.backoff * 2**attempt)
+            elif wait is not None or _low_remaining(output.headers):
+                self._decrease(self.concurrency - 1, sent_at)
+            elif output.status_code < 500:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        if wait:
+            self.gate.pause(wait * (1 + random.uniform(0, self.jitter)))
+        return output.status_code == 429 and attempt < self.retries
+
+    def call(self, send: Callable[[], Any]) -> Any:
+        """
+        Send a request through the limiter, ``send`` sends it and returns the response.
+        """
+        for attempt in range(self.retries + 1):
+            self.gate.wait()
+            if self.bucket is not None:
+                time.sleep(self.bucket.reserve())
+            with self._slot:
+                self._slot.wait_for(self._has_slot)
+                self.in_flight += 1
+            sent_at = time.monotonic()
+            try:
+                output = send()
+            finally:
+                with self._slot:
+                    self.in_flight -= 1
+                    self._slot.notify_all()
+            if not self._observe(output, attempt, sent_at):
+                return output
+            output.close()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "paused": self.gate.remaining(),
+            }
+
+
+class AsyncRateLimiter(RateLimiter):
+    """AsyncRateLimiter
+
+    Coroutine version of ``RateLimiter``, ``send`` returns an awaitable.
+    The slots are waited for on a condition of the running event loop.
+
+    """
+
+    _async_slot: Union[asyncio.Condition, None] = None
+    _loop: Union[asyncio.AbstractEventLoop, None] = None
+
+    @property
+    def async_slot(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._async_slot is None or self._loop is not loop:
+            self._async_slot, self._loop = asyncio.Condition(), loop
+        return self._async_slot
+
+    async def _acquire(self, slot: asyncio.Condition) -> None:
+        await self.gate.async_wait()
+        if self.bucket is not None:
+            await asyncio.sleep(await self.bucket.async_reserve())
+        async with slot:
+            await slot.wait_for(self._has_slot)
+            self.in_flight += 1
+
+    async def _release(self, slot: asyncio.Condition) -> None:
+        async with slot:
+            self.in_flight -= 1
+            slot.notify_all()
+
+    async def call(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        slot = self.async_slot
+        for attempt in range(self.retries + 1):
+            await self._acquire(slot)
+            sent_at = time.monotonic()
+            try:
+                output = await send()
+            finally:
+                await self._release(slot)
+            if not self._observe(output, attempt, sent_at):
+                return output
+            await output.aclose()
+
+    @asynccontextmanager
+    async def stream(self, send: Callable[[], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """
+        ``call`` for a response whose body is read lazily: the slot is held, and the response is open, until the
+        ``async with`` block exits.
+        """
+        slot = self.async_slot
+        for attempt in range(self.retries + 1):
+            await self._acquire(slot)
+            try:
+                sent_at = time.monotonic()
+                output = await send()
+                retry = self._observe(output, attempt, sent_at)
+                if not retry:
+                    try:
+                        yield output
+                    finally:
+                        await output.aclose()
+                    return
+                await output.aclose()
+            finally:
+                await self._release(slot)
@@ -1,5 +1,10 @@
+import threading
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .rate_limit import RATE_LIMIT_KEY, RateLimiter, token_bucket
+from .response_cache import ResponseCache
 
 
 # ======== for typing ========
@@ -7,16 +12,225 @@ from typing import Any, Union
 from requests.models import Response
 
 
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+SESSION_OPTIONS = (
+    "pool_connections",
+    "pool_maxsize",
+    "pool_block",
+    "keep_alive",
+    "connect_timeout",
+    "read_timeout",
+    "max_retries",
+    "backoff_factor",
+    "retry_status_forcelist",
+)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """PooledHTTPAdapter
+
+    HTTPAdapter which keeps usage counters of its connection pools, so we can
+    tell whether ``pool_maxsize`` is too small for the load.
+
+    Attributes:
+        requests_total: int (requests sent through the adapter)
+        in_flight: int (requests currently waiting for a response)
+        max_in_flight: int (highest ``in_flight`` seen)
+        saturated: int (requests sent while ``in_flight`` exceeded ``pool_maxsize``)
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self.requests_total = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.saturated = 0
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        with self._stats_lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if self.in_flight > self._pool_maxsize:
+                self.saturated += 1
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            with self._stats_lock:
+                self.in_flight -= 1
+
+    def pool_stats(self) -> dict[str, int]:
+        pools = self.poolmanager.pools
+        connections_created, idle_connections = 0, 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections_created += pool.num_connections
+            idle_connections += pool.pool.qsize() if pool.pool is not None else 0
+
+        with self._stats_lock:
+            return {
+                "requests": self.requests_total,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "saturated": self.saturated,
+                "pools": len(pools),
+                "pool_maxsize": self._pool_maxsize,
+                "connections_created": connections_created,
+                "idle_connections": idle_connections,
+            }
+
+
 class Request:
+    # Session options, override them on subclass or call ``configure_session``.
+    pool_connections: int = 10  # number of hosts to keep a pool for
+    pool_maxsize: int = 10  # connections kept per host
+    pool_block: bool = False  # wait for a free connection instead of opening an extra one
+    keep_alive: bool = True
+    connect_timeout: Union[float, None] = 10
+    read_timeout: Union[float, None] = 60
+    max_retries: int = 3  # only idempotent methods are retried after the request is sent
+    backoff_factor: float = 0.5
+    retry_status_forcelist: tuple[int, ...] = (502, 503, 504)
+
+    response_cache: Union[ResponseCache, None] = None
+    rate_limiter: Union[RateLimiter, None] = None
+
+    _session: Union[requests.Session, None] = None
+    _adapter: Union[PooledHTTPAdapter, None] = None
+    _session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The shared connection-pooled session, built on first use.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._adapter = self.__build_adapter()
+                    self._session = self.__build_session(self._adapter)
+        return self._session
+
+    def __build_adapter(self) -> PooledHTTPAdapter:
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.retry_status_forcelist,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+            # With a rate limiter the 429s are resent by it, paused for every request instead of one.
+            respect_retry_after_header=self.rate_limiter is None,
+        )
+        return PooledHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=retry,
+        )
+
+    def __build_session(self, adapter: PooledHTTPAdapter) -> requests.Session:
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def configure_session(self, **options: Any) -> None:
+        """
+        Change session options, the current session is closed and rebuilt on next request.
+
+        Args:
+            options:
+            - pool_connections(int)
+            - pool_maxsize(int)
+            - pool_block(bool)
+            - keep_alive(bool)
+            - connect_timeout(float)
+            - read_timeout(float)
+            - max_retries(int)
+            - backoff_factor(float)
+            - retry_status_forcelist(tuple[int])
+        """
+        for name, value in options.items():
+            if name not in SESSION_OPTIONS:
+                raise TypeError(f"Unknown session option: {name}")
+            setattr(self, name, value)
+        self.close()
+
+    def close(self) -> None:
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+            self._session, self._adapter = None, None
+
+    def pool_stats(self) -> dict[str, int]:
+        """
+        Connection pool usage counters, empty before the first request.
+        """
+        adapter = self._adapter
+        return adapter.pool_stats() if adapter is not None else {}
+
+    def enable_response_cache(self, redis_op, ttls: dict[str, int], stale_ttl: int = 3600) -> None:
+        """
+        Cache GET responses in redis, see ``ResponseCache``.
+
+        Args:
+            redis_op: The RedisOperator responses are stored by.
+            ttls: Path pattern and the seconds its responses stay fresh, ``*`` matches one path segment.
+            stale_ttl: Seconds a stale response is kept for revalidation.
+        """
+        self.response_cache = ResponseCache(redis_op, ttls, stale_ttl=stale_ttl)
+
+    def disable_response_cache(self) -> None:
+        self.response_cache = None
+
+    def enable_rate_limit(
+        self,
+        rate: Union[float, None] = None,
+        burst: Union[int, None] = None,
+        max_concurrency: Union[int, None] = None,
+        redis_op=None,
+        key: str = RATE_LIMIT_KEY,
+    ) -> None:
+        """
+        Throttle requests on the client side and adapt their concurrency to the rate limit headers, see ``RateLimiter``.
+
+        Args:
+            rate: Requests per second of the token bucket, ``None`` to only adapt the concurrency.
+            burst: Requests sent at once with a full bucket, ``rate`` by default.
+            max_concurrency: Upper bound of requests in flight, ``pool_maxsize`` by default.
+            redis_op: Share the token bucket among processes through this RedisOperator.
+            key: Redis key of the shared token bucket.
+        """
+        self.rate_limiter = RateLimiter(
+            token_bucket(rate, burst, redis_op=redis_op, key=key),
+            max_concurrency=max_concurrency or self.pool_maxsize,
+        )
+        self.close()
+
+    def disable_rate_limit(self) -> None:
+        self.rate_limiter = None
+        self.close()
+
+    def _absolute_url(self, path: str) -> str:
+        # An absolute URL reaches an endpoint outside the REST API, e.g. GraphQL.
+        return path if path.startswith(("http://", "https://")) else f"{self.url}{path}"
+
     def __get_request_func(self, method: str) -> callable:
         method = method.upper()
+        session = self.session
 
         method_req_func_mapping = {
-            "GET": requests.get,
-            "POST": requests.post,
-            "PUT": requests.put,
-            "PATCH": requests.patch,
-            "DELETE": requests.delete,
+            "GET": session.get,
+            "POST": session.post,
+            "PUT": session.put,
+            "PATCH": session.patch,
+            "DELETE": session.delete,
         }
         return method_req_func_mapping[method]
 
@@ -27,8 +241,14 @@ class Request:
         headers: Union[dict[str, Any], None] = None,
         params: Union[dict[str, Any], None] = None,
         data: Union[dict[str, Any], None] = None,
+        stream: bool = False,
     ) -> Response:
-        url, req_func = f"{self.url}{path}", self.__get_request_func(method)
+        """
+        Args:
+            path: Path under the REST API, or an absolute URL.
+            stream: Read the body lazily by ``iter_content``, close the response when done.
+        """
+        url, req_func = self._absolute_url(path), self.__get_request_func(method)
 
         headers = headers if headers else {}
         params = params if params else {}
@@ -45,8 +265,16 @@ class Request:
             "params": params,
             "data": data,
             "verify": False,
+            "timeout": (self.connect_timeout, self.read_timeout),
+            "stream": stream,
         }
-        return req_func(**req_func_kwargs)
+        if self.rate_limiter is not None:
+            response = self.rate_limiter.call(lambda: req_func(**req_func_kwargs))
+        else:
+            response = req_func(**req_func_kwargs)
+        if self.response_cache is not None and method.upper() != "GET" and url != path:
+            self.response_cache.invalidate(path)
+        return response
 
     def api_get(
         self,
@@ -57,6 +285,15 @@ class Request:
         headers = headers if headers else {}
         params = params if params else {}
 
+        if self.response_cache is not None:
+            return self.response_cache.get(
+                self._absolute_url(path),
+                path,
+                params,
+                headers,
+                lambda request_headers: self.api_request("GET", path, headers=request_headers, params=params),
+            )
+
         return self.api_request(
             "GET",
             path,
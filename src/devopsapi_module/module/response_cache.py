@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import json
+import re
+import time
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+# ======== for typing ========
+from typing import Any, Callable, Union
+
+
+RESPONSE_CACHE_PREFIX = "api_response_cache"
+# Response headers kept in the cache, the rest are dropped.
+CACHED_HEADERS = (
+    "Content-Type",
+    "ETag",
+    "Last-Modified",
+    "Link",
+    "X-Next-Page",
+    "X-Page",
+    "X-Per-Page",
+    "X-Prev-Page",
+    "X-Total",
+    "X-Total-Pages",
+)
+
+
+def _compile_path_pattern(pattern: str) -> re.Pattern:
+    # ``*`` matches exactly one path segment.
+    return re.compile("^" + re.escape(pattern).replace(r"\*", "[^/]+") + "$")
+
+
+def _ancestors(path: str) -> list[str]:
+    segments = path.strip("/").split("/")
+    return ["/" + "/".join(segments[:i]) for i in range(1, len(segments))]
+
+
+class ResponseCache:
+    """ResponseCache
+
+    Read-through cache of GET responses kept in Redis. A response is served
+    from Redis while it is fresh, afterwards it is revalidated with
+    ``If-None-Match`` / ``If-Modified-Since`` so an unchanged resource costs a
+    304 without body. Any other method sent to a path drops the cached
+    responses of the path, of its sub paths and of its parent listings.
+
+    Attributes:
+        redis_op: RedisOperator
+        ttls: dict[str, int] (path pattern: seconds a response stays fresh, ``*`` matches one segment)
+        stale_ttl: int (seconds a stale response is kept for revalidation)
+
+    """
+
+    def __init__(self, redis_op, ttls: dict[str, int], stale_ttl: int = 3600, prefix: str = RESPONSE_CACHE_PREFIX):
+        self.redis_op = redis_op
+        self.ttls = [(_compile_path_pattern(pattern), ttl) for pattern, ttl in ttls.items()]
+        self.stale_ttl = stale_ttl
+        self.prefix = prefix
+
+    def ttl_of(self, path: str) -> int:
+        for pattern, ttl in self.ttls:
+            if pattern.match(path):
+                return ttl
+        return 0
+
+    def __entry_key(self, url: str, params: dict[str, Any], headers: dict[str, Any]) -> str:
+        identity = json.dumps(
+            [url, sorted((str(k), str(v)) for k, v in params.items() if v is not None), headers.get("Authorization")]
+        )
+        return f"{self.prefix}:entry:{hashlib.sha1(identity.encode()).hexdigest()}"
+
+    def __load(self, key: str) -> Union[dict[str, Any], None]:
+        value = self.redis_op.r.get(key)
+        return json.loads(value) if value else None
+
+    def __store(self, key: str, path: str, entry: dict[str, Any]) -> None:
+        expire = int(entry["fresh_until"] - time.time()) + self.stale_ttl
+        pipe = self.redis_op.r.pipeline(transaction=False)
+        pipe.set(key, json.dumps(entry), ex=expire)
+        pipe.sadd(f"{self.prefix}:exact:{path}", key)
+        pipe.expire(f"{self.prefix}:exact:{path}", expire)
+        for index_path in [*_ancestors(path), path]:
+            pipe.sadd(f"{self.prefix}:prefix:{index_path}", key)
+            pipe.expire(f"{self.prefix}:prefix:{index_path}", expire)
+        pipe.execute()
+
+    @staticmethod
+    def __to_entry(response: Response, fresh_until: float) -> dict[str, Any]:
+        return {
+            "fresh_until": fresh_until,
+            "status": response.status_code,
+            "url": response.url,
+            "encoding": response.encoding,
+            "headers": {k: response.headers[k] for k in CACHED_HEADERS if k in response.headers},
+            "body": base64.b64encode(response.content).decode(),
+        }
+
+    @staticmethod
+    def __to_response(entry: dict[str, Any]) -> Response:
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = "OK"
+        response.url = entry["url"]
+        response.encoding = entry["encoding"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = base64.b64decode(entry["body"])
+        return response
+
+    def get(
+        self,
+        url: str,
+        path: str,
+        params: dict[str, Any],
+        headers: dict[str, Any],
+        send: Callable[[dict[str, Any]], Response],
+    ) -> Response:
+        """
+        Serve a GET from the cache, ``send`` is called with the request headers on miss or revalidation.
+
+        Args:
+            url: Full URL of the request, used to tell apart the same path on different servers.
+            path: Path the TTL and the invalidation are looked up by.
+            params: Query params of the request.
+            headers: Headers of the request.
+            send: Sends the request with the given headers.
+        """
+        ttl = self.ttl_of(path)
+        if not ttl:
+            return send(headers)
+
+        key = self.__entry_key(url, params, headers)
+        entry = self.__load(key)
+        if entry is not None and entry["fresh_until"] > time.time():
+            return self.__to_response(entry)
+
+        request_headers = dict(headers)
+        if entry is not None:
+            if "ETag" in entry["headers"]:
+                request_headers["If-None-Match"] = entry["headers"]["ETag"]
+            if "Last-Modified" in entry["headers"]:
+                request_headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = send(request_headers)
+        if response.status_code == 304 and entry is not None:
+            entry["fresh_until"] = time.time() + ttl
+            self.__store(key, path, entry)
+            return self.__to_response(entry)
+
+        if response.status_code == 200:
+            self.__store(key, path, self.__to_entry(response, time.time() + ttl))
+        return response
+
+    def invalidate(self, path: str) -> None:
+        """
+        Drop the cached responses of ``path``, of its sub paths and of its parent listings.
+        """
+        index_keys = [f"{self.prefix}:prefix:{path}"] + [
+            f"{self.prefix}:exact:{ancestor}" for ancestor in _ancestors(path)
+        ]
+        entry_keys = self.redis_op.r.sunion(index_keys)
+
+        pipe = self.redis_op.r.pipeline(transaction=False)
+        if entry_keys:
+            pipe.delete(*entry_keys)
+        pipe.delete(*index_keys)
+        pipe.execute()
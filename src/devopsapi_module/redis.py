@@ -1,9 +1,19 @@
-import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Optional, Union
+from typing import Any, Callable, Hashable, Iterator, Optional, Union
 import os
 import redis
 
+from devopsapi_module.codec import CacheCodec
+from devopsapi_module.redis_metrics import RedisMetrics
+
+log: logging.Logger = logging.getLogger(__name__)
+
 
 ISSUE_FAMILIES_KEY = "issue_families"
 PROJECT_ISSUE_CALCULATE_KEY = "project_issue_calculation"
@@ -11,37 +21,416 @@ SERVER_ALIVE_KEY = "system_all_alive"
 TEMPLATE_CACHE = "template_list_cache"
 SHOULD_UPDATE_TEMPLATE = "should_update_template"
 ISSUE_PJ_USER_RELATION_KEY = "issue_pj_user_relation"
+DEFAULT_SCAN_COUNT = 100
+TEMPLATE_CACHE_SWAP = f"{TEMPLATE_CACHE}:swap"
+TEMPLATE_CACHE_GENERATION = "template_list_cache_generation"
+TEMPLATE_CACHE_CHANNEL = "template_list_cache_changed"
+TEMPLATE_CACHE_REBUILD_LOCK = "template_list_cache_rebuild_lock"
+TEMPLATE_CACHE_REBUILD_FENCE = "template_list_cache_rebuild_fence"
+TEMPLATE_CACHE_REBUILT_AT = "template_list_cache_rebuilt_at"
+NEAR_CACHE_KEYS = (SHOULD_UPDATE_TEMPLATE, SERVER_ALIVE_KEY)
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache, entries also expire ``ttl`` seconds after they are set.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Bumped by ``clear`` and ``delete``, lets a reader tell that the cache
+        # was invalidated while it was loading a value.
+        self.version = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None) -> None:
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self.version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.version += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _to_bool(value: Optional[str]) -> bool:
+    if value:  # if value is not None or not empty string
+        if value.lower() in ("1", "true", "yes"):
+            return True
+    return False
+
+
+def _is_one(value: int) -> bool:
+    return value == 1
+
+
+def lua_script(source: str) -> redis.commands.core.Script:
+    """
+    Lua script meant to be built once at module level. It is not bound to a
+    client, so importing the module connects to nothing: run it with
+    ``script(keys=..., args=..., client=redis_op.r)`` or a pipeline.
+
+    :param source: The script, every key it touches must be passed in ``KEYS``
+    :return: The script
+    """
+    return redis.commands.core.Script(None, source.encode())
+
+
+_MISSING = object()
+
+
+class RedisBatch:
+    """
+    Queue ``RedisOperator`` operations into one pipeline, they are sent in a
+    single round trip when the ``with`` block exits. Each queued operation
+    gets one entry in ``results``, converted the same way as the
+    ``RedisOperator`` method of the same name.
+
+    Usage::
+
+        with redis_op.batch() as b:
+            b.bool_get(SHOULD_UPDATE_TEMPLATE)
+            b.dict_len(TEMPLATE_CACHE)
+        should_update, template_number = b.results
+    """
+
+    def __init__(self, pipe: redis.client.Pipeline):
+        self.pipe = pipe
+        self.results: Optional[list[Any]] = None
+        # (commands queued for the operation, converter of their raw results)
+        self._operations: list[tuple[int, Any]] = []
+
+    def __enter__(self) -> "RedisBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.execute()
+        else:
+            self.pipe.reset()
+
+    def _queue(self, commands: int = 1, converter=None) -> "RedisBatch":
+        self._operations.append((commands, converter))
+        return self
+
+    def execute(self) -> list[Any]:
+        """
+        Send the queued operations, also called when the ``with`` block exits.
+
+        :return: The typed results, in the order the operations were queued.
+        """
+        return self._convert(self.pipe.execute())
+
+    def _convert(self, raw_results: list[Any]) -> list[Any]:
+        raw_results, self.results = iter(raw_results), []
+        for commands, converter in self._operations:
+            values = [next(raw_results) for _ in range(commands)]
+            if converter is None:
+                self.results.append(values[0])
+            else:
+                self.results.append(converter(*values))
+        self._operations = []
+        return self.results
+
+    #####################
+    # String type
+    #####################
+    def str_get(self, key: str) -> "RedisBatch":
+        self.pipe.get(key)
+        return self._queue()
+
+    def str_mget(self, keys: list[str]) -> "RedisBatch":
+        self.pipe.mget(keys)
+        return self._queue()
+
+    def str_set(self, key: str, value: str) -> "RedisBatch":
+        self.pipe.set(key, value)
+        return self._queue()
+
+    def str_delete(self, key: str) -> "RedisBatch":
+        self.pipe.delete(key)
+        return self._queue(converter=_is_one)
+
+    #####################
+    # Boolean type
+    #####################
+    def bool_get(self, key: str) -> "RedisBatch":
+        self.pipe.get(key)
+        return self._queue(converter=_to_bool)
+
+    def bool_set(self, key: str, value: bool) -> "RedisBatch":
+        self.pipe.set(key, str(value).lower())
+        return self._queue()
+
+    def bool_delete(self, key: str) -> "RedisBatch":
+        self.pipe.delete(key)
+        return self._queue(converter=_is_one)
+
+    #####################
+    # Dictionary type
+    #####################
+    def dict_set_all(self, key: str, value: dict[str, str]) -> "RedisBatch":
+        self.pipe.hset(key, mapping=value)
+        return self._queue(converter=_is_one)
+
+    def dict_set_certain(self, key: str, sub_key: str, value: str) -> "RedisBatch":
+        self.pipe.hset(key, sub_key, value)
+        return self._queue(converter=_is_one)
+
+    def dict_get_all(self, key: str) -> "RedisBatch":
+        self.pipe.hgetall(key)
+        return self._queue()
+
+    def dict_get_certain(self, key: str, sub_key: Union[str, int]) -> "RedisBatch":
+        self.pipe.hget(key, sub_key)
+        return self._queue()
+
+    def dict_get_many(self, key: str, sub_keys: list[Union[str, int]]) -> "RedisBatch":
+        self.pipe.hmget(key, sub_keys)
+        return self._queue()
+
+    def dict_delete_certain(self, key: str, sub_key: str) -> "RedisBatch":
+        self.pipe.hdel(key, sub_key)
+        return self._queue(converter=_is_one)
+
+    def dict_delete_all(self, key: str) -> "RedisBatch":
+        self.pipe.hgetall(key)
+        self.pipe.delete(key)
+        return self._queue(commands=2, converter=lambda value, _: value)
+
+    def dict_unlink_all(self, key: str) -> "RedisBatch":
+        self.pipe.unlink(key)
+        return self._queue(converter=_is_one)
+
+    def dict_len(self, key: str) -> "RedisBatch":
+        self.pipe.hlen(key)
+        return self._queue()
+
+
+class NearCache(threading.Thread):
+    """
+    In-process copy of hot string keys, kept up to date by redis CLIENT TRACKING.
+
+    The thread holds two dedicated connections: one subscribed to
+    ``__redis__:invalidate``, and one turning on broadcast tracking of
+    ``prefixes`` with its invalidations redirected to the first. Every write
+    of a tracked key on the server, by any client, then evicts the local
+    copy. Values are only served while both connections are up, and the
+    copy is dropped on every reconnect since invalidations may have been
+    missed meanwhile. ``ttl`` bounds the staleness if the server stops
+    sending them for any other reason.
+    """
+
+    def __init__(
+        self,
+        operator: "RedisOperator",
+        prefixes: tuple[str, ...] = NEAR_CACHE_KEYS,
+        maxsize: int = 1024,
+        ttl: float = 60,
+        retry_interval: float = 1,
+    ):
+        super().__init__(name="redis-near-cache", daemon=True)
+        self.operator = operator
+        self.prefixes = tuple(prefixes)
+        self.cache = LocalCache(maxsize=maxsize, ttl=ttl)
+        self.retry_interval = retry_interval
+        self.connected = threading.Event()
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def get(self, key: str, load: Callable[[str], Optional[str]]) -> Optional[str]:
+        """
+        Serve ``key`` from the local copy, ``load`` reads it from redis on a miss.
+        """
+        if not self.connected.is_set() or not self.tracks(key):
+            return load(key)
+
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            with self._stats_lock:
+                self.hits += 1
+            return value
+
+        with self._stats_lock:
+            self.misses += 1
+        # An invalidation arriving while the value is read bumps the version, the stale value is then not kept.
+        version = self.cache.version
+        value = load(key)
+        self.cache.set(key, value, version=version)
+        return value
+
+    def evict(self, *keys: str) -> None:
+        for key in keys:
+            if self.tracks(key):
+                self.cache.delete(key)
+
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "size": len(self.cache),
+                "connected": int(self.connected.is_set()),
+            }
+
+    def _connect(self) -> tuple[redis.Connection, redis.Connection]:
+        pool = self.operator.pool
+        listener = pool.connection_class(**pool.connection_kwargs)
+        tracker = pool.connection_class(**pool.connection_kwargs)
+        listener.send_command("CLIENT", "ID")
+        client_id = listener.read_response()
+        listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+        listener.read_response()
+
+        prefix_args = [arg for prefix in self.prefixes for arg in ("PREFIX", prefix)]
+        tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefix_args)
+        tracker.read_response()
+        return listener, tracker
+
+    def _invalidate(self, keys: Optional[list[str]]) -> None:
+        # ``None`` means the whole database was flushed.
+        if keys is None:
+            self.cache.clear()
+        else:
+            for key in keys:
+                self.cache.delete(key)
+        with self._stats_lock:
+            self.invalidations += 1 if keys is None else len(keys)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            listener = tracker = None
+            try:
+                listener, tracker = self._connect()
+                self.cache.clear()
+                self.connected.set()
+                while not self._stop_event.is_set():
+                    if listener.can_read(timeout=1):
+                        message = listener.read_response()
+                        if message[0] == "message" and message[1] == INVALIDATE_CHANNEL:
+                            self._invalidate(message[2])
+                    else:
+                        # Tracking stops silently when the tracker connection is lost.
+                        tracker.send_command("PING")
+                        tracker.read_response()
+            except redis.RedisError as e:
+                log.warning(f"Redis near cache disconnected, reason: {e}")
+            finally:
+                self.connected.clear()
+                self.cache.clear()
+                for connection in (listener, tracker):
+                    if connection is not None:
+                        connection.disconnect()
+            self._stop_event.wait(self.retry_interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
 
 
 class RedisOperator:
-    def __init__(self, redis_base_url):
+    def __init__(self, redis_base_url: str, max_connections: Optional[int] = None, **pool_kwargs: Any):
+        """
+        :param redis_base_url: ``host:port``, or a ``redis://``, ``rediss://`` or ``unix://`` URL
+        :param max_connections: Max connections of the pool, unlimited by default
+        :param pool_kwargs: Other ``redis.ConnectionPool`` options, e.g. socket_timeout, health_check_interval
+        """
         self.redis_base_url = redis_base_url
-        # prod
-        self.pool = redis.ConnectionPool(
-            host=self.redis_base_url.split(":")[0],
-            port=int(self.redis_base_url.split(":")[1]),
-            decode_responses=True,
-        )
+        if "://" in redis_base_url:
+            self.pool = redis.ConnectionPool.from_url(
+                redis_base_url,
+                decode_responses=True,
+                max_connections=max_connections,
+                **pool_kwargs,
+            )
+        else:
+            # prod
+            self.pool = redis.ConnectionPool(
+                host=self.redis_base_url.split(":")[0],
+                port=int(self.redis_base_url.split(":")[1]),
+                decode_responses=True,
+                max_connections=max_connections,
+                **pool_kwargs,
+            )
         self.r = redis.Redis(connection_pool=self.pool)
+        self.near_cache: Optional[NearCache] = None
+        self.metrics: Optional[RedisMetrics] = None
 
     #####################
     # String type
     #####################
     def str_get(self, key: str) -> str:
+        if self.near_cache is not None:
+            return self.near_cache.get(key, self.r.get)
         return self.r.get(key)
 
+    def str_mget(self, keys: list[str]) -> list[Optional[str]]:
+        """
+        Get many strings in one round trip.
+
+        :param keys: The keys to get
+        :return: The values in the order of ``keys``, ``None`` for keys not exist
+        """
+        return self.r.mget(keys)
+
     def str_set(self, key: str, value: str) -> bool:
         """
         :return: The action is successful or not
             True / False
         """
+        self._evict(key)
         return self.r.set(key, value)
 
+    def str_mset(self, values: dict[str, str]) -> bool:
+        """
+        Set many strings in one round trip.
+
+        :return: The action is successful or not
+            True / False
+        """
+        self._evict(*values)
+        return self.r.mset(values)
+
     def str_delete(self, key) -> bool:
         """
         :return: The action is successful or not
             True / False
         """
+        self._evict(key)
         return self.r.delete(key) == 1
 
     #####################
@@ -61,11 +450,8 @@ class RedisOperator:
         :param key: The key to get
         :return: The result from redis server
         """
-        value: Optional[str] = self.r.get(key)
-        if value:  # if value is not None or not empty string
-            if value.lower() in ("1", "true", "yes"):
-                return True
-        return False
+        value: Optional[str] = self.str_get(key)
+        return _to_bool(value)
 
     def bool_set(self, key: str, value: bool) -> bool:
         """
@@ -75,6 +461,7 @@ class RedisOperator:
         :param value: The boolean value to set
         :return: True if set successfully, False if not
         """
+        self._evict(key)
         return self.r.set(key, str(value).lower())
 
     def bool_delete(self, key: str) -> bool:
@@ -84,6 +471,7 @@ class RedisOperator:
         :param key: The key to delete
         :return: True if the key was deleted, False if the key did not exist
         """
+        self._evict(key)
         result: int = self.r.delete(key)
         if result == 1:
             return True
@@ -113,6 +501,27 @@ class RedisOperator:
     def dict_get_certain(self, key: str, sub_key: Union[str, int]) -> str:
         return self.r.hget(key, sub_key)
 
+    def dict_get_many(self, key: str, sub_keys: list[Union[str, int]]) -> list[Optional[str]]:
+        """
+        Get many fields of a dictionary in one round trip.
+
+        :return: The values in the order of ``sub_keys``, ``None`` for fields not exist
+        """
+        return self.r.hmget(key, sub_keys)
+
+    def dict_set_many_keys(self, values: dict[str, dict[str, str]]) -> bool:
+        """
+        Set fields of many dictionaries in one round trip.
+
+        :param values: Dictionary key to the fields to set in it
+        :return: The action is successful or not, as ``dict_set_all`` for every dictionary
+            True / False, False when ``values`` is empty
+        """
+        with self.batch() as b:
+            for key, value in values.items():
+                b.dict_set_all(key, value)
+        return bool(b.results) and all(b.results)
+
     def dict_delete_certain(self, key: str, sub_key: str) -> bool:
         return self.r.hdel(key, sub_key) == 1
 
@@ -121,11 +530,166 @@ class RedisOperator:
         self.r.delete(key)
         return value
 
+    def dict_unlink_all(self, key: str) -> bool:
+        """
+        Delete a dictionary without blocking the server, the memory is
+        reclaimed in the background and the old value is not returned.
+
+        :return: True if the key was deleted, False if the key did not exist
+        """
+        return self.r.unlink(key) == 1
+
+    def dict_iter(self, key: str, count: int = DEFAULT_SCAN_COUNT) -> Iterator[tuple[str, str]]:
+        """
+        Iterate a dictionary by HSCAN, so a large one neither blocks the
+        server nor is loaded into memory at once. A field may be yielded
+        twice if the dictionary is resized during the scan.
+
+        :param key: The key of the dictionary
+        :param count: The number of fields asked for per round trip
+        :return: Iterator of (sub_key, value)
+        """
+        return self.r.hscan_iter(key, count=count)
+
     def dict_len(self, key: str) -> int:
         return self.r.hlen(key)
 
+    #####################
+    # Near cache
+    #####################
+    def enable_near_cache(
+        self,
+        prefixes: tuple[str, ...] = NEAR_CACHE_KEYS,
+        maxsize: int = 1024,
+        ttl: float = 60,
+    ) -> NearCache:
+        """
+        Serve ``str_get`` / ``bool_get`` of hot keys from process memory, see ``NearCache``.
+        Needs redis 6 or later.
 
-redis_op = RedisOperator(os.getenv("REDIS_BASE_URL"))
+        :param prefixes: Keys starting with any of these are cached, by default the flag keys read on every request
+        :param maxsize: Max number of keys kept
+        :param ttl: Seconds a value is kept at most, in case an invalidation is lost
+        :return: The running near cache
+        """
+        if self.near_cache is None or not self.near_cache.is_alive():
+            self.near_cache = NearCache(self, prefixes=prefixes, maxsize=maxsize, ttl=ttl)
+            self.near_cache.start()
+        return self.near_cache
+
+    def disable_near_cache(self) -> None:
+        if self.near_cache is not None:
+            self.near_cache.stop()
+            self.near_cache = None
+
+    def near_cache_stats(self) -> dict[str, int]:
+        """
+        :return: Counters of hits, misses and invalidations, empty if the near cache is not enabled
+        """
+        return self.near_cache.stats() if self.near_cache is not None else {}
+
+    def _evict(self, *keys: str) -> None:
+        # Read your own writes at once instead of after the server invalidation arrives.
+        if self.near_cache is not None:
+            self.near_cache.evict(*keys)
+
+    #####################
+    # Instrumentation
+    #####################
+    def enable_instrumentation(
+        self,
+        slow_threshold: Optional[float] = 0.1,
+        callback: Optional[Callable[[str, str, float, int, int, bool], None]] = None,
+    ) -> RedisMetrics:
+        """
+        Record latency, call counts and payload sizes of every command sent by ``r``, see ``RedisMetrics``.
+
+        The client methods are wrapped on this instance only, disabling
+        removes the wrappers so a disabled operator pays nothing.
+
+        :param slow_threshold: Commands slower than this many seconds are logged, None to disable the slow log
+        :param callback: Called after every command, see ``RedisMetrics``
+        :return: The metrics, e.g. ``prometheus_text()`` for an exporter endpoint
+        """
+        self.disable_instrumentation()
+        self.metrics = RedisMetrics(slow_threshold=slow_threshold, callback=callback)
+        self.r.execute_command = self.metrics.wrap_command(self.r.execute_command)
+        self.r.pipeline = self.metrics.wrap_pipeline(self.r.pipeline)
+        return self.metrics
+
+    def disable_instrumentation(self) -> None:
+        if self.metrics is not None:
+            del self.r.execute_command
+            del self.r.pipeline
+            self.metrics = None
+
+    #####################
+    # Batch
+    #####################
+    def batch(self, transaction: bool = False) -> RedisBatch:
+        """
+        Queue operations and send them in one round trip, see ``RedisBatch``.
+
+        :param transaction: Wrap the operations in MULTI/EXEC so they are applied atomically
+        :return: The batch, use it as a context manager
+        """
+        return RedisBatch(self.r.pipeline(transaction=transaction))
+
+
+#####################
+# Operator registry
+#####################
+_operators: dict[str, RedisOperator] = {}
+_operators_lock = threading.Lock()
+
+
+def get_redis_operator(redis_base_url: Optional[str] = None, **pool_kwargs: Any) -> RedisOperator:
+    """
+    Get the operator of a redis server, it is built on first use and shared
+    inside the process. A forked child builds its own one instead of using
+    the pool of its parent.
+
+    :param redis_base_url: Defaults to the ``REDIS_BASE_URL`` environment variable
+    :param pool_kwargs: Options of ``RedisOperator``, only used when the operator is built
+    :return: The operator
+    """
+    redis_base_url = redis_base_url or os.getenv("REDIS_BASE_URL")
+    if not redis_base_url:
+        raise ValueError("Redis URL is not given and REDIS_BASE_URL is not set.")
+
+    operator = _operators.get(redis_base_url)
+    if operator is None:
+        with _operators_lock:
+            operator = _operators.get(redis_base_url)
+            if operator is None:
+                operator = _operators[redis_base_url] = RedisOperator(redis_base_url, **pool_kwargs)
+    return operator
+
+
+class _DefaultRedisOperator:
+    """
+    Stands for ``get_redis_operator()``, so importing this module neither reads
+    ``REDIS_BASE_URL`` nor creates a pool.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_redis_operator(), name)
+
+
+redis_op: RedisOperator = _DefaultRedisOperator()
+template_local_cache = LocalCache(maxsize=8, ttl=300)
+_template_codec = CacheCodec()
+
+
+def _reset_after_fork() -> None:
+    # Drop the pools and the listener thread inherited from the parent, the
+    # parent still uses their sockets.
+    global _operators, _operators_lock, _template_cache_listener
+    _operators = {}
+    _operators_lock = threading.Lock()
+    _template_cache_listener = None
+    template_local_cache._lock = threading.Lock()
+    template_local_cache.clear()
 
 
 #####################
@@ -133,16 +697,137 @@ redis_op = RedisOperator(os.getenv("REDIS_BASE_URL"))
 #####################
 
 
-def update_template_cache_all(data: dict) -> None:
+class TemplateCacheListener(threading.Thread):
+    """
+    Background thread clearing ``template_local_cache`` when the template cache is changed by any process.
+
+    While it is connected, ``get_template_caches_all`` trusts the local copy
+    without asking redis for the cache generation.
+    """
+
+    def __init__(self, operator: "RedisOperator" = None, retry_interval: float = 1):
+        super().__init__(name="template-cache-listener", daemon=True)
+        self.operator = operator
+        self.retry_interval = retry_interval
+        self.connected = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            pubsub = (self.operator or redis_op).r.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(TEMPLATE_CACHE_CHANNEL)
+                # Changes made before the subscription are not notified.
+                template_local_cache.clear()
+                self.connected.set()
+                while not self._stop_event.is_set():
+                    if pubsub.get_message(timeout=1) is not None:
+                        template_local_cache.clear()
+            except redis.RedisError as e:
+                log.warning(f"Template cache listener disconnected, reason: {e}")
+            finally:
+                self.connected.clear()
+                pubsub.close()
+            self._stop_event.wait(self.retry_interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_template_cache_listener: Optional[TemplateCacheListener] = None
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def start_template_cache_listener() -> TemplateCacheListener:
+    """
+    Start the listener keeping ``template_local_cache`` up to date by pub/sub, it is started once per process.
+
+    :return: The running listener.
+    """
+    global _template_cache_listener
+    if _template_cache_listener is None or not _template_cache_listener.is_alive():
+        _template_cache_listener = TemplateCacheListener()
+        _template_cache_listener.start()
+    return _template_cache_listener
+
+
+def set_template_codec(codec: CacheCodec) -> None:
+    """
+    Change how template cache values are written, values written by any
+    ``CacheCodec`` and plain JSON values can always be read.
+
+    :param codec: e.g. ``CacheCodec(serializer="msgpack", compression="zlib")``
+    :return: None
+    """
+    global _template_codec
+    _template_codec = codec
+
+
+def get_template_codec() -> CacheCodec:
+    return _template_codec
+
+
+def _encode_template_caches(data: dict) -> dict[str, str]:
+    # str values are taken as already encoded.
+    return {k: v if isinstance(v, str) else _template_codec.encode(v) for k, v in data.items()}
+
+
+def _decode_template_caches(redis_data: dict[str, str]) -> list[dict[str, Any]]:
+    return [{_: CacheCodec.decode(redis_data[_])} for _ in redis_data]
+
+
+def _template_cache_listening() -> bool:
+    listener = _template_cache_listener
+    return listener is not None and listener.connected.is_set()
+
+
+def _queue_template_cache_changed(pipe: redis.client.Pipeline) -> None:
+    pipe.incr(TEMPLATE_CACHE_GENERATION)
+    pipe.publish(TEMPLATE_CACHE_CHANNEL, "changed")
+
+
+def _queue_template_cache_swap(pipe: redis.client.Pipeline, data: dict) -> None:
+    pipe.delete(TEMPLATE_CACHE_SWAP)
+    pipe.hset(TEMPLATE_CACHE_SWAP, mapping=data)
+    pipe.rename(TEMPLATE_CACHE_SWAP, TEMPLATE_CACHE)
+    pipe.set(SHOULD_UPDATE_TEMPLATE, str(False).lower())
+    _queue_template_cache_changed(pipe)
+
+
+def _template_cache_changed() -> None:
+    """
+    Bump the template cache generation and notify the other processes.
+    """
+    template_local_cache.clear()
+    pipe = redis_op.r.pipeline(transaction=False)
+    _queue_template_cache_changed(pipe)
+    pipe.execute()
+
+
+def update_template_cache_all(data: dict, swap: bool = True) -> None:
     """
     Handy function to update all template cache.
 
+    In swap mode the new hash is written under a temporary key and renamed
+    over the template cache together with the update flag in one MULTI/EXEC,
+    readers see either the old or the new cache, never an empty one.
+
+    :param data: The whole template cache, template id to template json or
+        template dict, dicts are encoded by the template codec.
+    :param swap: Swap the cache in one transaction, set False to delete and rewrite it.
     :return: None.
     """
-    if data:
+    data = _encode_template_caches(data) if data else data
+    if data and swap:
+        pipe = redis_op.r.pipeline(transaction=True)
+        _queue_template_cache_swap(pipe, data)
+        pipe.execute()
+        template_local_cache.clear()
+    elif data:
         delete_template_cache()
         redis_op.dict_set_all(TEMPLATE_CACHE, data)
         redis_op.bool_set(SHOULD_UPDATE_TEMPLATE, False)
+        _template_cache_changed()
 
 
 def should_update_template_cache() -> bool:
@@ -160,8 +845,9 @@ def delete_template_cache() -> None:
 
     :return: None
     """
-    redis_op.dict_delete_all(TEMPLATE_CACHE)
+    redis_op.dict_unlink_all(TEMPLATE_CACHE)
     redis_op.bool_set(SHOULD_UPDATE_TEMPLATE, True)
+    _template_cache_changed()
 
 
 def update_template_cache(id, dict_val) -> None:
@@ -170,18 +856,215 @@ def update_template_cache(id, dict_val) -> None:
 
     :return: None.
     """
-    redis_op.dict_set_certain(TEMPLATE_CACHE, id, json.dumps(dict_val, default=str))
+    redis_op.dict_set_certain(TEMPLATE_CACHE, id, _template_codec.encode(dict_val))
+    _template_cache_changed()
 
 
 def get_template_caches_all():
     """
-    Handy function to return all template cache.
+    Handy function to return all template cache. The result is kept in
+    ``template_local_cache`` until the cache generation in redis changes,
+    each call returns a new list of the kept template dicts, which must not
+    be modified.
 
     :return: Redis value of all template cache.
     """
+    if _template_cache_listening():
+        generation = "listener"
+    else:
+        generation = redis_op.str_get(TEMPLATE_CACHE_GENERATION)
+
+    out: Optional[list[dict[str, Any]]] = template_local_cache.get((TEMPLATE_CACHE, generation))
+    if out is not None:
+        return list(out)
+
+    version = template_local_cache.version
     redis_data: dict[str, str] = redis_op.dict_get_all(TEMPLATE_CACHE)
-    out: list[dict[str, Any]] = [{_: json.loads(redis_data[_])} for _ in redis_data]
-    return out
+    out = _decode_template_caches(redis_data)
+    template_local_cache.set((TEMPLATE_CACHE, generation), out, version=version)
+    return list(out)
+
+
+def iter_template_caches(count: int = DEFAULT_SCAN_COUNT) -> Iterator[dict[str, Any]]:
+    """
+    Handy function to iterate all template cache by HSCAN, each template is
+    decoded when it is reached. Unlike ``get_template_caches_all`` it is not
+    a snapshot, templates changed during the iteration may be missed.
+
+    :param count: The number of templates asked for per round trip
+    :return: Iterator of {template id: template}
+    """
+    seen: set[str] = set()
+    for template_id, value in redis_op.dict_iter(TEMPLATE_CACHE, count=count):
+        if template_id in seen:
+            continue
+        seen.add(template_id)
+        yield {template_id: CacheCodec.decode(value)}
+
+
+class TemplateCacheRebuilder:
+    """
+    Rebuild the template cache from one worker at a time.
+
+    The worker which takes the rebuild lock (SET NX PX) builds the templates
+    and swaps them in. Its write is fenced: it is only applied if the lock
+    still holds the worker's token, so a worker whose lock expired during a
+    slow build cannot overwrite a newer cache. The other workers keep
+    serving the stale cache, or wait for the rebuild notification when there
+    is nothing to serve.
+
+    With ``refresh_ttl`` the cache is also rebuilt before it gets that old,
+    each reader decides by probabilistic early expiration (XFetch) so the
+    refreshes of many workers do not happen at the same moment.
+
+    Usage::
+
+        rebuilder = TemplateCacheRebuilder(build_templates)
+        templates = rebuilder.get()
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], dict],
+        lock_ttl: float = 60,
+        wait_timeout: float = 10,
+        refresh_ttl: Optional[float] = None,
+        beta: float = 1.0,
+    ):
+        """
+        :param build: Returns the whole template cache, template id to template dict or json
+        :param lock_ttl: Seconds the rebuild lock is held at most
+        :param wait_timeout: Seconds a worker without a cache to serve waits for the rebuild
+        :param refresh_ttl: Seconds after which the cache is rebuilt even if not flagged, None to disable
+        :param beta: Eagerness of the early refresh, larger refreshes earlier
+        """
+        self.build = build
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.refresh_ttl = refresh_ttl
+        self.beta = beta
+
+    def get(self) -> list[dict[str, Any]]:
+        """
+        Return all template cache, rebuilding it first when needed.
+
+        :return: Same as ``get_template_caches_all``
+        """
+        with redis_op.batch() as b:
+            b.bool_get(SHOULD_UPDATE_TEMPLATE).dict_len(TEMPLATE_CACHE).str_get(TEMPLATE_CACHE_REBUILT_AT)
+        should_update, template_number, rebuilt_at = b.results
+
+        # A rebuild which found no templates leaves an empty cache with ``REBUILT_AT`` set, that is not rebuilt again.
+        never_built = not template_number and not rebuilt_at
+        if should_update or never_built or self._should_refresh_early(rebuilt_at):
+            # Without a cache to serve, wait for the worker holding the lock instead of returning nothing.
+            if not self.rebuild(seen_rebuilt_at=rebuilt_at) and not template_number:
+                self._wait_for_rebuild(rebuilt_at)
+        return get_template_caches_all()
+
+    def _should_refresh_early(self, rebuilt_at: Optional[str]) -> bool:
+        if self.refresh_ttl is None or not rebuilt_at:
+            return False
+        rebuilt_time, build_seconds = map(float, rebuilt_at.split(","))
+        # XFetch: -log(random()) is exponentially distributed, a slower build refreshes earlier.
+        early_by = build_seconds * self.beta * -math.log(1.0 - random.random())
+        return time.time() + early_by >= rebuilt_time + self.refresh_ttl
+
+    def rebuild(self, seen_rebuilt_at: Optional[str] = _MISSING) -> bool:
+        """
+        Rebuild the cache if no other worker is rebuilding it.
+
+        :param seen_rebuilt_at: ``TEMPLATE_CACHE_REBUILT_AT`` the decision to rebuild was made on, read now by default
+        :return: True if this worker rebuilt the cache
+        """
+        if seen_rebuilt_at is _MISSING:
+            seen_rebuilt_at = redis_op.str_get(TEMPLATE_CACHE_REBUILT_AT)
+        token = str(redis_op.r.incr(TEMPLATE_CACHE_REBUILD_FENCE))
+        if not redis_op.r.set(TEMPLATE_CACHE_REBUILD_LOCK, token, nx=True, px=int(self.lock_ttl * 1000)):
+            return False
+        if self._rebuilt_since(seen_rebuilt_at):
+            # Another worker finished a rebuild between the decision and taking the lock.
+            self._release(token)
+            return False
+
+        started = time.time()
+        try:
+            data = self.build()
+        except Exception:
+            self._release(token)
+            raise
+        data = _encode_template_caches(data) if data else {}
+        build_seconds = time.time() - started
+
+        def swap(pipe: redis.client.Pipeline) -> None:
+            if data:
+                _queue_template_cache_swap(pipe, data)
+            else:
+                pipe.delete(TEMPLATE_CACHE)
+                pipe.set(SHOULD_UPDATE_TEMPLATE, str(False).lower())
+                _queue_template_cache_changed(pipe)
+            pipe.set(TEMPLATE_CACHE_REBUILT_AT, f"{time.time()},{build_seconds}")
+
+        if not self._apply_if_locked(token, swap):
+            log.warning(f"Template cache rebuild with token {token} discarded, the rebuild lock was lost.")
+            return False
+        template_local_cache.clear()
+        return True
+
+    @staticmethod
+    def _rebuilt_since(seen_rebuilt_at: Optional[str]) -> bool:
+        with redis_op.batch() as b:
+            b.bool_get(SHOULD_UPDATE_TEMPLATE).str_get(TEMPLATE_CACHE_REBUILT_AT)
+        should_update, rebuilt_at = b.results
+        return not should_update and rebuilt_at is not None and rebuilt_at != seen_rebuilt_at
+
+    def _release(self, token: str) -> None:
+        self._apply_if_locked(token, lambda pipe: None)
+
+    @staticmethod
+    def _apply_if_locked(token: str, queue: Callable[[redis.client.Pipeline], None]) -> bool:
+        """
+        Run the commands queued by ``queue`` and release the lock, only if the lock still holds ``token``.
+
+        :return: False if the lock was lost
+        """
+        with redis_op.r.pipeline() as pipe:
+            try:
+                pipe.watch(TEMPLATE_CACHE_REBUILD_LOCK)
+                if pipe.get(TEMPLATE_CACHE_REBUILD_LOCK) != token:
+                    return False
+                pipe.multi()
+                queue(pipe)
+                pipe.delete(TEMPLATE_CACHE_REBUILD_LOCK)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    @staticmethod
+    def _rebuild_done(seen_rebuilt_at: Optional[str]) -> bool:
+        """
+        Whether there is a cache to serve, or a rebuild newer than ``seen_rebuilt_at`` found no templates.
+        """
+        with redis_op.batch() as b:
+            b.dict_len(TEMPLATE_CACHE).bool_get(SHOULD_UPDATE_TEMPLATE).str_get(TEMPLATE_CACHE_REBUILT_AT)
+        template_number, should_update, rebuilt_at = b.results
+        return bool(template_number) or (not should_update and rebuilt_at is not None and rebuilt_at != seen_rebuilt_at)
+
+    def _wait_for_rebuild(self, seen_rebuilt_at: Optional[str]) -> None:
+        pubsub = redis_op.r.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(TEMPLATE_CACHE_CHANNEL)
+            # The rebuild may have finished before the subscription.
+            deadline = time.monotonic() + self.wait_timeout
+            while not self._rebuild_done(seen_rebuilt_at):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    log.warning("Timeout while waiting for the template cache rebuild.")
+                    return
+                pubsub.get_message(timeout=min(remaining, 1))
+        finally:
+            pubsub.close()
 
 
 def count_template_number() -> int:
@@ -0,0 +1,212 @@
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+# Upper bounds in seconds, the same as the default buckets of the prometheus clients.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Commands whose first argument is not a key.
+KEYLESS_COMMANDS = frozenset(
+    ("PING", "ECHO", "INFO", "TIME", "CLIENT", "SCRIPT", "SCAN", "PUBLISH", "MULTI", "EXEC", "DISCARD", "FLUSHDB")
+)
+PIPELINE_COMMAND = "PIPELINE"
+
+
+def key_prefix(command: str, args: tuple) -> str:
+    """
+    The part before the first ``:`` of the key of a command, ``""`` for commands without a key.
+    """
+    if command in ("EVAL", "EVALSHA"):
+        key = args[2] if len(args) > 2 and int(args[1]) > 0 else None
+    elif command.split(" ", 1)[0] in KEYLESS_COMMANDS or not args:
+        key = None
+    else:
+        key = args[0]
+    if key is None:
+        return ""
+    if isinstance(key, bytes):
+        key = key.decode(errors="replace")
+    return str(key).split(":", 1)[0]
+
+
+def payload_size(value: Any) -> int:
+    """
+    Approximate size in bytes of command arguments or of a reply.
+    """
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(payload_size(k) + payload_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(payload_size(item) for item in value)
+    if value is None:
+        return 0
+    return len(str(value))
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OperationStats:
+    """
+    Counters of one (command, key prefix) pair.
+    """
+
+    __slots__ = ("count", "errors", "seconds", "buckets", "request_bytes", "response_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        # buckets[i] counts calls no slower than LATENCY_BUCKETS[i], the last one the slower ones
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+class RedisMetrics:
+    """
+    Latency, call counts and payload sizes of redis commands, grouped by command and key prefix.
+
+    Commands sent in a pipeline are recorded once as ``PIPELINE`` with the
+    prefix of the first queued key. Commands slower than ``slow_threshold``
+    seconds are logged and kept in ``slow_ops``. ``callback`` is called after
+    every command with (command, prefix, seconds, request bytes, response
+    bytes, failed), e.g. to feed another metrics client.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: Optional[float] = 0.1,
+        slow_log_size: int = 128,
+        callback: Optional[Callable[[str, str, float, int, int, bool], None]] = None,
+    ):
+        self.slow_threshold = slow_threshold
+        self.callback = callback
+        self.slow_ops: deque[dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._stats: dict[tuple[str, str], OperationStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, command: str, args: tuple, seconds: float, response: Any, failed: bool) -> None:
+        """
+        Record one command, ``args`` are its arguments without the command name.
+        """
+        self._add(command, key_prefix(command, args), seconds, payload_size(args), response, failed)
+
+    def _add(self, command: str, prefix: str, seconds: float, request_bytes: int, response: Any, failed: bool):
+        response_bytes = 0 if failed else payload_size(response)
+        with self._lock:
+            stats = self._stats.get((command, prefix))
+            if stats is None:
+                stats = self._stats[(command, prefix)] = OperationStats()
+            stats.count += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+
+        if self.slow_threshold is not None and seconds >= self.slow_threshold:
+            self.slow_ops.append(
+                {
+                    "time": time.time(),
+                    "command": command,
+                    "prefix": prefix,
+                    "seconds": seconds,
+                    "request_bytes": request_bytes,
+                }
+            )
+            log.warning(f"Slow redis {command} on {prefix or '-'}: {seconds * 1000:.1f} ms")
+
+        if self.callback is not None:
+            self.callback(command, prefix, seconds, request_bytes, response_bytes, failed)
+
+    def wrap_command(self, execute_command: Callable[..., Any]) -> Callable[..., Any]:
+        def instrumented(*args, **options):
+            command = str(args[0]).upper()
+            failed, response = True, None
+            started = time.perf_counter()
+            try:
+                response = execute_command(*args, **options)
+                failed = False
+                return response
+            finally:
+                self.record(command, args[1:], time.perf_counter() - started, response, failed)
+
+        return instrumented
+
+    def wrap_pipeline(self, pipeline: Callable[..., Any]) -> Callable[..., Any]:
+        def instrumented(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def execute_instrumented(*execute_args, **execute_kwargs):
+                # The prefix is taken from the first queued command, the size from all of them.
+                stack = pipe.command_stack
+                prefix = key_prefix(str(stack[0][0][0]).upper(), stack[0][0][1:]) if stack else ""
+                request_bytes = sum(payload_size(command_args) for command_args, _ in stack)
+                failed, response = True, None
+                started = time.perf_counter()
+                try:
+                    response = execute(*execute_args, **execute_kwargs)
+                    failed = False
+                    return response
+                finally:
+                    seconds = time.perf_counter() - started
+                    self._add(PIPELINE_COMMAND, prefix, seconds, request_bytes, response, failed)
+
+            pipe.execute = execute_instrumented
+            return pipe
+
+        return instrumented
+
+    def snapshot(self) -> dict[tuple[str, str], dict[str, Any]]:
+        """
+        :return: (command, key prefix) to count, errors, seconds, buckets, request_bytes and response_bytes
+        """
+        with self._lock:
+            return {
+                key: {name: getattr(stats, name) for name in OperationStats.__slots__}
+                for key, stats in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+        self.slow_ops.clear()
+
+    def prometheus_text(self, namespace: str = "redis_operator") -> str:
+        """
+        Render the metrics in the prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {namespace}_command_seconds Latency of redis commands.",
+            f"# TYPE {namespace}_command_seconds histogram",
+        ]
+        for (command, prefix), stats in sorted(snapshot.items()):
+            labels = f'command="{_label(command)}",prefix="{_label(prefix)}"'
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), stats["buckets"]):
+                cumulative += count
+                lines.append(f'{namespace}_command_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{namespace}_command_seconds_sum{{{labels}}} {stats['seconds']}")
+            lines.append(f"{namespace}_command_seconds_count{{{labels}}} {stats['count']}")
+
+        for name, field, help_text in (
+            ("command_errors_total", "errors", "Failed redis commands."),
+            ("request_bytes_total", "request_bytes", "Approximate bytes sent to redis."),
+            ("response_bytes_total", "response_bytes", "Approximate bytes received from redis."),
+        ):
+            lines.append(f"# HELP {namespace}_{name} {help_text}")
+            lines.append(f"# TYPE {namespace}_{name} counter")
+            for (command, prefix), stats in sorted(snapshot.items()):
+                labels = f'command="{_label(command)}",prefix="{_label(prefix)}"'
+                lines.append(f"{namespace}_{name}{{{labels}}} {stats[field]}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,286 @@
+"""
+Coalescing work queue in redis, used to schedule the project issue calculation.
+
+Pending items are members of a sorted set scored by the time they become
+due. Scheduling an item already pending keeps its score, so every update in
+the ``debounce`` window after the first one is folded into a single run.
+A worker claims due items by moving them to an in-flight sorted set scored
+by their visibility deadline, and acks them when done. An item which is not
+acked before its deadline, e.g. because its worker died, is due again. An
+item is never claimed twice at the same time; scheduling it while it is
+in flight runs it once more after the current run.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import redis
+
+from devopsapi_module.redis import PROJECT_ISSUE_CALCULATE_KEY, lua_script, redis_op
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# KEYS[1]: pending, KEYS[2]: in flight, KEYS[3]: claim tokens
+# ARGV[1]: now, ARGV[2]: max items, ARGV[3]: visibility deadline, ARGV[4]: claim token
+_CLAIM_LUA = """
+local pending, in_flight, claims = KEYS[1], KEYS[2], KEYS[3]
+local now, limit = tonumber(ARGV[1]), tonumber(ARGV[2])
+
+for _, item in ipairs(redis.call("ZRANGEBYSCORE", in_flight, "-inf", now)) do
+    redis.call("ZREM", in_flight, item)
+    redis.call("HDEL", claims, item)
+    redis.call("ZADD", pending, "NX", now, item)
+end
+
+-- Only the due items still to be claimed are read, the ones running again are skipped by offset.
+local claimed, offset = {}, 0
+while #claimed < limit do
+    local due = redis.call("ZRANGEBYSCORE", pending, "-inf", now, "LIMIT", offset, limit - #claimed)
+    if #due == 0 then
+        break
+    end
+    for _, item in ipairs(due) do
+        if redis.call("ZSCORE", in_flight, item) then
+            offset = offset + 1
+        else
+            redis.call("ZREM", pending, item)
+            redis.call("ZADD", in_flight, ARGV[3], item)
+            redis.call("HSET", claims, item, ARGV[4])
+            table.insert(claimed, item)
+        end
+    end
+end
+return claimed
+"""
+
+# KEYS[1]: pending, KEYS[2]: in flight, KEYS[3]: claim tokens
+# ARGV[1]: item, ARGV[2]: claim token, ARGV[3]: due time to schedule it again, "" to drop it
+_FINISH_LUA = """
+local pending, in_flight, claims, item = KEYS[1], KEYS[2], KEYS[3], ARGV[1]
+if redis.call("HGET", claims, item) ~= ARGV[2] then
+    return 0
+end
+redis.call("ZREM", in_flight, item)
+redis.call("HDEL", claims, item)
+if ARGV[3] ~= "" then
+    redis.call("ZADD", pending, "NX", ARGV[3], item)
+end
+return 1
+"""
+
+# KEYS[1]: in flight, KEYS[2]: claim tokens
+# ARGV[1]: item, ARGV[2]: claim token, ARGV[3]: new visibility deadline
+_EXTEND_LUA = """
+if redis.call("HGET", KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call("ZADD", KEYS[1], "XX", ARGV[3], ARGV[1])
+return 1
+"""
+
+_claim_script = lua_script(_CLAIM_LUA)
+_finish_script = lua_script(_FINISH_LUA)
+_extend_script = lua_script(_EXTEND_LUA)
+
+
+class CoalescingQueue:
+    """
+    Coalescing work queue, see the module docstring.
+
+    Usage::
+
+        queue = CoalescingQueue("project_issue_calculation:queue")
+        queue.schedule(project_id)
+
+        token, items = queue.claim()
+        for item in items:
+            calculate(item)
+            queue.ack(item, token)
+    """
+
+    def __init__(self, name: str, debounce: float = 1, visibility_timeout: float = 300):
+        """
+        :param name: Prefix of the redis keys of the queue
+        :param debounce: Seconds an item waits after it is first scheduled, later schedules are folded into it
+        :param visibility_timeout: Seconds a claimed item may run before it is handed to another worker
+        """
+        self.name = name
+        self.debounce = debounce
+        self.visibility_timeout = visibility_timeout
+        self.pending_key = f"{name}:pending"
+        self.in_flight_key = f"{name}:in_flight"
+        self.claims_key = f"{name}:claims"
+
+    def schedule(self, *items: str) -> int:
+        """
+        Schedule items, items already pending keep their due time.
+
+        :return: Number of items which were not pending yet
+        """
+        if not items:
+            return 0
+        due = time.time() + self.debounce
+        return redis_op.r.zadd(self.pending_key, {item: due for item in items}, nx=True)
+
+    def claim(self, count: int = 1) -> tuple[str, list[str]]:
+        """
+        Claim at most ``count`` due items.
+
+        :return: (claim token, claimed items), the token is needed to ack or release them
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        items = _claim_script(
+            keys=[self.pending_key, self.in_flight_key, self.claims_key],
+            args=[now, count, now + self.visibility_timeout, token],
+            client=redis_op.r,
+        )
+        return token, items
+
+    def ack(self, item: str, token: str) -> bool:
+        """
+        Mark a claimed item as done.
+
+        :return: False if the claim had expired, the item may then run again
+        """
+        return self._finish(item, token, "")
+
+    def release(self, item: str, token: str, delay: float = 0) -> bool:
+        """
+        Give a claimed item back to the queue, e.g. after it failed.
+
+        :param delay: Seconds before the item is due again
+        :return: False if the claim had expired
+        """
+        return self._finish(item, token, time.time() + delay)
+
+    def extend(self, item: str, token: str) -> bool:
+        """
+        Push back the visibility deadline of a long running item.
+
+        :return: False if the claim had expired
+        """
+        return bool(
+            _extend_script(
+                keys=[self.in_flight_key, self.claims_key],
+                args=[item, token, time.time() + self.visibility_timeout],
+                client=redis_op.r,
+            )
+        )
+
+    def _finish(self, item: str, token: str, due) -> bool:
+        return bool(
+            _finish_script(
+                keys=[self.pending_key, self.in_flight_key, self.claims_key], args=[item, token, due], client=redis_op.r
+            )
+        )
+
+    def stats(self) -> dict[str, int]:
+        with redis_op.r.pipeline(transaction=False) as pipe:
+            pipe.zcard(self.pending_key)
+            pipe.zcount(self.pending_key, "-inf", time.time())
+            pipe.zcard(self.in_flight_key)
+            pending, due, in_flight = pipe.execute()
+        return {"pending": pending, "due": due, "in_flight": in_flight}
+
+
+class QueueWorkers:
+    """
+    Threads claiming items of a ``CoalescingQueue`` and passing them to ``handler`` one by one.
+
+    An item whose handler raises is released and retried after ``retry_delay`` seconds.
+    """
+
+    def __init__(
+        self,
+        queue: CoalescingQueue,
+        handler: Callable[[str], None],
+        workers: int = 4,
+        poll_interval: float = 0.5,
+        retry_delay: float = 10,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._threads: list[threading.Thread] = []
+        self._stop_event = threading.Event()
+
+    def start(self) -> "QueueWorkers":
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.queue.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop claiming items, the running handlers are waited for up to ``timeout`` seconds.
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                token, items = self.queue.claim()
+            except redis.RedisError as e:
+                log.warning(f"Claiming from {self.queue.name} failed, reason: {e}")
+                self._stop_event.wait(self.poll_interval)
+                continue
+            if not items:
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            for item in items:
+                self._handle(item, token)
+
+    def _handle(self, item: str, token: str) -> None:
+        try:
+            self.handler(item)
+        except Exception:
+            log.exception(f"Handling {item} of {self.queue.name} failed.")
+            try:
+                self.queue.release(item, token, delay=self.retry_delay)
+            except redis.RedisError as e:
+                # The claim expires after ``visibility_timeout``, then the item runs again.
+                log.warning(f"Releasing {item} of {self.queue.name} failed, reason: {e}")
+            return
+
+        try:
+            if not self.queue.ack(item, token):
+                log.warning(f"Claim of {item} of {self.queue.name} expired before it was acked.")
+        except redis.RedisError as e:
+            log.warning(f"Acking {item} of {self.queue.name} failed, it may run again, reason: {e}")
+
+
+#####################
+# Project issue calculation
+#####################
+project_issue_calculation_queue = CoalescingQueue(f"{PROJECT_ISSUE_CALCULATE_KEY}:queue")
+
+
+def schedule_project_issue_calculation(*project_ids: int) -> int:
+    """
+    Schedule the issue calculation of projects, a burst of updates of one project runs it once.
+
+    :return: Number of projects which were not scheduled yet
+    """
+    return project_issue_calculation_queue.schedule(*(str(project_id) for project_id in project_ids))
+
+
+def start_project_issue_calculation_workers(calculate: Callable[[int], None], workers: int = 4) -> QueueWorkers:
+    """
+    Start threads running ``calculate(project_id)`` for the scheduled projects.
+
+    :return: The running workers, call ``stop`` on shutdown.
+    """
+    return QueueWorkers(
+        project_issue_calculation_queue, lambda project_id: calculate(int(project_id)), workers=workers
+    ).start()
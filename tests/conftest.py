@@ -0,0 +1,46 @@
+import importlib.util
+import os
+import sys
+
+# The real redis and python-gitlab packages are imported first, src/devopsapi_module
+# holds a redis.py and a gitlab.py which would shadow them.
+import fakeredis
+import gitlab  # noqa: F401
+import pytest
+import redis  # noqa: F401
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+PACKAGE = os.path.join(SRC, "devopsapi_module")
+
+os.environ.setdefault("REDIS_BASE_URL", "localhost:6379")
+os.environ.setdefault("GITLAB_BASE_URL", "http://gitlab.test/")
+sys.path.insert(0, SRC)
+# Root of the ``module.*`` imports of the GitLab operators.
+sys.path.append(PACKAGE)
+
+
+def load_package_module(name: str):
+    """
+    Load a module of src/devopsapi_module by file, for the ones whose name is shadowed by an installed package.
+    """
+    spec = importlib.util.spec_from_file_location(f"devopsapi_module_{name}", os.path.join(PACKAGE, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def redis_op():
+    """
+    The shared RedisOperator, talking to a fresh fake redis.
+    """
+    from devopsapi_module.redis import get_redis_operator, template_local_cache
+
+    operator = get_redis_operator()
+    original = operator.r
+    operator.r = fakeredis.FakeRedis(decode_responses=True)
+    template_local_cache.clear()
+    yield operator
+    operator.r = original
+    template_local_cache.clear()
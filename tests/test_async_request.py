@@ -0,0 +1,27 @@
+import asyncio
+
+import httpx
+
+from module.async_request import AsyncRequest
+
+
+class MockRequest(AsyncRequest):
+    url = "http://gitlab.test/api/v4"
+    max_concurrency = 1
+
+
+def test_client_and_semaphore_follow_the_running_loop(monkeypatch):
+    handler = lambda request: httpx.Response(200, json={"path": request.url.path})  # noqa: E731
+    monkeypatch.setattr(httpx, "AsyncHTTPTransport", lambda **kwargs: httpx.MockTransport(handler))
+    request = MockRequest()
+
+    async def fetch():
+        # Two requests contend for the one slot, which binds the semaphore to the loop.
+        outputs = await asyncio.gather(request.api_get("/a"), request.api_get("/b"))
+        return [output.json()["path"] for output in outputs], request.client
+
+    first, first_client = asyncio.run(fetch())
+    second, second_client = asyncio.run(fetch())
+
+    assert first == second == ["/api/v4/a", "/api/v4/b"]
+    assert first_client is not second_client
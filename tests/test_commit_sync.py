@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+
+from module.commit_sync import CommitSync
+from module.gitlab_common import ADMIN_NAME
+
+from conftest import load_package_module
+
+
+def _commit(n, author="alice", hour=0):
+    return {
+        "id": f"sha{n}",
+        "title": f"commit {n}",
+        "author_name": author,
+        "committer_name": author,
+        "committed_date": f"2024-01-01T{hour:02d}:00:00Z",
+    }
+
+
+class FakeOperator:
+    def __init__(self, commits):
+        self.commits = commits
+        self.since = []
+
+    def _matching(self, since):
+        self.since.append(since)
+        if since is None:
+            return list(self.commits)
+        since = datetime.fromisoformat(since).timestamp()
+        return [c for c in self.commits if datetime.fromisoformat(c["committed_date"]).timestamp() >= since]
+
+    def iter_commits(self, repo_id, branch, since=None):
+        return iter(self._matching(since))
+
+
+class AsyncFakeOperator(FakeOperator):
+    async def iter_commits(self, repo_id, branch, since=None):
+        for commit in self._matching(since):
+            yield commit
+
+
+def test_sync_advances_watermark_and_fetches_since_overlap(redis_op):
+    operator = FakeOperator([_commit(1, hour=1), _commit(2, hour=3)])
+    commit_sync = CommitSync(operator, redis_op, overlap=3600)
+
+    assert commit_sync.sync(1, "main") == 2
+    assert commit_sync.watermark(1, "main") == "2024-01-01T03:00:00Z"
+    assert operator.since == [None]
+
+    operator.commits.append(_commit(3, hour=5))
+    assert commit_sync.sync(1, "main") == 1
+    assert commit_sync.watermark(1, "main") == "2024-01-01T05:00:00Z"
+    # One hour of overlap before the watermark is fetched again.
+    assert datetime.fromisoformat(operator.since[1]).timestamp() == datetime.fromisoformat(
+        "2024-01-01T02:00:00+00:00"
+    ).timestamp()
+
+    assert commit_sync.sync(1, "main") == 0
+    assert commit_sync.watermark(1, "main") == "2024-01-01T05:00:00Z"
+
+
+def test_filters_are_answered_from_the_index(redis_op):
+    commits = [_commit(1, hour=1), _commit(2, author="bob", hour=2), _commit(3, author=ADMIN_NAME, hour=3)]
+    commit_sync = CommitSync(FakeOperator(commits), redis_op)
+
+    assert [c["id"] for c in commit_sync.get_commits_by_author(1, "main", "alice")] == ["sha3", "sha2"]
+    assert [c["id"] for c in commit_sync.get_commits_by_members(1, "main")] == ["sha2", "sha1"]
+    assert [c["id"] for c in commit_sync.get_commits(1, "main", author="bob")] == ["sha2"]
+    assert [c["id"] for c in commit_sync.get_commits(1, "main", limit=1)] == ["sha3"]
+
+
+def test_resync_drops_force_pushed_commits(redis_op):
+    operator = FakeOperator([_commit(1, hour=1), _commit(2, hour=2)])
+    commit_sync = CommitSync(operator, redis_op)
+    commit_sync.sync(1, "main")
+
+    operator.commits = [_commit(1, hour=1)]
+    assert commit_sync.resync(1, "main") == 1
+    assert [c["id"] for c in commit_sync.get_commits(1, "main", sync=False)] == ["sha1"]
+
+
+def test_async_sync_matches_sync(redis_op):
+    operator = AsyncFakeOperator([_commit(1, hour=1), _commit(2, author=ADMIN_NAME, hour=2)])
+    commit_sync = CommitSync(operator, redis_op)
+
+    members = asyncio.run(commit_sync.async_get_commits_by_members(1, "main"))
+    assert [c["id"] for c in members] == ["sha1"]
+    assert commit_sync.watermark(1, "main") == "2024-01-01T02:00:00Z"
+
+
+def test_operator_routes_through_enabled_index(redis_op, monkeypatch):
+    operator = load_package_module("gitlab").GitLabOperator()
+    fake = FakeOperator([_commit(n, hour=n) for n in range(1, 4)])
+    monkeypatch.setattr(operator, "iter_commits", fake.iter_commits, raising=False)
+    monkeypatch.setattr(operator, "gl_get_commits", lambda *args, **kwargs: [_commit(9)], raising=False)
+
+    assert [c["id"] for c in operator.gl_get_commits_by_members(1, "main")] == ["sha9"]
+    operator.enable_commit_index(redis_op)
+    try:
+        assert [c["id"] for c in operator.gl_get_commits_by_members(1, "main")] == ["sha3", "sha2", "sha1"]
+    finally:
+        operator.disable_commit_index()
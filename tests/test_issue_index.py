@@ -0,0 +1,105 @@
+import json
+
+from devopsapi_module import issue_index as I
+from devopsapi_module.redis import ISSUE_FAMILIES_KEY, ISSUE_PJ_USER_RELATION_KEY
+
+
+def _families(redis_op):
+    return {int(k): json.loads(v) for k, v in redis_op.r.hgetall(ISSUE_FAMILIES_KEY).items()}
+
+
+def test_children_move_between_parents(redis_op):
+    I.set_issue_children(1, [10, 11])
+    I.add_issue_children(2, [11, 12])
+
+    assert _families(redis_op) == {1: [10], 2: [11, 12]}
+    assert I.get_issue_children([1, 2, 3]) == {1: [10], 2: [11, 12], 3: []}
+    assert I.get_issue_parents([10, 11, 13]) == {10: 1, 11: 2, 13: None}
+
+    I.remove_issue_parent([10, 13])
+    assert _families(redis_op) == {2: [11, 12]}
+
+    I.add_issue_children(1, [2])
+    I.delete_issue_family(2)
+    assert _families(redis_op) == {}
+    assert I.get_issue_parents([2, 11, 12]) == {2: None, 11: None, 12: None}
+
+
+def test_family_script_is_sent_again_when_a_parent_changed(redis_op, monkeypatch):
+    I.set_issue_children(1, [10])
+    read = redis_op.dict_get_many
+    calls = []
+
+    def stale_read(key, fields):
+        calls.append(fields)
+        if len(calls) == 1:
+            # Issue 10 is moved under 3 between the read and the script.
+            values = read(key, fields)
+            I.set_issue_children(3, [10])
+            return values
+        return read(key, fields)
+
+    monkeypatch.setattr(I.redis_op, "dict_get_many", stale_read, raising=False)
+    I.set_issue_children(2, [10])
+    monkeypatch.undo()
+
+    assert len(calls) == 3  # the stale read, the nested call and the retry
+    assert _families(redis_op) == {2: [10]}
+    assert I.get_issue_children([1, 3]) == {1: [], 3: []}
+
+
+def test_relations_keep_their_indexes(redis_op):
+    I.set_issue_relations({1: (100, [7, 8]), 2: (100, [8]), 3: (200, [8])})
+
+    assert I.get_project_issues([100, 200]) == {100: [1, 2], 200: [3]}
+    assert I.get_user_issues([7, 8]) == {7: [1], 8: [1, 2, 3]}
+    assert I.get_user_projects([8]) == {8: {100: 2, 200: 1}}
+
+    I.set_issue_relation(1, 200, [7])
+    assert I.get_user_projects([7, 8]) == {7: {200: 1}, 8: {100: 1, 200: 1}}
+
+    I.delete_issue_relation(2)
+    I.delete_issue_relation(9)
+    assert I.get_issue_relations([1, 2]) == {1: {"project_id": 200, "user_ids": [7]}, 2: None}
+    assert I.get_project_issues([100, 200]) == {100: [], 200: [1, 3]}
+    assert I.get_user_projects([8]) == {8: {200: 1}}
+
+
+def test_rebuild_matches_incremental_indexes(redis_op):
+    I.set_issue_children(1, [10, 11])
+    I.set_issue_relations({1: (100, [7]), 2: (200, [7, 8])})
+    before = {key: redis_op.r.type(key) for key in redis_op.r.keys("*")}
+
+    redis_op.r.delete(*[key for key in before if key not in (ISSUE_FAMILIES_KEY, ISSUE_PJ_USER_RELATION_KEY)])
+    I.rebuild_issue_family_index()
+    I.rebuild_issue_relation_index()
+
+    assert {key: redis_op.r.type(key) for key in redis_op.r.keys("*")} == before
+    assert I.get_issue_parents([10, 11]) == {10: 1, 11: 1}
+    assert I.get_user_projects([7]) == {7: {100: 1, 200: 1}}
+
+
+def test_rebuild_swaps_in_and_drops_stale_keys(redis_op, monkeypatch):
+    I.set_issue_children(1, [10])
+    I.set_issue_relation(1, 100, [7])
+    # Stale index entries, and leftovers of an interrupted rebuild.
+    redis_op.r.sadd(f"{I.ISSUE_CHILDREN_PREFIX}:2", 20)
+    redis_op.r.sadd(f"{I.PROJECT_ISSUES_PREFIX}:300", 3)
+    redis_op.r.sadd(I._rebuilding(f"{I.ISSUE_CHILDREN_PREFIX}:5"), 50)
+
+    seen = []
+    swap = I._swap_in_rebuilt
+
+    def checked_swap(keys, patterns):
+        # The index is still whole until the swap.
+        seen.append((I.get_issue_children([1])[1], I.get_project_issues([100])[100]))
+        swap(keys, patterns)
+
+    monkeypatch.setattr(I, "_swap_in_rebuilt", checked_swap)
+    I.rebuild_issue_family_index()
+    I.rebuild_issue_relation_index()
+
+    assert seen == [([10], [1]), ([10], [1])]
+    assert I.get_issue_children([1, 2, 5]) == {1: [10], 2: [], 5: []}
+    assert I.get_project_issues([100, 300]) == {100: [1], 300: []}
+    assert redis_op.r.keys(f"{I.ISSUE_INDEX_REBUILD_PREFIX}:*") == []
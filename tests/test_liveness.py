@@ -0,0 +1,58 @@
+import threading
+
+from devopsapi_module import liveness
+from devopsapi_module.redis import SERVER_ALIVE_KEY
+
+
+def test_beat_recomputes_all_alive(redis_op):
+    assert liveness.beat("api", 30)
+    assert liveness.beat("worker", 30)
+    redis_op.r.delete(f"{liveness.LIVENESS_HEARTBEAT_PREFIX}:worker")
+
+    assert liveness.beat("api", 30) is False
+    status = liveness.get_liveness()
+    assert status["all_alive"] is False
+    assert status["components"]["worker"] is None
+
+
+def test_unchanged_value_is_not_rewritten(redis_op):
+    liveness.beat("api", 30)
+    redis_op.r.expire(SERVER_ALIVE_KEY, 29)
+    liveness.beat("api", 30)
+    assert redis_op.r.ttl(SERVER_ALIVE_KEY) == 29
+
+    redis_op.r.expire(SERVER_ALIVE_KEY, 10)
+    liveness.beat("api", 30)
+    assert redis_op.r.ttl(SERVER_ALIVE_KEY) == 30
+
+
+def test_heartbeat_keys_stay_out_of_server_alive_prefix(redis_op):
+    liveness.beat("api", 30)
+    assert [key for key in redis_op.r.keys("*") if key.startswith(SERVER_ALIVE_KEY)] == [SERVER_ALIVE_KEY]
+
+
+def test_stop_unregisters_after_beat_in_flight(redis_op, monkeypatch):
+    in_flight, release = threading.Event(), threading.Event()
+    real_beat = liveness.beat
+
+    def slow_beat(component, ttl):
+        if in_flight.is_set():
+            return real_beat(component, ttl)
+        in_flight.set()
+        release.wait(2)
+        return real_beat(component, ttl)
+
+    monkeypatch.setattr(liveness, "beat", slow_beat)
+    real_beat("api", 30)
+    heartbeat = liveness.start_heartbeat("worker", interval=0.05)
+    assert in_flight.wait(2)
+
+    stopper = threading.Thread(target=heartbeat.stop, kwargs={"unregister": True})
+    stopper.start()
+    release.set()
+    stopper.join(5)
+
+    assert not heartbeat.is_alive()
+    assert "worker" not in redis_op.r.smembers(liveness.LIVENESS_COMPONENTS_KEY)
+    assert redis_op.r.exists(f"{liveness.LIVENESS_HEARTBEAT_PREFIX}:worker") == 0
+    assert liveness.is_all_alive()
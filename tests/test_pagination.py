@@ -0,0 +1,9 @@
+from conftest import load_package_module
+
+
+def test_offset_pagination_is_the_default(monkeypatch):
+    operator = load_package_module("gitlab").GitLabOperator()
+    assert operator._pagination_params("/projects", {}) == ({"per_page": 100}, False)
+
+    monkeypatch.setattr(operator, "pagination", "keyset", raising=False)
+    assert operator._pagination_params("/projects", {}) == ({"order_by": "id", "per_page": 100}, True)
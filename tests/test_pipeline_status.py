@@ -0,0 +1,132 @@
+import asyncio
+
+from module.gitlab_common import GRAPHQL_JOBS_LIMIT, LATEST_PIPELINES_QUERY, latest_pipelines_variables
+
+from conftest import load_package_module
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+
+def _project(repo_id, jobs, has_next_page=False):
+    return {
+        "id": f"gid://gitlab/Project/{repo_id}",
+        "webUrl": f"http://gitlab.test/group/{repo_id}",
+        "pipelines": {
+            "nodes": [
+                {
+                    "id": f"gid://gitlab/Ci::Pipeline/{repo_id}00",
+                    "iid": "1",
+                    "status": "SUCCESS",
+                    "ref": "main",
+                    "sha": "abc",
+                    "createdAt": "2024-01-01T00:00:00Z",
+                    "updatedAt": "2024-01-01T00:10:00Z",
+                    "jobs": {
+                        "pageInfo": {"hasNextPage": has_next_page},
+                        "nodes": [
+                            {"id": f"gid://gitlab/Ci::Build/{n}", "name": f"job {n}", "status": "SUCCESS"}
+                            for n in range(jobs)
+                        ],
+                    },
+                }
+            ]
+        },
+    }
+
+
+def test_query_leaves_out_retried_jobs():
+    assert "jobs(retried: false, first: $jobs)" in LATEST_PIPELINES_QUERY
+    assert latest_pipelines_variables(["1"])["jobs"] == GRAPHQL_JOBS_LIMIT
+
+
+def test_graphql_refetches_truncated_pipelines_by_rest(monkeypatch):
+    operator = load_package_module("gitlab").GitLabOperator()
+    answer = {"data": {"projects": {"nodes": [_project(1, 2), _project(2, GRAPHQL_JOBS_LIMIT, has_next_page=True)]}}}
+    rest = []
+    monkeypatch.setattr(operator, "api_post", lambda *args, **kwargs: FakeResponse(answer), raising=False)
+    monkeypatch.setattr(
+        operator,
+        "gl_get_latest_pipeline_status",
+        lambda repo_id: rest.append(repo_id) or {"repo_id": repo_id, "rest": True},
+        raising=False,
+    )
+
+    summaries = operator.gl_get_pipeline_statuses_graphql(["1", "2", "3"])
+
+    assert rest == ["2"]
+    assert summaries["1"]["job_counts"] == {"success": 2}
+    assert summaries["2"] == {"repo_id": "2", "rest": True}
+    assert summaries["3"]["error"] == "Project not found"
+
+
+def test_rest_reads_every_page_of_jobs(monkeypatch):
+    operator = load_package_module("gitlab").GitLabOperator()
+    pages = []
+    jobs = [{"id": n, "name": f"job {n}", "stage": "test", "status": "success"} for n in range(150)]
+    monkeypatch.setattr(
+        operator,
+        "_get_page",
+        lambda path, params, headers=None: FakeResponse([{"id": 7, "status": "success", "ref": "main"}]),
+        raising=False,
+    )
+    monkeypatch.setattr(operator, "_get_all_pages", lambda path: pages.append(path) or jobs, raising=False)
+
+    summary = operator.gl_get_latest_pipeline_status("1")
+
+    assert pages == ["/projects/1/pipelines/7/jobs"]
+    assert summary["job_counts"] == {"success": 150}
+
+
+def test_pipeline_status_cache_is_opt_in(redis_op, monkeypatch):
+    operator = load_package_module("gitlab").GitLabOperator()
+    asked = []
+
+    def fetch(repo_id):
+        asked.append(repo_id)
+        return {"repo_id": repo_id, "pipeline": {"id": int(repo_id)}, "jobs": [], "job_counts": {}}
+
+    monkeypatch.setattr(operator, "gl_get_latest_pipeline_status", fetch, raising=False)
+
+    operator.gl_get_pipeline_statuses([1, 2])
+    operator.gl_get_pipeline_statuses([1, 2])
+    assert asked == ["1", "2", "1", "2"]
+
+    operator.enable_pipeline_status_cache(redis_op, ttl=60)
+    try:
+        asked.clear()
+        operator.gl_get_pipeline_statuses([1, 2])
+        statuses = operator.gl_get_pipeline_statuses([2, 1, 3])
+        assert asked == ["1", "2", "3"]
+        assert list(statuses) == ["2", "1", "3"]
+
+        operator.pipeline_status_cache.invalidate([1])
+        operator.gl_get_pipeline_statuses([1, 2])
+        assert asked == ["1", "2", "3", "1"]
+    finally:
+        operator.disable_pipeline_status_cache()
+
+
+def test_async_pipeline_status_cache(redis_op, monkeypatch):
+    operator = load_package_module("async_gitlab").AsyncGitLabOperator()
+    asked = []
+
+    async def fetch(repo_id):
+        asked.append(repo_id)
+        return {"repo_id": repo_id, "pipeline": None, "jobs": [], "job_counts": {}}
+
+    monkeypatch.setattr(operator, "gl_get_latest_pipeline_status", fetch, raising=False)
+    operator.enable_pipeline_status_cache(redis_op)
+    try:
+        asyncio.run(operator.gl_get_pipeline_statuses([1]))
+        assert asyncio.run(operator.gl_get_pipeline_statuses([1]))["1"]["repo_id"] == "1"
+        assert asked == ["1"]
+    finally:
+        operator.disable_pipeline_status_cache()
@@ -0,0 +1,177 @@
+import asyncio
+
+from module.bulk import RateLimitGate
+from module.rate_limit import AsyncRateLimiter, RateLimiter, RedisTokenBucket, TokenBucket
+
+from conftest import load_package_module
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.closed = False
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        self.closed = True
+
+
+def test_bulk_through_limiter_is_retried_by_the_limiter_only(monkeypatch):
+    monkeypatch.setattr("module.rate_limit.time.sleep", lambda seconds: None)
+    monkeypatch.setattr(RateLimitGate, "wait", lambda self: None)
+    limiter = RateLimiter(retries=2, backoff=0, jitter=0)
+    operator = load_package_module("gitlab").GitLabOperator()
+    monkeypatch.setattr(operator, "rate_limiter", limiter, raising=False)
+    sent = []
+
+    def send(item):
+        sent.append(item)
+        return limiter.call(lambda: FakeResponse(429, {"Retry-After": "0"}))
+
+    reports = operator._run_bulk(send, ["a"])
+
+    assert reports[0]["status_code"] == 429
+    assert sent == ["a"]
+    assert limiter.throttled == 3
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrency_is_halved_once_per_window(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("module.rate_limit.time.monotonic", clock)
+    limiter = RateLimiter(max_concurrency=16, backoff=0, jitter=0)
+
+    # Three requests sent under the full limit, all answered by 429.
+    for _ in range(3):
+        limiter._observe(FakeResponse(429, {"Retry-After": "0"}), attempt=1, sent_at=99.0)
+    assert limiter.concurrency == 8
+    assert limiter.throttled == 3
+
+    # A request sent after the decrease shrinks it again.
+    clock.now = 101.0
+    limiter._observe(FakeResponse(429, {"Retry-After": "0"}), attempt=1, sent_at=100.5)
+    assert limiter.concurrency == 4
+
+    limiter._observe(FakeResponse(200, {"RateLimit-Remaining": "1", "RateLimit-Limit": "100"}), 0, sent_at=100.5)
+    assert limiter.concurrency == 4
+    limiter._observe(FakeResponse(200, {"RateLimit-Remaining": "1", "RateLimit-Limit": "100"}), 0, sent_at=101.0)
+    assert limiter.concurrency == 3
+
+
+class AsyncFakeResponse(FakeResponse):
+    async def aclose(self):
+        self.closed = True
+
+
+def test_async_stream_holds_a_slot_and_retries_429(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr("module.rate_limit.asyncio.sleep", no_sleep)
+    limiter = AsyncRateLimiter(max_concurrency=1, backoff=0, jitter=0)
+    responses = [AsyncFakeResponse(429, {"Retry-After": "0"}), AsyncFakeResponse(200)]
+
+    async def send():
+        return responses.pop(0)
+
+    async def main():
+        async with limiter.stream(send) as output:
+            assert output.status_code == 200
+            assert limiter.in_flight == 1
+        assert output.closed
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+    assert limiter.throttled == 1
+
+
+def test_token_bucket_lets_a_burst_through_then_spaces_requests(monkeypatch):
+    clock = FakeClock(10.0)
+    monkeypatch.setattr("module.rate_limit.time.monotonic", clock)
+    bucket = TokenBucket(rate=2, burst=2)
+
+    assert [bucket.reserve(), bucket.reserve()] == [0.0, 0.0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+
+    # An idle bucket refills up to the burst, not beyond.
+    clock.now = 100.0
+    assert [bucket.reserve(), bucket.reserve(), bucket.reserve()] == [0.0, 0.0, 0.5]
+
+
+def test_redis_token_bucket_is_shared(redis_op):
+    first = RedisTokenBucket(redis_op, rate=1, burst=2, key="test:bucket")
+    second = RedisTokenBucket(redis_op, rate=1, burst=2, key="test:bucket")
+
+    assert first.reserve() == 0
+    assert second.reserve() == 0
+    # The third request of both processes waits about one interval.
+    assert 0.9 <= first.reserve() <= 1.0
+    assert 1.9 <= second.reserve() <= 2.0
+    assert redis_op.r.pttl("test:bucket") > 0
+
+
+def test_call_retries_429_then_returns(monkeypatch):
+    pauses = []
+    monkeypatch.setattr(RateLimitGate, "wait", lambda self: None)
+    monkeypatch.setattr(RateLimitGate, "pause", lambda self, seconds: pauses.append(seconds))
+    limiter = RateLimiter(max_concurrency=4, retries=3, backoff=0.5, jitter=0)
+    throttled = FakeResponse(429, {"Retry-After": "2"})
+    responses = [throttled, FakeResponse(200, body={"ok": True})]
+
+    output = limiter.call(lambda: responses.pop(0))
+
+    assert output.json() == {"ok": True}
+    assert throttled.closed
+    assert pauses == [2.0]
+    assert limiter.stats() == {"concurrency": 2, "in_flight": 0, "throttled": 1, "paused": 0.0}
+
+
+def test_call_gives_up_after_retries(monkeypatch):
+    monkeypatch.setattr(RateLimitGate, "wait", lambda self: None)
+    limiter = RateLimiter(retries=2, backoff=0, jitter=0)
+    sent = []
+
+    output = limiter.call(lambda: sent.append(1) or FakeResponse(429, {"Retry-After": "0"}))
+
+    assert output.status_code == 429
+    assert not output.closed
+    assert len(sent) == 3
+
+
+def test_concurrency_grows_back_on_success():
+    limiter = RateLimiter(max_concurrency=4, min_concurrency=1)
+    limiter.concurrency = 1.0
+    for _ in range(3):
+        limiter._observe(FakeResponse(200), 0, sent_at=0.0)
+    assert int(limiter.concurrency) == 2
+    for _ in range(20):
+        limiter._observe(FakeResponse(200), 0, sent_at=0.0)
+    assert limiter.concurrency == 4
+
+
+def test_async_limiter_is_used_from_a_new_loop():
+    limiter = AsyncRateLimiter(max_concurrency=1)
+
+    async def send():
+        await asyncio.sleep(0)
+        return AsyncFakeResponse(200)
+
+    async def main():
+        # Two calls contend for the one slot, which binds the condition to the loop.
+        outputs = await asyncio.gather(limiter.call(send), limiter.call(send))
+        return [output.status_code for output in outputs]
+
+    assert asyncio.run(main()) == [200, 200]
+    assert asyncio.run(main()) == [200, 200]
@@ -0,0 +1,9 @@
+def test_dict_set_many_keys_returns_the_results(redis_op):
+    assert redis_op.dict_set_many_keys({"a": {"x": "1"}, "b": {"y": "2"}}) is True
+    assert redis_op.r.hgetall("a") == {"x": "1"}
+
+    # "x" already exists, dict_set_all reports False for it.
+    assert redis_op.dict_set_many_keys({"a": {"x": "3"}, "c": {"z": "4"}}) is False
+    assert redis_op.r.hget("a", "x") == "3"
+
+    assert redis_op.dict_set_many_keys({}) is False
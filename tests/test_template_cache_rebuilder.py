@@ -0,0 +1,85 @@
+import threading
+import time
+
+from devopsapi_module import redis as R
+
+
+def _templates(n=1):
+    return {str(i): {"name": f"template {i}"} for i in range(n)}
+
+
+def test_get_builds_once_when_never_built(redis_op):
+    calls = []
+    rebuilder = R.TemplateCacheRebuilder(lambda: calls.append(1) or _templates(2))
+
+    assert len(rebuilder.get()) == 2
+    assert len(rebuilder.get()) == 2
+    assert calls == [1]
+    assert redis_op.r.get(R.TEMPLATE_CACHE_REBUILT_AT) is not None
+
+
+def test_empty_rebuild_is_recorded(redis_op):
+    calls = []
+    rebuilder = R.TemplateCacheRebuilder(lambda: calls.append(1) or {}, wait_timeout=1)
+
+    assert rebuilder.get() == []
+    started = time.monotonic()
+    assert rebuilder.get() == []
+    assert time.monotonic() - started < 0.5
+    assert calls == [1]
+    assert redis_op.bool_get(R.SHOULD_UPDATE_TEMPLATE) is False
+
+
+def test_rebuild_skipped_when_done_since_decision(redis_op):
+    redis_op.bool_set(R.SHOULD_UPDATE_TEMPLATE, True)
+    seen = redis_op.str_get(R.TEMPLATE_CACHE_REBUILT_AT)
+    assert R.TemplateCacheRebuilder(lambda: _templates(1)).rebuild(seen_rebuilt_at=seen)
+
+    calls = []
+    late = R.TemplateCacheRebuilder(lambda: calls.append(1) or _templates(3))
+    assert late.rebuild(seen_rebuilt_at=seen) is False
+    assert calls == []
+    assert redis_op.r.get(R.TEMPLATE_CACHE_REBUILD_LOCK) is None
+    assert redis_op.dict_len(R.TEMPLATE_CACHE) == 1
+
+
+def test_non_leader_waits_for_rebuild_after_delete(redis_op):
+    R.TemplateCacheRebuilder(lambda: _templates(2)).get()
+    R.delete_template_cache()
+
+    building = threading.Event()
+
+    def slow_build():
+        building.set()
+        time.sleep(0.3)
+        return _templates(2)
+
+    leader = threading.Thread(target=R.TemplateCacheRebuilder(slow_build).get)
+    leader.start()
+    assert building.wait(2)
+
+    follower_calls = []
+    follower = R.TemplateCacheRebuilder(lambda: follower_calls.append(1) or {}, wait_timeout=5)
+    assert len(follower.get()) == 2
+    leader.join()
+    assert follower_calls == []
+
+
+def test_lost_lock_discards_write(redis_op):
+    rebuilder = R.TemplateCacheRebuilder(lambda: _templates(1))
+
+    def steal_lock():
+        redis_op.r.set(R.TEMPLATE_CACHE_REBUILD_LOCK, "other")
+        return _templates(5)
+
+    rebuilder.build = steal_lock
+    assert rebuilder.rebuild() is False
+    assert redis_op.dict_len(R.TEMPLATE_CACHE) == 0
+
+
+def test_get_template_caches_all_returns_a_new_list(redis_op):
+    R.update_template_cache_all(_templates(2))
+
+    first = R.get_template_caches_all()
+    first.clear()
+    assert len(R.get_template_caches_all()) == 2
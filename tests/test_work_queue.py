@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from devopsapi_module import work_queue as W
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(W.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(redis_op, clock):
+    return W.CoalescingQueue("test:queue", debounce=1, visibility_timeout=30)
+
+
+def test_schedules_in_the_debounce_window_are_folded(queue, clock):
+    assert queue.schedule("a", "b") == 2
+    clock.now += 0.5
+    assert queue.schedule("a") == 0
+
+    assert queue.claim(10)[1] == []
+    clock.now += 0.5
+    token, items = queue.claim(10)
+    assert sorted(items) == ["a", "b"]
+    assert queue.stats() == {"pending": 0, "due": 0, "in_flight": 2}
+
+
+def test_an_item_is_not_claimed_twice_and_runs_again_when_scheduled_in_flight(queue, clock):
+    queue.schedule("a")
+    clock.now += 1
+    token, items = queue.claim()
+    assert items == ["a"]
+
+    queue.schedule("a")
+    clock.now += 1
+    assert queue.claim()[1] == []
+
+    assert queue.ack("a", token)
+    assert queue.claim()[1] == ["a"]
+
+
+def test_finish_needs_the_current_claim(queue, clock):
+    queue.schedule("a")
+    clock.now += 1
+    token, _ = queue.claim()
+
+    assert not queue.ack("a", "other token")
+    assert not queue.extend("a", "other token")
+
+    # The claim expires after the visibility timeout and another worker takes the item.
+    clock.now += 31
+    new_token, items = queue.claim()
+    assert items == ["a"]
+    assert not queue.ack("a", token)
+    assert queue.release("a", new_token, delay=5)
+
+    clock.now += 4
+    assert queue.claim()[1] == []
+    clock.now += 1
+    assert queue.claim()[1] == ["a"]
+
+
+def test_extend_pushes_back_the_deadline(queue, clock):
+    queue.schedule("a")
+    clock.now += 1
+    token, _ = queue.claim()
+
+    clock.now += 20
+    assert queue.extend("a", token)
+    clock.now += 20
+    assert queue.claim()[1] == []
+    assert queue.ack("a", token)
+
+
+def test_workers_release_a_failed_item(queue, clock):
+    handled, failed = threading.Event(), []
+
+    def handler(item):
+        if not failed:
+            failed.append(item)
+            raise RuntimeError("boom")
+        handled.set()
+
+    queue.schedule("a")
+    clock.now += 1
+    workers = W.QueueWorkers(queue, handler, workers=1, poll_interval=0.01, retry_delay=5)
+    workers.start()
+    try:
+        for _ in range(100):
+            if failed and queue.stats()["pending"] == 1:
+                break
+            time.sleep(0.01)
+        assert failed == ["a"]
+        clock.now += 5
+        assert handled.wait(2)
+    finally:
+        workers.stop(timeout=2)
+    assert queue.stats() == {"pending": 0, "due": 0, "in_flight": 0}